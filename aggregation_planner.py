@@ -0,0 +1,181 @@
+import math
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from salesforce_api import QueryCursor, composite_request
+from query_cache import cached_query_frame
+from soql import literal
+
+AGGREGATE_FUNCTIONS = ['COUNT', 'SUM', 'AVG', 'MIN', 'MAX']
+TIME_GRANULARITIES = ['Day', 'Month', 'Quarter', 'Year']
+NUMERIC_TYPES = ['currency', 'double', 'int', 'percent', 'long']
+INTEGER_TYPES = ['int', 'long']
+DATE_TYPES = ['date', 'datetime']
+# Aggregate queries return at most 2,000 groups
+MAX_GROUPS = 2000
+
+
+def _where(*conditions):
+    conditions = [condition for condition in conditions if condition]
+    return f" WHERE {' AND '.join(f'({condition})' for condition in conditions)}" if conditions else ""
+
+
+def _measure(aggregate, measure_field):
+    if aggregate == 'COUNT' or not measure_field:
+        return 'COUNT(Id)'
+    return f"{aggregate}({measure_field})"
+
+
+def build_group_by_query(object_name, group_field, aggregate='COUNT', measure_field=None, where=None, limit=MAX_GROUPS):
+    """SOQL that returns one row per distinct group_field value with its aggregated measure as 'value'."""
+    measure = _measure(aggregate, measure_field)
+    return (f"SELECT {group_field}, {measure} value FROM {object_name}{_where(where)} "
+            f"GROUP BY {group_field} ORDER BY {measure} DESC LIMIT {limit}")
+
+
+def build_time_series_query(object_name, date_field, granularity='Month', aggregate='COUNT', measure_field=None,
+                            where=None, field_type='datetime'):
+    """SOQL that buckets date_field by calendar period (CALENDAR_YEAR/QUARTER/MONTH or DAY_ONLY)."""
+    if granularity == 'Day':
+        buckets = [(f"DAY_ONLY({date_field})" if field_type == 'datetime' else date_field, 'period_day')]
+    else:
+        buckets = [(f"CALENDAR_YEAR({date_field})", 'period_year')]
+        if granularity == 'Quarter':
+            buckets.append((f"CALENDAR_QUARTER({date_field})", 'period_quarter'))
+        elif granularity == 'Month':
+            buckets.append((f"CALENDAR_MONTH({date_field})", 'period_month'))
+    select = ', '.join(f"{expression} {alias}" for expression, alias in buckets)
+    group_by = ', '.join(expression for expression, _ in buckets)
+    return (f"SELECT {select}, {_measure(aggregate, measure_field)} value FROM {object_name}"
+            f"{_where(where, f'{date_field} != null')} GROUP BY {group_by} ORDER BY {group_by} LIMIT {MAX_GROUPS}")
+
+
+def run_aggregate_query(sf, soql_query):
+    """Run an aggregate query through the query cache and return its rows as a DataFrame."""
+    df, _ = cached_query_frame(sf, soql_query, lambda: QueryCursor(sf, soql_query, prefetch=False).to_dataframe())
+    return df
+
+
+def aggregate_by_group(sf, object_name, group_field, aggregate='COUNT', measure_field=None, where=None):
+    """Aggregated value per group (for bar and pie charts), computed in Salesforce."""
+    df = run_aggregate_query(sf, build_group_by_query(object_name, group_field, aggregate, measure_field, where))
+    if df.empty:
+        return pd.DataFrame(columns=[group_field, 'value'])
+    return df.rename(columns={group_field.split('.')[-1]: group_field})[[group_field, 'value']]
+
+
+def aggregate_time_series(sf, object_name, date_field, granularity='Month', aggregate='COUNT', measure_field=None,
+                          where=None, field_type='datetime'):
+    """Aggregated value per calendar period (for line charts), computed in Salesforce."""
+    df = run_aggregate_query(sf, build_time_series_query(object_name, date_field, granularity, aggregate,
+                                                         measure_field, where, field_type))
+    if df.empty:
+        return pd.DataFrame(columns=['period', 'value'])
+    if granularity == 'Day':
+        df['period'] = pd.to_datetime(df['period_day'])
+    elif granularity == 'Year':
+        df['period'] = df['period_year'].astype(int).astype(str)
+    elif granularity == 'Quarter':
+        df['period'] = df['period_year'].astype(int).astype(str) + '-Q' + df['period_quarter'].astype(int).astype(str)
+    else:
+        df['period'] = df['period_year'].astype(int).astype(str) + '-' + df['period_month'].astype(int).astype(str).str.zfill(2)
+    return df[['period', 'value']]
+
+
+def bucket_edges(low, high, bins, field_type=None):
+    """
+    Edges of equal-width buckets over low..high. Integer fields get whole-number edges
+    (rounded up, which keeps every value in the same bucket), so the bucket filters
+    are valid literals for the field; a range narrower than the bins gets fewer buckets.
+    """
+    if low == high:
+        bins = 1
+    width = (high - low) / bins or 1.0
+    edges = [low + width * index for index in range(bins)] + [high]
+    if field_type in INTEGER_TYPES:
+        edges = list(dict.fromkeys(math.ceil(edge) for edge in edges))
+        if len(edges) == 1:
+            edges.append(edges[0])
+    return edges
+
+
+def _bucket_label(low, high, field_type=None):
+    if field_type in INTEGER_TYPES:
+        return f"{low:,} – {high:,}"
+    return f"{low:,.2f} – {high:,.2f}"
+
+
+def histogram(sf, object_name, field, bins=20, where=None, field_type=None):
+    """
+    Bucketed row counts for a numeric field, computed in Salesforce.
+
+    One aggregate query finds the range; the per-bucket COUNT() queries are then sent
+    together through the Composite API (25 per request). Bucket bounds are written as
+    integers for int and long fields and as fixed-point decimals otherwise.
+    """
+    range_df = run_aggregate_query(
+        sf, f"SELECT MIN({field}) low, MAX({field}) high FROM {object_name}{_where(where, f'{field} != null')}"
+    )
+    if range_df.empty or pd.isna(range_df.loc[0, 'low']):
+        return pd.DataFrame(columns=['bucket', 'low', 'high', 'count'])
+    edges = bucket_edges(float(range_df.loc[0, 'low']), float(range_df.loc[0, 'high']), bins, field_type)
+    bins = len(edges) - 1
+
+    subrequests = []
+    for index in range(bins):
+        upper_operator = '<=' if index == bins - 1 else '<'
+        condition = (f"{field} >= {literal(edges[index])} AND "
+                     f"{field} {upper_operator} {literal(edges[index + 1])}")
+        soql_query = f"SELECT COUNT() FROM {object_name}{_where(where, condition)}"
+        subrequests.append({'method': 'GET', 'url': f"query/?q={quote(soql_query)}"})
+    results = composite_request(sf, subrequests)
+
+    rows = []
+    for index, result in enumerate(results):
+        if not result['success']:
+            raise RuntimeError(f"Histogram bucket query failed: {result['body']}")
+        rows.append({
+            'bucket': _bucket_label(edges[index], edges[index + 1], field_type),
+            'low': edges[index],
+            'high': edges[index + 1],
+            'count': result['body']['totalSize'],
+        })
+    return pd.DataFrame(rows)
+
+
+# The same aggregates computed locally, for frames read from the object mirror
+def local_group(df, group_field):
+    """Row count per distinct value of group_field, largest first."""
+    counts = df[group_field].value_counts(dropna=False).head(MAX_GROUPS)
+    return pd.DataFrame({group_field: counts.index.astype(object), 'value': counts.to_numpy()})
+
+
+def local_time_series(df, date_field, granularity='Month'):
+    """Row count per calendar period of date_field."""
+    dates = pd.to_datetime(df[date_field]).dropna()
+    if dates.empty:
+        return pd.DataFrame(columns=['period', 'value'])
+    if granularity == 'Day':
+        periods = dates.dt.normalize()
+    else:
+        periods = dates.dt.to_period({'Month': 'M', 'Quarter': 'Q', 'Year': 'Y'}[granularity]).astype(str)
+    counts = periods.value_counts().sort_index()
+    return pd.DataFrame({'period': counts.index, 'value': counts.to_numpy()})
+
+
+def local_histogram(df, field, bins=20, field_type=None):
+    """Bucketed row counts for a numeric column, with the same buckets as histogram()."""
+    values = pd.to_numeric(df[field], errors='coerce').dropna().astype(float)
+    if values.empty:
+        return pd.DataFrame(columns=['bucket', 'low', 'high', 'count'])
+    edges = bucket_edges(float(values.min()), float(values.max()), bins, field_type)
+    bins = len(edges) - 1
+    # Last bucket includes its upper edge, as in histogram()
+    indexes = pd.Series(np.searchsorted(edges, values, side='right') - 1).clip(upper=bins - 1)
+    counts = indexes.value_counts().reindex(range(bins), fill_value=0)
+    return pd.DataFrame([{
+        'bucket': _bucket_label(edges[index], edges[index + 1], field_type),
+        'low': edges[index],
+        'high': edges[index + 1],
+        'count': int(counts[index]),
+    } for index in range(bins)])
@@ -0,0 +1,226 @@
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+# Call priorities: interactive page calls are never throttled, background refreshes and
+# bulk jobs share each org's token bucket, with background work served first
+INTERACTIVE = 0
+BACKGROUND = 1
+BULK = 2
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background', BULK: 'bulk'}
+
+# Throttled calls per second while plenty of quota is left, and the bucket size
+MAX_CALLS_PER_SECOND = 10.0
+BURST_SIZE = 20
+# Share of the daily quota below which throttled calls slow down, and below which they wait
+SLOWDOWN_RATIO = 0.5
+RESERVE_RATIO = 0.1
+# How long a throttled call waits for a token before giving up
+MAX_WAIT_SECONDS = 300
+
+LIMIT_INFO_PATTERN = re.compile(r'api-usage=(\d+)/(\d+)')
+# Modules that only relay calls; counters are attributed to the page or job that called them
+INFRASTRUCTURE_MODULES = {
+    'api_governor', 'salesforce_api', 'bulk_api', 'session_manager', 'metadata_cache', 'query_cache',
+    'record_frame', 'object_mirror', 'export_engine', 'aggregation_planner', 'snapshot_store', 'hierarchy_tree',
+    'resilience',
+}
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_app_files = {}
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when a throttled call could not get a token before its deadline."""
+
+
+_context = threading.local()
+
+
+@contextmanager
+def api_priority(priority):
+    """Run the calls made inside the block (on this thread) at the given priority."""
+    previous = getattr(_context, 'priority', INTERACTIVE)
+    _context.priority = priority
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+
+def current_priority():
+    return getattr(_context, 'priority', INTERACTIVE)
+
+
+def with_current_priority(function):
+    """Wrap function so it runs at the caller's priority on whichever thread executes it."""
+    priority = current_priority()
+
+    def run(*args, **kwargs):
+        with api_priority(priority):
+            return function(*args, **kwargs)
+    return run
+
+
+def _is_app_file(filename):
+    if filename not in _app_files:
+        _app_files[filename] = os.path.dirname(os.path.abspath(filename)) == APP_DIR
+    return _app_files[filename]
+
+
+def calling_module():
+    """Name of the innermost application module on the call stack that is not plumbing."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module not in INFRASTRUCTURE_MODULES and _is_app_file(frame.f_code.co_filename):
+            return 'app' if module == '__main__' else module
+        frame = frame.f_back
+    return 'other'
+
+
+class OrgBucket:
+    """Token bucket for one org whose refill rate follows the remaining daily API quota."""
+
+    def __init__(self, rate=MAX_CALLS_PER_SECOND, burst=BURST_SIZE):
+        self.max_rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.used = None
+        self.limit = None
+        self.waiting = {BACKGROUND: 0, BULK: 0}
+        self.condition = threading.Condition()
+
+    def remaining_ratio(self):
+        if not self.limit:
+            return None
+        return max(self.limit - self.used, 0) / self.limit
+
+    def rate(self):
+        """Calls per second allowed for throttled work at the current quota level."""
+        ratio = self.remaining_ratio()
+        if ratio is None or ratio >= SLOWDOWN_RATIO:
+            return self.max_rate
+        if ratio <= RESERVE_RATIO:
+            return 0.0
+        return self.max_rate * (ratio - RESERVE_RATIO) / (SLOWDOWN_RATIO - RESERVE_RATIO)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate())
+        self.updated = now
+
+    def update_usage(self, used, limit):
+        with self.condition:
+            self.used, self.limit = used, limit
+            self.condition.notify_all()
+
+    def consume(self):
+        """Take a token without waiting (interactive calls may overdraw the bucket)."""
+        with self.condition:
+            self._refill()
+            self.tokens -= 1
+
+    def acquire(self, priority, timeout=MAX_WAIT_SECONDS):
+        """Wait until a token is available; background work goes before bulk work."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    self._refill()
+                    blocked = priority == BULK and self.waiting[BACKGROUND] > 0
+                    if self.tokens >= 1 and not blocked:
+                        self.tokens -= 1
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise QuotaExhaustedError(
+                            f"Salesforce API quota is low ({self.used}/{self.limit} used); "
+                            f"{PRIORITY_NAMES[priority]} call gave up after {timeout} seconds."
+                        )
+                    rate = self.rate()
+                    wait = (1 - self.tokens) / rate if rate > 0 and self.tokens < 1 else 1.0
+                    self.condition.wait(min(max(wait, 0.01), remaining, 5.0))
+            finally:
+                self.waiting[priority] -= 1
+                self.condition.notify_all()
+
+
+class ApiGovernor:
+    """
+    Accounting and throttling of every HTTP call made to Salesforce.
+
+    Each response's Sforce-Limit-Info header ("api-usage=used/max") updates the org's
+    quota; throttled (background and bulk) calls take tokens from a per-org bucket whose
+    rate drops as the quota runs out and reaches zero at the reserve, so a runaway job
+    queues instead of burning the org's remaining calls. Calls are counted per calling
+    module and priority.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, org):
+        with self._lock:
+            if org not in self.buckets:
+                self.buckets[org] = OrgBucket()
+            return self.buckets[org]
+
+    def before_call(self, org, priority=None):
+        priority = current_priority() if priority is None else priority
+        bucket = self.bucket(org)
+        if priority == INTERACTIVE:
+            bucket.consume()
+        else:
+            bucket.acquire(priority)
+        key = (org, calling_module(), PRIORITY_NAMES[priority])
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def after_call(self, org, response):
+        match = LIMIT_INFO_PATTERN.search(response.headers.get('Sforce-Limit-Info', ''))
+        if match:
+            self.bucket(org).update_usage(int(match.group(1)), int(match.group(2)))
+
+    def quota(self, org):
+        """Latest (used, max) daily API usage seen for an org, or (None, None)."""
+        bucket = self.bucket(org)
+        return bucket.used, bucket.limit
+
+    def call_counts(self, org=None):
+        """Rows of {'org', 'module', 'priority', 'calls'} for the calls made by this process."""
+        with self._lock:
+            return [{'org': key[0], 'module': key[1], 'priority': key[2], 'calls': count}
+                    for key, count in sorted(self.counters.items()) if org in (None, key[0])]
+
+    def reset_counts(self):
+        with self._lock:
+            self.counters.clear()
+
+
+# Shared by every connection of this process
+api_governor = ApiGovernor()
+
+
+class GovernedAdapter(HTTPAdapter):
+    """HTTPAdapter that routes every request through the API governor."""
+
+    def send(self, request, **kwargs):
+        org = urlsplit(request.url).netloc
+        api_governor.before_call(org)
+        response = super().send(request, **kwargs)
+        api_governor.after_call(org, response)
+        return response
+
+
+def org_api_usage(sf):
+    """(used, max) daily API requests of an org from the last response headers, or (None, None)."""
+    return api_governor.quota(sf.sf_instance)
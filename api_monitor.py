@@ -1,14 +1,23 @@
 import streamlit as st
 import pandas as pd
 from simple_salesforce import Salesforce
-import io
 import datetime
+from snapshot_store import snapshot_or_fetch
+from sync_scheduler import get_background_sync
+from api_governor import api_governor, org_api_usage
+from resilience import breaker_states
+from report_engine import show_report_export
+
+# The background sync refreshes the limits every five minutes
+LIMITS_FRESHNESS_SECONDS = 300
 
 # Function to fetch API usage limits from Salesforce
-def get_api_limits(sf):
+def get_api_limits(sf, force_refresh=False):
     try:
-        # Fetch limits from Salesforce
-        limits_result = sf.limits()
+        # Use the latest snapshot of the limits, fetching them only when it is stale
+        limits_result, fetched_at = snapshot_or_fetch(sf, 'api_limits', lambda sf: sf.limits(),
+                                                      LIMITS_FRESHNESS_SECONDS, force=force_refresh)
+        st.caption(f"Limits as of {datetime.datetime.fromtimestamp(fetched_at).strftime('%Y-%m-%d %H:%M:%S')}")
 
         # Create a dictionary to store the limits data
         limits_data = {key: value for key, value in limits_result.items()}
@@ -25,18 +34,6 @@ def filter_limits(limits_data, search_term):
         return {key: value for key, value in limits_data.items() if search_term.lower() in key.lower()}
     return limits_data
 
-# Function to export DataFrame to Excel
-def convert_df_to_excel(df):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False)
-        writer.close()
-    return output.getvalue()
-
-# Function to export DataFrame to CSV
-def convert_df_to_csv(df):
-    return df.to_csv(index=False).encode('utf-8')
-
 # Function to display API limits in the Streamlit app
 def show_api_tools(sf):
     st.title("Salesforce API Tools")
@@ -47,7 +44,7 @@ def show_api_tools(sf):
     
     st.header("📊 API Usage and Limits")
     
-    limits_data = get_api_limits(sf)
+    limits_data = get_api_limits(sf, force_refresh=st.button("Refresh Limits"))
     
     if limits_data:
         st.subheader("API Usage and Limits Overview")
@@ -76,13 +73,9 @@ def show_api_tools(sf):
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             file_name_prefix = f"API_Usage_Report_{timestamp}"
 
-            col1, col2 = st.columns(2)
-            with col1:
-                excel_data = convert_df_to_excel(df)
-                st.download_button(label="Download Excel", data=excel_data, file_name=f"{file_name_prefix}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-            with col2:
-                csv_data = convert_df_to_csv(df)
-                st.download_button(label="Download CSV", data=csv_data, file_name=f"{file_name_prefix}.csv", mime="text/csv")
+            # The report is only built for the format asked for, in the background
+            show_report_export(df, key='api_limits', base_name=file_name_prefix, formats=['Excel', 'CSV'],
+                               version=(search_term, tuple(df['Used'])))
 
             # Display collapsible sections for each limit
             for key, value in filtered_limits.items():
@@ -96,6 +89,53 @@ def show_api_tools(sf):
     else:
         st.error("Failed to fetch API usage information.")
 
+    show_api_call_counters(sf)
+    show_circuit_breakers(sf)
+    show_background_sync_status()
+
+# Function to display the state of the background sync scheduler
+def show_background_sync_status():
+    scheduler = get_background_sync()
+    with st.expander("Background Sync"):
+        if scheduler is None or not scheduler.is_running():
+            st.info("The in-app background sync is not running (it may be disabled or running as sync_worker.py).")
+            return
+        rows = [{
+            'Dataset': name,
+            'State': status.get('state'),
+            'Last Run': datetime.datetime.fromtimestamp(status['last_run']).strftime('%H:%M:%S') if status.get('last_run') else '',
+            'Duration (s)': status.get('duration'),
+            'Error': status.get('error') or '',
+        } for name, status in sorted(scheduler.status.items())]
+        st.dataframe(pd.DataFrame(rows))
+
+# Function to display the calls made by this app, per module, as counted by the API governor
+def show_api_call_counters(sf):
+    with st.expander("API Calls by Module"):
+        used, limit = org_api_usage(sf)
+        if limit:
+            st.metric("Daily API Requests Used (from response headers)", f"{used} / {limit}")
+            st.progress(min(used / limit, 1.0))
+        counts = api_governor.call_counts(sf.sf_instance)
+        if counts:
+            df = pd.DataFrame(counts).drop(columns=['org'])
+            st.dataframe(df.sort_values('calls', ascending=False))
+            st.caption("Background and bulk calls slow down as the daily quota runs low and wait once only the reserve is left; interactive calls are never held back.")
+        else:
+            st.info("No API calls have been counted yet.")
+        if st.button("Reset Counters"):
+            api_governor.reset_counts()
+
+# Function to display the circuit breaker of every endpoint this process has called
+def show_circuit_breakers(sf):
+    with st.expander("Endpoint Health"):
+        rows = [row for row in breaker_states() if row['endpoint'].startswith(sf.sf_instance)]
+        if rows:
+            st.dataframe(pd.DataFrame(rows))
+            st.caption("Transient failures are retried with backoff; an endpoint that keeps failing is paused (open) for a short cool-down before a trial call is let through.")
+        else:
+            st.info("No endpoints have been called yet.")
+
 # Main function to run the app
 def main(sf):
     show_api_tools(sf)
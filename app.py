@@ -1,11 +1,10 @@
 import streamlit as st
 import threading
-import json
-import os
 from streamlit_option_menu import option_menu
 from smart_visualize import smart_visualize
 from how_to_use import show_how_to_use  # Import the how to use page
-from authentication import authenticate_salesforce_with_user
+from session_manager import get_salesforce_session, release_salesforce_session
+from sync_scheduler import start_background_sync, stop_background_sync
 # Importing other module functions
 from query_builder import show_query_builder
 from data_import_export import show_data_import_export
@@ -21,24 +20,8 @@ from basic_info import display_user_info
 from soql_query_builder import show_soql_query_builder
 from soql_query_builder_p_c import show_advanced_soql_query_builder
 from global_actions import show_global_actions
+from user_store import save_user_data, load_user_data, clear_user_data
 
-
-USER_DATA_FILE = 'user_data.json'
-# Function to save user data persistently to a JSON file
-def save_user_data(user_data, keep_logged_in=False):
-    user_data['keep_logged_in'] = keep_logged_in
-    with open(USER_DATA_FILE, 'w') as f:
-        json.dump(user_data, f)
-# Function to load user data from the JSON file
-def load_user_data():
-    if os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, 'r') as f:
-            return json.load(f)
-    return {}
-# Function to clear saved user data (used on logout)
-def clear_user_data():
-    if os.path.exists(USER_DATA_FILE):
-        os.remove(USER_DATA_FILE)
 # Registration page
 def register():
     st.title("Register")
@@ -82,7 +65,9 @@ def login():
             st.session_state['is_authenticated'] = True
             st.session_state['keep_logged_in'] = keep_logged_in  # Store the toggle state
             # Authenticate Salesforce instance and store it in session state
-            st.session_state['salesforce'] = authenticate_salesforce_with_user(user_data)
+            st.session_state['salesforce'] = get_salesforce_session(user_data)
+            # Keep dashboards and mirrors refreshed in the background
+            start_background_sync(user_data)
             
             # Save user data with the "Keep me logged in" option
             save_user_data(user_data, keep_logged_in=keep_logged_in)
@@ -93,6 +78,8 @@ def login():
             st.error('Please Try Again')
 # Logout function
 def logout():
+    stop_background_sync()
+    release_salesforce_session(load_user_data())
     st.session_state['is_authenticated'] = False
     st.session_state['salesforce'] = None
     st.session_state['keep_logged_in'] = False
@@ -103,7 +90,8 @@ def check_session():
     user_data = load_user_data()
     if user_data and user_data.get('keep_logged_in'):
         st.session_state['is_authenticated'] = True
-        st.session_state['salesforce'] = authenticate_salesforce_with_user(user_data)
+        st.session_state['salesforce'] = get_salesforce_session(user_data)
+        start_background_sync(user_data)
         return True
     return False
 
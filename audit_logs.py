@@ -1,12 +1,14 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
 from datetime import datetime
-import base64
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
+from functools import partial
+from pdf_report import dataframe_to_pdf
+from record_frame import flatten_records, soql_field_types
+from snapshot_store import snapshot_or_fetch
+from report_engine import show_report_export
+
+# The background sync refreshes login history every ten minutes and the audit trail every fifteen
+LOGS_FRESHNESS_SECONDS = 900
 
 
 def fetch_user_names(sf, user_ids):
@@ -24,15 +26,13 @@ def fetch_login_history(sf):
     FROM LoginHistory 
     ORDER BY LoginTime DESC LIMIT 100
     """
-    login_history = sf.query_all(query)['records']
-    
-    # Extract UserIds and fetch their corresponding names
-    user_ids = [record['UserId'] for record in login_history]
-    user_names = fetch_user_names(sf, user_ids)
+    login_history = flatten_records(sf.query_all(query)['records'], soql_field_types(sf, query))
+    if login_history.empty:
+        return login_history
 
-    # Replace UserId with User Name
-    for record in login_history:
-        record['UserName'] = user_names.get(record['UserId'], 'Unknown User')
+    # Look up the names of the distinct UserIds and map them onto the column
+    user_names = fetch_user_names(sf, login_history['UserId'].dropna().unique().tolist())
+    login_history['UserName'] = login_history['UserId'].map(user_names).fillna('Unknown User')
 
     return login_history
 
@@ -44,62 +44,21 @@ def fetch_audit_logs(sf):
     FROM SetupAuditTrail 
     ORDER BY CreatedDate DESC LIMIT 100
     """
-    audit_logs = sf.query_all(query)['records']
-    
-    # Clean up the CreatedBy field to only show the Name
-    for record in audit_logs:
-        created_by_info = record.get('CreatedBy')
-        if created_by_info:
-            record['CreatedBy'] = created_by_info.get('Name')
-        else:
-            record['CreatedBy'] = 'None'
+    audit_logs = flatten_records(sf.query_all(query)['records'], soql_field_types(sf, query))
+    if audit_logs.empty:
+        return audit_logs
+
+    # Show only the name of the user who made the change
+    created_by = audit_logs.pop('CreatedBy.Name') if 'CreatedBy.Name' in audit_logs else pd.Series(index=audit_logs.index, dtype=object)
+    audit_logs['CreatedBy'] = created_by.fillna('None')
 
     return audit_logs
 
 
 def export_data_as_pdf(df, title):
-    """Export DataFrame to a clean PDF with proper formatting."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-
-    # Styles
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # Title
-    elements.append(Paragraph(title, styles['Title']))
-
-    # Table Data
-    table_data = [list(df.columns)] + df.values.tolist()
-
-    # Create Table
-    table = Table(table_data)
-
-    # Style Table
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-
-    elements.append(table)
-
-    # Timestamp
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    elements.append(Paragraph(f"<br/><br/><b>Report generated on:</b> {timestamp}", styles['Normal']))
-
-    # Build PDF
-    doc.build(elements)
-
-    # Prepare file for download
-    buffer.seek(0)
-    b64 = base64.b64encode(buffer.getvalue()).decode()
-    href = f'<a href="data:application/pdf;base64,{b64}" download="{title.replace(" ", "_").lower()}_report.pdf">Download PDF File</a>'
-    st.markdown(href, unsafe_allow_html=True)
+    """Render a DataFrame as a clean PDF report with proper formatting; returns the PDF bytes."""
+    # Title, the logs as paged tables, then the generation timestamp
+    return dataframe_to_pdf(df, title=title, timestamp=True)
 
 
 def view_audit_logs(sf):
@@ -107,48 +66,24 @@ def view_audit_logs(sf):
 
     log_type = st.selectbox("Select Log Type", ["Login History", "Audit Logs"])
 
+    refresh = st.button("Refresh Logs")
     if log_type == "Audit Logs":
-        logs = fetch_audit_logs(sf)
+        logs, fetched_at = snapshot_or_fetch(sf, 'audit_logs', fetch_audit_logs, LOGS_FRESHNESS_SECONDS, force=refresh)
         title = "Audit Logs Report"
     else:
-        logs = fetch_login_history(sf)
+        logs, fetched_at = snapshot_or_fetch(sf, 'login_history', fetch_login_history, LOGS_FRESHNESS_SECONDS, force=refresh)
         title = "Login History Report"
+    st.caption(f"Logs as of {datetime.fromtimestamp(fetched_at).strftime('%Y-%m-%d %H:%M:%S')}")
 
-    if logs:
-        df = pd.DataFrame(logs)
-
-        # Remove unnecessary columns
-        if 'attributes' in df.columns:
-            df = df.drop(columns=['attributes'])
+    if not logs.empty:
+        df = logs
 
         # Display DataFrame
         st.dataframe(df)
 
-        # Export Options
+        # Export Options: reports are built in the background, only for the format asked for
         st.subheader("Export Data")
-        export_format = st.selectbox("Select Export Format", ["PDF", "Excel", "CSV"])
-
-        if st.button("Export Data"):
-            if export_format == "PDF":
-                export_data_as_pdf(df, title)
-            elif export_format == "Excel":
-                buffer = BytesIO()
-                with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                    df.to_excel(writer, index=False)
-                    writer.save()
-                st.download_button(
-                    label="Download Excel File",
-                    data=buffer,
-                    file_name=f"{title.replace(' ', '_').lower()}_report.xlsx",
-                    mime="application/vnd.ms-excel"
-                )
-            elif export_format == "CSV":
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV File",
-                    data=csv,
-                    file_name=f"{title.replace(' ', '_').lower()}_report.csv",
-                    mime="text/csv"
-                )
+        show_report_export(df, key='audit_logs', base_name=f"{title.replace(' ', '_').lower()}_report",
+                           pdf_builder=partial(export_data_as_pdf, title=title), version=(title, fetched_at))
     else:
         st.error(f"No logs found for {log_type}.")
@@ -1,13 +1,14 @@
 import requests
 from simple_salesforce import Salesforce, SalesforceLogin
 
-def authenticate_salesforce_with_user(user_data):
+def authenticate_salesforce_with_user(user_data, session=None):
     """
     Authenticate with Salesforce using provided user credentials.
     
     Args:
     user_data (dict): A dictionary containing Salesforce login credentials which includes
                       username, password, security_token, client_id, client_secret, and domain.
+    session (requests.Session): Optional HTTP session to reuse for login and all later API calls.
     
     Returns:
     Salesforce object if authentication is successful, None otherwise.
@@ -18,21 +19,23 @@ def authenticate_salesforce_with_user(user_data):
             username=user_data['username'],
             password=user_data['password'],
             security_token=user_data['security_token'],
-            domain=user_data['domain']
+            domain=user_data['domain'],
+            session=session
         )
         return sf
     except Exception as e:
         # Fallback to manual authentication if the first method fails
         print(f"Automatic Salesforce authentication failed: {str(e)}. Attempting manual authentication...")
-        return manual_authenticate_salesforce(user_data)
+        return manual_authenticate_salesforce(user_data, session)
 
-def manual_authenticate_salesforce(user_data):
+def manual_authenticate_salesforce(user_data, session=None):
     """
     Manually authenticate with Salesforce by constructing the request for an access token.
     
     Args:
     user_data (dict): A dictionary containing Salesforce login credentials which includes
                       username, password, security_token, client_id, client_secret, and domain.
+    session (requests.Session): Optional HTTP session to reuse for login and all later API calls.
     
     Returns:
     Salesforce object if authentication is successful, None otherwise.
@@ -47,10 +50,10 @@ def manual_authenticate_salesforce(user_data):
     }
     
     try:
-        response = requests.post(token_url, data=payload)
+        response = (session or requests).post(token_url, data=payload)
         response.raise_for_status()  # Will raise an HTTPError for bad requests
         access_info = response.json()
-        sf_instance = Salesforce(instance_url=access_info['instance_url'], session_id=access_info['access_token'])
+        sf_instance = Salesforce(instance_url=access_info['instance_url'], session_id=access_info['access_token'], session=session)
         return sf_instance
     except requests.exceptions.HTTPError as http_err:
         print(f"HTTP error occurred during manual authentication: {http_err}")
@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
 from io import BytesIO
+from collections import Counter
 from simple_salesforce import Salesforce
+from hierarchy_tree import TreeIndex
+from salesforce_api import QueryCursor
 
 # Function to create an Excel file for download
 def convert_df_to_excel(df):
@@ -46,12 +49,22 @@ def fetch_role_hierarchy(sf):
             SELECT Id, Name, ParentRoleId 
             FROM UserRole
         """
-        roles_data = sf.query(query)['records']
+        roles_data = sf.query_all(query)['records']
         return roles_data
     except Exception as e:
         st.error(f"Error fetching roles: {str(e)}")
         return []
 
+# Function to count active users per role
+def fetch_role_user_counts(sf):
+    try:
+        # Counted locally: a GROUP BY over every role cannot be paged and fails past 2,000 groups
+        query = "SELECT UserRoleId FROM User WHERE IsActive = true AND UserRoleId != null"
+        return dict(Counter(record['UserRoleId'] for record in QueryCursor(sf, query)))
+    except Exception as e:
+        st.error(f"Error fetching role user counts: {str(e)}")
+        return {}
+
 # Display users, licenses, profiles, and role hierarchy in separate dropdowns
 def display_user_info(sf):
     st.title("Salesforce Users, Licenses, Profiles, and Role Hierarchy")
@@ -125,22 +138,34 @@ def display_user_info(sf):
         if roles_data:
             st.write("Roles are shown with their parent-child relationships.")
             
+            role_tree = TreeIndex(roles_data, parent_key='ParentRoleId')
+            user_counts = fetch_role_user_counts(sf)
+            subtree_counts = role_tree.rollup(user_counts)
+            role_names = {role['Id']: role['Name'] for role in roles_data}
+
+            # Collapse selected roles to hide everything below them
+            collapsed_roles = st.multiselect(
+                "Collapse roles", list(role_names.keys()), format_func=lambda role_id: role_names[role_id]
+            )
+
             # Prepare role hierarchy table
-            role_table = []
-
-            def display_role_hierarchy(roles, parent_role_id=None, level=0):
-                """Recursively display the role hierarchy with indentation."""
-                for role in roles:
-                    if role['ParentRoleId'] == parent_role_id:
-                        role_table.append([role['Name'], ' ' * (level * 2), role['Id']])
-                        # Recursive call to display children roles
-                        display_role_hierarchy(roles, role['Id'], level + 1)
-            
-            display_role_hierarchy(roles_data)
+            role_table = [
+                [role['Name'], ' ' * (level * 2), role['Id'], level,
+                 user_counts.get(role['Id'], 0), subtree_counts.get(role['Id'], 0)]
+                for role, level in role_tree.walk(collapsed=collapsed_roles)
+            ]
 
             # Display role hierarchy in a table
-            role_df = pd.DataFrame(role_table, columns=["Role Name", "Indentation", "Role ID"])
-            st.table(role_df)
+            role_df = pd.DataFrame(role_table, columns=["Role Name", "Indentation", "Role ID", "Level", "Users", "Users in Subtree"])
+            st.dataframe(role_df, hide_index=True)
+
+            # Path from a role up to the top of the hierarchy
+            path_role = st.selectbox(
+                "Show path to top for role", [None] + list(role_names.keys()),
+                format_func=lambda role_id: role_names[role_id] if role_id else "--None--"
+            )
+            if path_role:
+                st.write(" → ".join(role['Name'] for role in role_tree.path_to_root(path_role)))
 
             # Add download buttons
             st.download_button(
@@ -0,0 +1,306 @@
+import time
+import requests
+import pandas as pd
+from io import StringIO
+from resilience import TRANSIENT, THROTTLED, classify_exception, backoff_delay
+
+# Bulk API 2.0 accepts up to 150 MB per job; 10k rows keeps each upload well below that
+DEFAULT_CHUNK_SIZE = 10000
+BULK_OPERATIONS = ['insert', 'update', 'upsert', 'delete']
+JOB_TERMINAL_STATES = ('JobComplete', 'Failed', 'Aborted')
+# Sending a chunk of these again leaves the org in the same state, so a chunk whose
+# outcome is unknown can be resent; inserts are only resent when they never started
+IDEMPOTENT_OPERATIONS = ('update', 'upsert', 'delete')
+# Extra attempts per chunk after transient failures (the HTTP layer already retries single calls)
+DEFAULT_CHUNK_RETRIES = 2
+
+
+class BulkApiError(Exception):
+    """Raised when a Bulk API 2.0 request fails or a job ends in a failed state."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ChunkNotSubmittedError(BulkApiError):
+    """Raised when a chunk failed before its job was closed; the job was aborted, so no row was processed."""
+
+
+class ChunkSubmittedError(BulkApiError):
+    """Raised when a chunk failed after its job was closed; some of its rows may have been processed."""
+
+    def __init__(self, message, job_id, status=None):
+        super().__init__(message, status)
+        self.job_id = job_id
+
+
+class ChunkedIngestError(BulkApiError):
+    """
+    Raised when a chunked ingest stops part way.
+
+    next_chunk is the first chunk whose rows may not be in Salesforce, so the import can
+    resume there with start_chunk; partial_results holds the results of the chunks that
+    completed. job_id is set when the failed chunk's job was already submitted, in which
+    case some of its rows may have been processed.
+    """
+
+    def __init__(self, message, next_chunk, partial_results, job_id=None):
+        super().__init__(message)
+        self.next_chunk = next_chunk
+        self.partial_results = partial_results
+        self.job_id = job_id
+
+
+def is_transient_failure(error):
+    """True for failures worth retrying later: timeouts, dropped connections, 5xx and limit errors."""
+    if isinstance(error, BulkApiError):
+        if error.status is None and error.__cause__ is not None:
+            return is_transient_failure(error.__cause__)
+        return error.status in (429, 500, 502, 503, 504)
+    if isinstance(error, requests.exceptions.RequestException):
+        return classify_exception(error) in (TRANSIENT, THROTTLED)
+    return False
+
+
+class Bulk2Client:
+    """Minimal Bulk API 2.0 client.
+
+    The client only needs an instance URL and a session id, so it can be pointed at a
+    local HTTP stand-in for the ``/jobs`` endpoints as easily as at a real org.
+    """
+
+    def __init__(self, instance_url, session_id, api_version='59.0', session=None):
+        self.data_url = f"{instance_url.rstrip('/')}/services/data/v{api_version}"
+        self.session_id = session_id
+        self.session = session or requests.Session()
+
+    @classmethod
+    def from_salesforce(cls, sf):
+        """Build a client that reuses the session and HTTP connection pool of a simple_salesforce instance."""
+        return cls(f"https://{sf.sf_instance}", sf.session_id, sf.sf_version, session=sf.session)
+
+    def _headers(self, content_type='application/json'):
+        return {
+            'Authorization': f"Bearer {self.session_id}",
+            'Content-Type': content_type,
+            'Accept': 'application/json',
+        }
+
+    def _request(self, method, path, content_type='application/json', **kwargs):
+        response = self.session.request(method, f"{self.data_url}/{path}", headers=self._headers(content_type), **kwargs)
+        if response.status_code >= 300:
+            raise BulkApiError(f"{method} {path} failed with status {response.status_code}: {response.text}",
+                               status=response.status_code)
+        return response
+
+    # Ingest jobs
+    def create_ingest_job(self, sobject, operation, external_id_field=None):
+        """Open an ingest job for one object and operation."""
+        if operation not in BULK_OPERATIONS:
+            raise ValueError(f"Unsupported bulk operation '{operation}'. Expected one of {BULK_OPERATIONS}.")
+        payload = {
+            'object': sobject,
+            'operation': operation,
+            'contentType': 'CSV',
+            'lineEnding': 'LF',
+        }
+        if operation == 'upsert':
+            if not external_id_field:
+                raise ValueError("An external ID field is required for upsert.")
+            payload['externalIdFieldName'] = external_id_field
+        return self._request('POST', 'jobs/ingest', json=payload).json()
+
+    def upload_job_data(self, job_id, csv_data):
+        """Upload the CSV payload of an ingest job."""
+        self._request('PUT', f"jobs/ingest/{job_id}/batches", content_type='text/csv', data=csv_data.encode('utf-8'))
+
+    def close_job(self, job_id):
+        """Mark the upload as complete so Salesforce starts processing the job."""
+        return self._request('PATCH', f"jobs/ingest/{job_id}", json={'state': 'UploadComplete'}).json()
+
+    def abort_job(self, job_id, job_type='ingest'):
+        return self._request('PATCH', f"jobs/{job_type}/{job_id}", json={'state': 'Aborted'}).json()
+
+    def get_job(self, job_id, job_type='ingest'):
+        return self._request('GET', f"jobs/{job_type}/{job_id}").json()
+
+    def wait_for_job(self, job_id, job_type='ingest', poll_interval=2.0, max_poll_interval=30.0, timeout=None):
+        """Poll an ingest or query job until it reaches a terminal state, backing off between polls."""
+        started = time.monotonic()
+        interval = poll_interval
+        while True:
+            job = self.get_job(job_id, job_type)
+            if job.get('state') in JOB_TERMINAL_STATES:
+                return job
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise BulkApiError(f"Timed out waiting for bulk job {job_id} (last state: {job.get('state')}).")
+            time.sleep(interval)
+            interval = min(interval * 2, max_poll_interval)
+
+    def get_job_results(self, job_id, result_type):
+        """Fetch one of the per-row result sets of a job as a DataFrame.
+
+        result_type is 'successfulResults', 'failedResults' or 'unprocessedrecords'.
+        """
+        response = self._request('GET', f"jobs/ingest/{job_id}/{result_type}", content_type='text/csv')
+        if not response.text.strip():
+            return pd.DataFrame()
+        return pd.read_csv(StringIO(response.text), dtype=str, keep_default_na=False)
+
+    # Query jobs
+    def create_query_job(self, soql, include_deleted=False):
+        """Open an asynchronous query job for a SOQL statement."""
+        payload = {
+            'operation': 'queryAll' if include_deleted else 'query',
+            'query': soql,
+            'contentType': 'CSV',
+            'lineEnding': 'LF',
+        }
+        return self._request('POST', 'jobs/query', json=payload).json()
+
+    def iter_query_results(self, job_id, page_size=50000):
+        """Yield the results of a completed query job one page at a time as DataFrames.
+
+        Pages are fetched lazily with the ``Sforce-Locator`` cursor, so only one page is held in memory.
+        """
+        locator = None
+        while True:
+            params = {'maxRecords': page_size}
+            if locator:
+                params['locator'] = locator
+            response = self._request('GET', f"jobs/query/{job_id}/results", content_type='text/csv', params=params)
+            if response.text.strip():
+                yield pd.read_csv(StringIO(response.text), dtype=str, keep_default_na=False)
+            locator = response.headers.get('Sforce-Locator')
+            if not locator or locator == 'null':
+                break
+
+
+def read_csv_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a CSV file (path or file-like object) in chunks of raw string values."""
+    return pd.read_csv(file, chunksize=chunk_size, dtype=str, keep_default_na=False)
+
+
+def collect_job_results(client, job):
+    """The per-row results of a finished ingest job, in the shape returned by run_ingest_chunk."""
+    return {
+        'job': job,
+        'successful': client.get_job_results(job['id'], 'successfulResults'),
+        'failed': client.get_job_results(job['id'], 'failedResults'),
+        'unprocessed': client.get_job_results(job['id'], 'unprocessedrecords'),
+    }
+
+
+def run_ingest_chunk(client, sobject, operation, chunk, external_id_field=None, poll_interval=2.0, job_callback=None):
+    """Send one chunk of rows through its own ingest job and collect the per-row results.
+
+    Failures before the job is closed are raised as ChunkNotSubmittedError, since the job
+    is aborted and none of the rows were processed; later failures as ChunkSubmittedError.
+    job_callback, if given, receives the new job summary before any row is uploaded.
+    """
+    try:
+        job = client.create_ingest_job(sobject, operation, external_id_field)
+    except (BulkApiError, requests.exceptions.RequestException) as e:
+        raise ChunkNotSubmittedError(f"Could not open a bulk job: {str(e)}", getattr(e, 'status', None)) from e
+    job_id = job['id']
+    if job_callback:
+        job_callback(job)
+    try:
+        client.upload_job_data(job_id, chunk.to_csv(index=False, lineterminator='\n'))
+        client.close_job(job_id)
+    except Exception as e:
+        try:
+            client.abort_job(job_id)
+        except (BulkApiError, requests.exceptions.RequestException):
+            # The job never reached UploadComplete, so Salesforce will not process it either way
+            pass
+        raise ChunkNotSubmittedError(f"Upload of bulk job {job_id} failed: {str(e)}", getattr(e, 'status', None)) from e
+    try:
+        job = client.wait_for_job(job_id, 'ingest', poll_interval=poll_interval)
+        if job.get('state') != 'JobComplete':
+            raise BulkApiError(f"Bulk job {job_id} ended in state {job.get('state')}: {job.get('errorMessage', '')}")
+        return collect_job_results(client, job)
+    except Exception as e:
+        raise ChunkSubmittedError(str(e), job_id, getattr(e, 'status', None)) from e
+
+
+def send_chunk(client, sobject, operation, chunk, external_id_field=None, poll_interval=2.0,
+               chunk_retries=DEFAULT_CHUNK_RETRIES, job_callback=None):
+    """Run one chunk, sending it again after transient failures when that cannot duplicate rows."""
+    attempt = 0
+    while True:
+        try:
+            return run_ingest_chunk(client, sobject, operation, chunk, external_id_field, poll_interval, job_callback)
+        except Exception as e:
+            resendable = isinstance(e, ChunkNotSubmittedError) or operation in IDEMPOTENT_OPERATIONS
+            if not (resendable and is_transient_failure(e)) or attempt >= chunk_retries:
+                raise
+            print(f"Retrying bulk {operation} chunk after: {str(e)}")
+            time.sleep(backoff_delay(attempt + 2))
+            attempt += 1
+
+
+def bulk_ingest_csv(client, sobject, file, operation='insert', external_id_field=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE, poll_interval=2.0, progress_callback=None,
+                    start_chunk=0, chunk_retries=DEFAULT_CHUNK_RETRIES):
+    """Stream a CSV file into Salesforce through one Bulk API 2.0 ingest job per chunk.
+
+    Returns a dict with the job summaries and the successful, failed and unprocessed rows.
+    Each result row keeps the original CSV columns plus the ``sf__*`` columns added by
+    Salesforce and a ``chunk`` column pointing back to the chunk it was sent in.
+
+    Chunks before start_chunk are skipped, so an interrupted import can resume where it
+    stopped. When a chunk still fails after its retries, ChunkedIngestError is raised with
+    the chunk to resume from and the results gathered so far.
+    """
+    jobs, successful, failed, unprocessed = [], [], [], []
+    rows_sent = 0
+
+    def _concat(frames):
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def _results():
+        return {
+            'jobs': jobs,
+            'rows_sent': rows_sent,
+            'successful': _concat(successful),
+            'failed': _concat(failed),
+            'unprocessed': _concat(unprocessed),
+        }
+
+    for chunk_number, chunk in enumerate(read_csv_chunks(file, chunk_size)):
+        if chunk_number < start_chunk:
+            continue
+        try:
+            result = send_chunk(client, sobject, operation, chunk, external_id_field, poll_interval, chunk_retries)
+        except Exception as e:
+            job_id = getattr(e, 'job_id', None)
+            message = f"Chunk {chunk_number} failed: {str(e)}"
+            if job_id and operation not in IDEMPOTENT_OPERATIONS:
+                message += f" Bulk job {job_id} was already submitted, so check it for processed rows before resuming."
+            raise ChunkedIngestError(message, chunk_number, _results(), job_id) from e
+        rows_sent += len(chunk)
+        jobs.append(result['job'])
+        for frames, key in ((successful, 'successful'), (failed, 'failed'), (unprocessed, 'unprocessed')):
+            if not result[key].empty:
+                frames.append(result[key].assign(chunk=chunk_number))
+        if progress_callback:
+            progress_callback(chunk_number + 1, rows_sent)
+
+    return _results()
+
+
+def bulk_query_pages(client, soql, page_size=50000, include_deleted=False, poll_interval=2.0, job_callback=None):
+    """Run a Bulk API 2.0 query job and yield its result pages as DataFrames.
+
+    job_callback, if given, receives the completed job summary (which carries
+    ``numberRecordsProcessed``) before the first page is fetched.
+    """
+    job = client.create_query_job(soql, include_deleted)
+    job = client.wait_for_job(job['id'], 'query', poll_interval=poll_interval)
+    if job.get('state') != 'JobComplete':
+        raise BulkApiError(f"Bulk query job {job['id']} ended in state {job.get('state')}: {job.get('errorMessage', '')}")
+    if job_callback:
+        job_callback(job)
+    yield from client.iter_query_results(job['id'], page_size)
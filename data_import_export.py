@@ -1,33 +1,70 @@
 import streamlit as st
-from salesforce_api import import_csv_to_salesforce, export_salesforce_to_csv, export_salesforce_to_excel
+import pandas as pd
+import datetime
+from salesforce_api import export_salesforce_to_file
+from bulk_api import BULK_OPERATIONS, DEFAULT_CHUNK_SIZE
+from export_engine import EXPORT_FORMATS, FILE_EXTENSIONS
+from metadata_cache import describe_global
+from object_mirror import object_mirror, MirrorError
+from import_jobs import (REST_OPERATIONS, RESUMABLE_STATES, ImportJobError, create_import_job, run_import_job,
+                         cancel_import_job, list_import_jobs, import_job_results)
 
 def show_data_import_export(sf):
     data_action = st.sidebar.selectbox(
         "Data Actions",
-        ['Import to Salesforce', 'Export from Salesforce']
+        ['Import to Salesforce', 'Import Jobs', 'Export from Salesforce', 'Local Mirror']
     )
 
     if data_action == 'Import to Salesforce':
         st.subheader("Import CSV to Salesforce")
         uploaded_file = st.file_uploader("Choose a CSV file to import", type='csv')
         sobject_type = st.text_input("Enter Salesforce Object Type for import (e.g., Account)")
+        import_mode = st.radio("Import Mode", ["REST API (200 rows per call)", "Bulk API 2.0"], index=1)
+        mode = 'bulk' if import_mode == "Bulk API 2.0" else 'rest'
+        operation = st.selectbox("Operation", BULK_OPERATIONS if mode == 'bulk' else REST_OPERATIONS)
+        external_id_field = st.text_input(
+            "External ID Field (e.g., External_Id__c)" + ("" if operation == 'upsert' else " - optional"),
+            help="Recorded for every row in the import journal; on a resumed insert, rows already created are matched by it instead of being sent again."
+        ) or None
+        chunk_size = None
+        if mode == 'bulk':
+            chunk_size = st.number_input("Rows per job", min_value=1, max_value=150000, value=DEFAULT_CHUNK_SIZE, step=1000)
         if st.button("Import to Salesforce"):
-            success, message = import_csv_to_salesforce(sf, sobject_type, uploaded_file)
-            if success:
-                st.success(message)
+            if uploaded_file is None or not sobject_type:
+                st.error("Choose a file and an object to import into.")
             else:
-                st.error(message)
+                try:
+                    job_id = create_import_job(sf, sobject_type, uploaded_file, operation=operation, mode=mode,
+                                               external_id_field=external_id_field, chunk_size=chunk_size,
+                                               file_name=uploaded_file.name)
+                    run_import_job_with_progress(sf, job_id)
+                except ImportJobError as e:
+                    st.error(str(e))
+
+    elif data_action == 'Import Jobs':
+        show_import_jobs(sf)
 
     elif data_action == 'Export from Salesforce':
         st.subheader("Export Salesforce to File")
         export_soql = st.text_area("Enter SOQL Query for export", "SELECT Id, Name FROM Account")
-        file_format = st.selectbox("Select file format for export", ["CSV", "Excel"])
+        file_format = st.selectbox("Select file format for export", EXPORT_FORMATS)
+        engine_choice = st.radio("Export Engine", ["Bulk API 2.0 query job", "REST API pages"],
+                                 help="Both engines fetch every row and stream each page straight to disk.")
         if st.button("Export from Salesforce"):
-            file_path = f"salesforce_data.{file_format.lower()}"
-            if file_format == "CSV":
-                success, message = export_salesforce_to_csv(sf, export_soql, file_path)
-            else:
-                success, message = export_salesforce_to_excel(sf, export_soql, file_path)
+            file_path = f"salesforce_data.{FILE_EXTENSIONS[file_format]}"
+            progress_bar = st.progress(0)
+            status = st.empty()
+
+            def report_progress(rows_written, total_rows):
+                if total_rows:
+                    progress_bar.progress(min(rows_written / total_rows, 1.0))
+                    status.info(f"Written {rows_written} of {total_rows} rows.")
+                else:
+                    status.info(f"Written {rows_written} rows.")
+
+            engine = 'bulk' if engine_choice.startswith("Bulk") else 'rest'
+            success, message = export_salesforce_to_file(sf, export_soql, file_path, file_format, engine, report_progress)
+            progress_bar.progress(1.0)
             if success:
                 st.success(f"{message}. Download the file below:")
                 with open(file_path, "rb") as file:
@@ -39,3 +76,109 @@ def show_data_import_export(sf):
                     )
             else:
                 st.error(message)
+
+    elif data_action == 'Local Mirror':
+        show_local_mirror(sf)
+
+def show_local_mirror(sf):
+    """Mirror objects into local Parquet files that the query and visualization pages can read without API calls."""
+    st.subheader("Local Object Mirror")
+    st.write("The first sync copies every row; later syncs only fetch records changed or deleted since the last one.")
+
+    mirrors = object_mirror.list_mirrors(sf)
+    if mirrors:
+        st.dataframe(mirrors)
+
+    object_names = [obj['name'] for obj in describe_global(sf)['sobjects'] if obj.get('replicateable') or obj.get('queryable')]
+    object_name = st.selectbox("Object to mirror", object_names, key='mirror_object')
+    full_reload = st.checkbox("Full reload", value=False, help="Re-copy every row instead of syncing changes.")
+    col1, col2 = st.columns(2)
+    if col1.button("Sync Now"):
+        status = st.empty()
+        try:
+            summary = object_mirror.sync(sf, object_name, full=full_reload, progress_callback=status.info)
+            status.success(f"{summary['mode'].title()} sync of {object_name}: {summary['upserted']} upserted, "
+                           f"{summary['deleted']} deleted, {summary['row_count']} rows mirrored.")
+        except MirrorError as e:
+            status.error(str(e))
+        except Exception as e:
+            status.error(f"Failed to sync {object_name}: {str(e)}")
+    if col2.button("Remove Mirror"):
+        object_mirror.remove(sf, object_name)
+        st.success(f"Removed the local mirror of {object_name}.")
+
+def run_import_job_with_progress(sf, job_id):
+    """Run or resume an import job with a progress bar, then show how it ended."""
+    progress_bar = st.progress(0)
+    status = st.empty()
+
+    def report_progress(rows_done, total_rows):
+        if total_rows:
+            progress_bar.progress(min(rows_done / total_rows, 1.0))
+        status.info(f"Imported {rows_done} of {total_rows} rows.")
+
+    job = run_import_job(sf, job_id, report_progress)
+    if job['status'] == 'completed':
+        progress_bar.progress(1.0)
+        status.success(f"Import of {job['file_name']} finished: {job['succeeded']} succeeded, {job['failed']} failed.")
+    elif job['status'] == 'cancelled':
+        status.warning(f"Import of {job['file_name']} was cancelled after {job['rows_done']} rows.")
+    else:
+        status.error(f"Import stopped after {job['rows_done']} of {job['total_rows']} rows: {job['error']} "
+                     "Resume it from Import Jobs once the problem is fixed.")
+    show_import_results(job)
+
+def show_import_jobs(sf):
+    """List the journaled import jobs of this org with resume and cancel actions."""
+    st.subheader("Import Jobs")
+    jobs = list_import_jobs(sf)
+    if not jobs:
+        st.info("No import jobs yet.")
+        return
+    st.dataframe(pd.DataFrame(jobs)[['file_name', 'sobject', 'operation', 'mode', 'status', 'rows_done', 'total_rows',
+                                     'succeeded', 'failed', 'error']])
+
+    labels = {job['job_id']: f"{job['file_name']} -> {job['sobject']} ({job['status']}, "
+                             f"{datetime.datetime.fromtimestamp(job['created_at']).strftime('%Y-%m-%d %H:%M')})" for job in jobs}
+    job_id = st.selectbox("Job", list(labels), format_func=labels.get)
+    job = next(job for job in jobs if job['job_id'] == job_id)
+    if job['status'] in RESUMABLE_STATES:
+        col1, col2 = st.columns(2)
+        if col1.button("Resume Job"):
+            try:
+                run_import_job_with_progress(sf, job_id)
+            except ImportJobError as e:
+                st.error(str(e))
+        if col2.button("Cancel Job"):
+            try:
+                cancel_import_job(job_id)
+                st.success("Job cancelled. Rows already imported stay in Salesforce.")
+            except ImportJobError as e:
+                st.error(str(e))
+    show_import_results(job)
+
+def show_import_results(job):
+    """Display the per-row outcome of an import job with downloads for the failed and successful rows."""
+    results = import_job_results(job['job_id'])
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Succeeded", int(results['success'].sum()))
+    col2.metric("Failed", int((~results['success']).sum()))
+    col3.metric("Remaining", max((job['total_rows'] or 0) - job['rows_done'], 0))
+
+    failed = results[~results['success']]
+    if not failed.empty:
+        st.write("Failed rows:")
+        st.dataframe(failed)
+        st.download_button(
+            label="Download Failed Rows",
+            data=failed.to_csv(index=False).encode('utf-8'),
+            file_name=f"import_{job['job_id']}_failed_rows.csv",
+            mime="text/csv"
+        )
+    if results['success'].any():
+        st.download_button(
+            label="Download Successful Rows",
+            data=results[results['success']].to_csv(index=False).encode('utf-8'),
+            file_name=f"import_{job['job_id']}_successful_rows.csv",
+            mime="text/csv"
+        )
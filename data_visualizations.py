@@ -1,52 +1,65 @@
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from datetime import datetime
+from datetime import date, datetime
 from simple_salesforce import Salesforce, SalesforceMalformedRequest
+from metadata_cache import describe_global, describe_sobject
+from salesforce_api import QueryCursor
+from object_mirror import object_mirror, query_frame
+from query_builder import show_query_cache_stats
+from soql import SoqlQuery, SoqlError, Condition, all_of, between, coerce, on_days
+from aggregation_planner import (
+    AGGREGATE_FUNCTIONS, TIME_GRANULARITIES, NUMERIC_TYPES, DATE_TYPES,
+    aggregate_by_group, aggregate_time_series, histogram
+)
 
 # Function to filter out unnecessary metadata fields from Salesforce fields
 def filter_out_metadata_fields(fields):
     """Filter out unnecessary metadata fields from the Salesforce fields."""
     return [field for field in fields if not field.startswith('attributes') and not field.startswith('Opportunities.')]
 
-# Function to generate the SOQL filter query based on filter conditions
-def generate_filter_query(filter_conditions, numeric_fields):
-    """Generate the SOQL filter query based on filter conditions."""
-    filter_query = ""
+# Function to read a date-only filter value ('YYYY-MM-DD' or a date), None for anything else
+def filter_day(value):
+    if isinstance(value, datetime):
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value.strip()) if isinstance(value, str) and len(value.strip()) == 10 else None
+    except ValueError:
+        return None
+
+# Function to generate the SOQL filter condition based on filter conditions
+def build_filter_condition(filter_conditions, numeric_fields, field_types=None):
+    """Build the filter conditions as one typed SOQL condition (raises SoqlError for values that do not fit a field)."""
+    field_types = field_types or {}
+    conditions = []
     for condition in filter_conditions:
         obj_field = condition['field'].split('.')[1]  # Remove object prefix
         filter_type = condition['operator']
         value = condition['value']
-        
-        # Determine if the field is numeric
-        is_numeric = obj_field in numeric_fields
+
+        # Numeric fields come from number inputs; other values are converted for the field's type
+        field_type = field_types.get(obj_field, 'double' if obj_field in numeric_fields else None)
 
         if filter_type == "equals":
-            if is_numeric:
-                filter_query += f"{obj_field} = {value} AND "
-            else:
-                filter_query += f"{obj_field} = '{value}' AND "
+            conditions.append(Condition(obj_field, '=', coerce(value, field_type)))
         elif filter_type == "greater than":
-            if is_numeric:
-                filter_query += f"{obj_field} > {value} AND "
-            else:
-                filter_query += f"{obj_field} > '{value}' AND "
+            conditions.append(Condition(obj_field, '>', coerce(value, field_type)))
         elif filter_type == "less than":
-            if is_numeric:
-                filter_query += f"{obj_field} < {value} AND "
-            else:
-                filter_query += f"{obj_field} < '{value}' AND "
+            conditions.append(Condition(obj_field, '<', coerce(value, field_type)))
+        elif filter_type == "between" and isinstance(value, tuple) and field_type == 'datetime' \
+                and filter_day(value[0]) and filter_day(value[1]):
+            # Days of a datetime field run up to midnight after the last day, so it is included
+            conditions.append(on_days(obj_field, filter_day(value[0]), filter_day(value[1])))
         elif filter_type == "between" and isinstance(value, tuple):
-            if is_numeric:
-                filter_query += f"{obj_field} >= {value[0]} AND {obj_field} <= {value[1]} AND "
-            else:
-                filter_query += f"{obj_field} >= '{value[0]}' AND {obj_field} <= '{value[1]}' AND "
+            conditions.append(between(obj_field, coerce(value[0], field_type), coerce(value[1], field_type)))
 
-    # Remove the trailing 'AND ' if filters exist
-    if filter_query.endswith("AND "):
-        filter_query = filter_query[:-4]
+    return all_of(*conditions)
 
-    return filter_query
+def generate_filter_query(filter_conditions, numeric_fields, field_types=None):
+    """Generate the SOQL filter query based on filter conditions."""
+    return build_filter_condition(filter_conditions, numeric_fields, field_types).to_soql()
 
 def ensure_group_by(fields, group_by_fields, numeric_fields=None):
     """Ensure all selected fields are either grouped or aggregated."""
@@ -60,14 +73,15 @@ def ensure_group_by(fields, group_by_fields, numeric_fields=None):
 
         cleaned_fields.append(obj_field)
 
-    return list(set(cleaned_fields + group_by_fields))
+    # Keeps the selection order, so the same choices always produce the same query
+    return list(dict.fromkeys(cleaned_fields + group_by_fields))
 
 
 
 # Function to identify numeric fields for a given Salesforce object
 def get_numeric_fields(sf, object_name):
     """Retrieve numeric fields for a given Salesforce object."""
-    object_description = sf.__getattr__(object_name).describe()
+    object_description = describe_sobject(sf, object_name)
     numeric_fields = [field['name'] for field in object_description['fields'] if field['type'] in ['currency', 'double', 'int', 'percent']]
     return numeric_fields
 
@@ -86,7 +100,7 @@ def visualize_data(sf):
     
     # Fetch and display Salesforce objects
     try:
-        objects = sf.describe()["sobjects"]
+        objects = describe_global(sf)["sobjects"]
     except Exception as e:
         st.error(f"Error fetching Salesforce objects: {str(e)}")
         return
@@ -102,7 +116,7 @@ def visualize_data(sf):
 
     # Retrieve fields for the selected object
     try:
-        object_description = sf.__getattr__(selected_object).describe()
+        object_description = describe_sobject(sf, selected_object)
         fields = [field['name'] for field in object_description['fields']]
         filtered_fields = filter_out_metadata_fields(fields)
     except Exception as e:
@@ -111,6 +125,7 @@ def visualize_data(sf):
 
     # Identify numeric fields for aggregation
     numeric_fields = get_numeric_fields(sf, selected_object)
+    field_types = {field['name']: field['type'] for field in object_description['fields']}
 
     # Allow the user to select fields
     selected_fields = st.multiselect(f"Select fields from {selected_object}", filtered_fields, key=f"{selected_object}_fields")
@@ -180,20 +195,18 @@ def visualize_data(sf):
             # Clean field names by removing object prefix
             clean_aggregated_fields = [field.split('.')[1] if '.' in field else field for field in aggregated_fields]
             
-            soql_select = ', '.join(clean_aggregated_fields)
-            soql_from = selected_object
-            
-            # Generate filter query
-            soql_where = generate_filter_query(filter_conditions, numeric_fields)
-            
-            # Generate GROUP BY clause
-            if group_by_fields:
-                clean_group_by_fields = [field.split('.')[1] for field in group_by_fields]
-                soql_group_by = ', '.join(clean_group_by_fields)
-                soql_query = f"SELECT {soql_select} FROM {soql_from} WHERE {soql_where} GROUP BY {soql_group_by} LIMIT 200"
-            else:
-                soql_query = f"SELECT {soql_select} FROM {soql_from} WHERE {soql_where} LIMIT 200"
-            
+            query = SoqlQuery(selected_object, clean_aggregated_fields).limit(200)
+
+            # Generate filter query and GROUP BY clause, checked against the object's describe
+            try:
+                query.where(build_filter_condition(filter_conditions, numeric_fields, field_types))
+                if group_by_fields:
+                    query.group_by(*[field.split('.')[1] for field in group_by_fields])
+                soql_query = query.validate(sf).to_soql()
+            except SoqlError as e:
+                st.error(f"Invalid report query: {str(e)}")
+                return
+
             # Display the generated SOQL query
             st.write(f"**Generated SOQL Query:**\n```sql\n{soql_query}\n```")
             st.session_state['soql_query'] = soql_query
@@ -204,12 +217,14 @@ def visualize_data(sf):
     if 'soql_query' in st.session_state and st.session_state['soql_query']:
         soql_query = st.session_state['soql_query']
         
+        use_mirror = object_mirror.has_mirror(sf, selected_object) and st.checkbox(
+            "Run against the local mirror when possible", value=True, key="visual_use_mirror")
         if st.button("Run Query"):
             try:
-                results = sf.query(soql_query)
-                records = results.get('records', [])
-                if records:
-                    df = pd.json_normalize(records)
+                df, source = query_frame(sf, soql_query, lambda: QueryCursor(sf, soql_query).to_dataframe(typed=True), use_mirror)
+                if not df.empty:
+                    if source != 'salesforce':
+                        st.caption(f"Served from the {'local mirror' if source == 'mirror' else 'query cache'}.")
                     st.session_state['records'] = df
                     st.success(f"Query successful. {len(df)} records fetched.")
                     st.write(df)
@@ -224,10 +239,23 @@ def visualize_data(sf):
                 st.session_state['records'] = None
     
     # Step 6: Visualization
-    if 'records' in st.session_state and st.session_state['records'] is not None:
+    st.write("**Step 6: Data Visualization**")
+    aggregation_mode = st.radio(
+        "Aggregation",
+        ["Aggregate in Salesforce (all matching rows)", "Plot fetched rows"],
+        key="aggregation_mode",
+        help="Server-side aggregation runs GROUP BY/COUNT/SUM queries so charts cover every matching record."
+    )
+    if aggregation_mode.startswith("Aggregate"):
+        try:
+            where = generate_filter_query(filter_conditions, numeric_fields, field_types)
+        except SoqlError as e:
+            st.error(f"Invalid filter: {str(e)}")
+            return
+        show_server_side_chart(sf, selected_object, object_description['fields'], selected_fields, where)
+    elif 'records' in st.session_state and st.session_state['records'] is not None:
         df = st.session_state['records']
         
-        st.write("**Step 6: Data Visualization**")
         chart_type = st.selectbox("Select Chart Type", ['Bar Chart', 'Pie Chart', 'Line Chart'], key="chart_type_visual")
         st.write("Choose fields for visualization:")
         
@@ -240,7 +268,7 @@ def visualize_data(sf):
         
         elif chart_type == 'Pie Chart':
             labels = st.selectbox("Select Labels", df.columns, key="pie_labels")
-            numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
+            numeric_columns = df.select_dtypes(include='number').columns.tolist()
             if numeric_columns:
                 values = st.selectbox("Select Values", numeric_columns, key="pie_values")
                 if labels and values:
@@ -258,6 +286,61 @@ def visualize_data(sf):
     else:
         st.info("No data available for visualization. Please generate and run a report.")
 
+    show_query_cache_stats()
+
+# Function to chart aggregates computed by Salesforce instead of plotting raw rows
+def show_server_side_chart(sf, object_name, field_metadata, selected_fields, where):
+    field_types = {field['name']: field['type'] for field in field_metadata}
+    groupable = {field['name'] for field in field_metadata if field.get('groupable')}
+    groupable_fields = [field for field in selected_fields if field in groupable]
+    numeric_fields = [field for field in selected_fields if field_types.get(field) in NUMERIC_TYPES]
+    date_fields = [field for field in selected_fields if field_types.get(field) in DATE_TYPES]
+
+    chart_type = st.selectbox("Select Chart Type", ['Bar Chart', 'Pie Chart', 'Line Chart', 'Histogram'], key="server_chart_type")
+    try:
+        if chart_type in ('Bar Chart', 'Pie Chart'):
+            if not groupable_fields:
+                st.warning("Select at least one groupable field (e.g. a picklist or text field) to group by.")
+                return
+            group_field = st.selectbox("Group By", groupable_fields, key="server_group_field")
+            aggregate = st.selectbox("Aggregate", AGGREGATE_FUNCTIONS if numeric_fields else ['COUNT'], key="server_aggregate")
+            measure_field = st.selectbox("Measure", numeric_fields, key="server_measure") if aggregate != 'COUNT' else None
+            df = aggregate_by_group(sf, object_name, group_field, aggregate, measure_field, where)
+            label = f"{aggregate}({measure_field})" if measure_field else "Record Count"
+            if chart_type == 'Bar Chart':
+                fig = px.bar(df, x=group_field, y='value', labels={'value': label}, title=f"{label} by {group_field}")
+            else:
+                fig = px.pie(df, names=group_field, values='value', title=f"{label} by {group_field}")
+
+        elif chart_type == 'Line Chart':
+            if not date_fields:
+                st.warning("Select a date or datetime field to plot over time.")
+                return
+            date_field = st.selectbox("Date Field", date_fields, key="server_date_field")
+            granularity = st.selectbox("Granularity", TIME_GRANULARITIES, index=1, key="server_granularity")
+            aggregate = st.selectbox("Aggregate", AGGREGATE_FUNCTIONS if numeric_fields else ['COUNT'], key="server_line_aggregate")
+            measure_field = st.selectbox("Measure", numeric_fields, key="server_line_measure") if aggregate != 'COUNT' else None
+            df = aggregate_time_series(sf, object_name, date_field, granularity, aggregate, measure_field, where,
+                                       field_types[date_field])
+            label = f"{aggregate}({measure_field})" if measure_field else "Record Count"
+            fig = px.line(df, x='period', y='value', labels={'value': label}, title=f"{label} per {granularity.lower()} of {date_field}")
+
+        else:
+            if not numeric_fields:
+                st.warning("Select a numeric field to build a histogram.")
+                return
+            field = st.selectbox("Field", numeric_fields, key="server_hist_field")
+            bins = st.slider("Buckets", min_value=5, max_value=50, value=20, key="server_hist_bins")
+            df = histogram(sf, object_name, field, bins, where, field_types[field])
+            fig = px.bar(df, x='bucket', y='count', title=f"Distribution of {field}")
+    except Exception as e:
+        st.error(f"Failed to aggregate data: {str(e)}")
+        return
+
+    st.plotly_chart(fig)
+    with st.expander("Aggregated data"):
+        st.dataframe(df)
+
 # Main function to run the Streamlit app
 def main():
     st.title("Salesforce Reporting and Dashboard Tool")
@@ -0,0 +1,150 @@
+import csv
+import pandas as pd
+from record_frame import flatten_records
+
+EXPORT_FORMATS = ['CSV', 'Parquet', 'Excel']
+FILE_EXTENSIONS = {'CSV': 'csv', 'Parquet': 'parquet', 'Excel': 'xlsx'}
+# Excel caps a worksheet at 1,048,576 rows including the header
+EXCEL_MAX_ROWS = 1048575
+
+
+def records_to_frame(records, field_types=None):
+    """Flatten one page of REST query records into a DataFrame without the 'attributes' metadata."""
+    return flatten_records(records, field_types)
+
+
+def check_page_columns(df, columns):
+    """
+    Raise ValueError when a page holds values in columns the file's header lacks.
+
+    Relationship columns of REST pages depend on the data (a parent null throughout the
+    first page has no 'Parent.Field' columns), so reindexing a later page to the header
+    could otherwise drop its values silently. Columns that are empty on the page are fine.
+    """
+    extra = [column for column in df.columns if column not in columns and df[column].notna().any()]
+    if extra:
+        raise ValueError(f"Page has values in columns missing from the export header: {', '.join(map(str, extra))}")
+
+
+class CsvPageWriter:
+    """Append pages to a CSV file, writing the header once."""
+
+    def __init__(self, file_path, columns=None):
+        self.file = open(file_path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.columns = None
+        if columns is not None:
+            self.columns = list(columns)
+            self.writer.writerow(self.columns)
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self.writer.writerow(self.columns)
+        check_page_columns(df, self.columns)
+        df = df.reindex(columns=self.columns).astype(object)
+        self.writer.writerows(df.where(df.notna(), None).itertuples(index=False, name=None))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetPageWriter:
+    """Append pages to a Parquet file as row groups, using string columns so the schema stays stable across pages."""
+
+    def __init__(self, file_path, columns=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.file_path = file_path
+        self.writer = None
+        self.schema = None
+        if columns is not None:
+            self._open(columns)
+
+    def _open(self, columns):
+        self.schema = self.pa.schema([(str(col), self.pa.string()) for col in columns])
+        self.writer = self.pq.ParquetWriter(self.file_path, self.schema)
+
+    def write(self, df):
+        if self.writer is None:
+            self._open(df.columns)
+        check_page_columns(df, self.schema.names)
+        df = df.reindex(columns=self.schema.names)
+        df = df.astype('string')
+        self.writer.write_table(self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class XlsxPageWriter:
+    """Write pages to an XLSX file in xlsxwriter's constant-memory mode, rolling over to a new sheet when one fills up."""
+
+    def __init__(self, file_path, columns=None):
+        import xlsxwriter
+        self.workbook = xlsxwriter.Workbook(file_path, {
+            'constant_memory': True,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+            'remove_timezone': True,
+        })
+        self.columns = None
+        self.worksheet = None
+        self.row = 0
+        if columns is not None:
+            self.columns = [str(col) for col in columns]
+            self._new_sheet()
+
+    def _new_sheet(self):
+        self.worksheet = self.workbook.add_worksheet()
+        self.worksheet.write_row(0, 0, self.columns)
+        self.row = 1
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = [str(col) for col in df.columns]
+            self._new_sheet()
+        check_page_columns(df, self.columns)
+        df = df.reindex(columns=self.columns)
+        for values in df.itertuples(index=False, name=None):
+            if self.row > EXCEL_MAX_ROWS:
+                self._new_sheet()
+            self.worksheet.write_row(self.row, 0, [None if pd.isna(value) else value for value in values])
+            self.row += 1
+
+    def close(self):
+        if self.columns is None:
+            self.workbook.add_worksheet()
+        self.workbook.close()
+
+
+PAGE_WRITERS = {
+    'CSV': CsvPageWriter,
+    'Parquet': ParquetPageWriter,
+    'Excel': XlsxPageWriter,
+}
+
+
+def stream_export(pages, file_path, file_format='CSV', progress_callback=None, columns=None):
+    """Write an iterable of DataFrame pages to disk one page at a time.
+
+    Only the current page is held in memory. progress_callback, if given, is called
+    with the number of rows written so far after each page. columns fixes the header
+    (see record_frame.soql_columns); without it the header is taken from the first page
+    and a later page with values outside it raises ValueError. Returns the total row count.
+    """
+    if file_format not in PAGE_WRITERS:
+        raise ValueError(f"Unsupported export format '{file_format}'. Expected one of {EXPORT_FORMATS}.")
+    writer = PAGE_WRITERS[file_format](file_path, columns)
+    rows_written = 0
+    try:
+        for page in pages:
+            writer.write(page)
+            rows_written += len(page)
+            if progress_callback:
+                progress_callback(rows_written)
+    finally:
+        writer.close()
+    return rows_written
@@ -0,0 +1,196 @@
+import bisect
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from metadata_cache import describe_sobject, org_key, DEFAULT_TTL_SECONDS
+
+# Parent levels indexed by default; SOQL allows at most five
+DEFAULT_DEPTH = 1
+MAX_DEPTH = 5
+# Deep indexes of heavily related objects are cut off here
+MAX_INDEX_ENTRIES = 50000
+MAX_CACHED_INDEXES = 32
+DESCRIBE_WORKERS = 8
+SEARCH_RESULTS = 50
+
+
+class FieldIndex:
+    """
+    Every field of an object, plus the fields of its parents reached through lookups up
+    to a depth, with prefix and fuzzy search.
+
+    Entries are dicts with the SOQL 'path' (e.g. 'Owner.Profile.Name'), a readable
+    'label', the field 'type', the 'object' the field belongs to, the relationship
+    'depth' and the field's describe. Prefix search bisects sorted key lists; fuzzy search
+    narrows the entries with a character index before matching, and both search one
+    relationship level at a time, stopping once they have enough results.
+    """
+
+    def __init__(self, object_name, entries, depth):
+        self.object_name = object_name
+        self.depth = depth
+        self.entries = entries
+        self.built_at = time.time()
+        self.by_path = {entry['path']: entry for entry in entries}
+        self.fields = {entry['path']: entry['field'] for entry in entries}
+        self.own_entries = [entry for entry in entries if entry['depth'] == 0]
+
+        # Search structures per relationship depth, so nearer fields are searched (and
+        # found) first and a search stops as soon as it has enough results
+        levels = max((entry['depth'] for entry in entries), default=0) + 1
+        self._keys = [[] for _ in range(levels)]
+        self._positions = [[] for _ in range(levels)]
+        self._characters = [{} for _ in range(levels)]
+        self._lines = []
+        for position, entry in enumerate(entries):
+            path = entry['path'].lower()
+            label = entry['label'].lower()
+            # The full path, the path from every relationship on (so 'name' and 'owner.na' both
+            # match 'Parent.Owner.Name') and the label
+            segments = path.split('.')
+            suffixes = {'.'.join(segments[start:]) for start in range(len(segments))}
+            for key in suffixes | {label}:
+                self._keys[entry['depth']].append((key, position))
+            line = f"{path}\t{label}"
+            self._lines.append(line)
+            for character in set(line):
+                self._characters[entry['depth']].setdefault(character, set()).add(position)
+        for depth_keys, depth_positions in zip(self._keys, self._positions):
+            depth_keys.sort()
+            depth_positions.extend(position for _, position in depth_keys)
+            depth_keys[:] = [key for key, _ in depth_keys]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, path):
+        return self.by_path.get(path)
+
+    def prefix(self, text, limit=SEARCH_RESULTS):
+        """Entries whose path, relationship-relative path or label starts with text, nearest fields first."""
+        text = text.lower()
+        results = []
+        for keys, positions in zip(self._keys, self._positions):
+            found = set()
+            start = bisect.bisect_left(keys, text)
+            while start < len(keys) and keys[start].startswith(text):
+                found.add(positions[start])
+                start += 1
+            results.extend(sorted(found))
+            if len(results) >= limit:
+                break
+        return [self.entries[position] for position in results[:limit]]
+
+    def fuzzy(self, text, limit=SEARCH_RESULTS):
+        """Entries containing the characters of text in order (e.g. 'ownprnm' finds Owner.Profile.Name)."""
+        characters = [character for character in text.lower() if not character.isspace()]
+        if not characters:
+            return []
+        # Each character is matched at its first occurrence after the previous one, so a line
+        # is tested in one pass without backtracking
+        pattern = re.compile(''.join(f"[^{re.escape(character)}]*{re.escape(character)}" for character in characters))
+        scored = {}
+        for depth, index in enumerate(self._characters):
+            # Only entries holding every character of the search can match
+            candidate_sets = [index.get(character, set()) for character in set(characters)]
+            for position in sorted(set.intersection(*candidate_sets)):
+                match = pattern.match(self._lines[position])
+                if match:
+                    # Matches completed earlier in the path, and nearer fields, rank first
+                    scored[position] = match.end() + 3 * depth
+            if len(scored) >= limit:
+                break
+        positions = sorted(scored, key=lambda position: (scored[position], position))
+        return [self.entries[position] for position in positions[:limit]]
+
+    def search(self, text, limit=SEARCH_RESULTS):
+        """Prefix matches first, topped up with fuzzy matches; an empty search lists the object's own fields."""
+        text = (text or '').strip()
+        if not text:
+            return self.own_entries[:limit]
+        results = self.prefix(text, limit)
+        if len(results) < limit:
+            seen = {entry['path'] for entry in results}
+            results += [entry for entry in self.fuzzy(text, limit) if entry['path'] not in seen][:limit - len(results)]
+        return results
+
+
+def _field_entries(fields, object_name, path_prefix, label_prefix, depth):
+    return [{
+        'path': f"{path_prefix}{field['name']}",
+        'label': f"{label_prefix}{field['label']}",
+        'type': field['type'],
+        'object': object_name,
+        'depth': depth,
+        'field': field,
+    } for field in fields]
+
+
+def build_field_index(sf, object_name, depth=DEFAULT_DEPTH, max_entries=MAX_INDEX_ENTRIES):
+    """
+    Build the field index of an object, following single-target lookups up to depth levels.
+
+    Parents are described level by level on a thread pool through the metadata cache, so
+    each object is described once however many paths lead to it. Polymorphic lookups
+    (e.g. WhatId) are not followed, since SOQL only exposes their common fields.
+    """
+    depth = max(0, min(int(depth), MAX_DEPTH))
+    describes = {object_name: describe_sobject(sf, object_name)}
+    entries = _field_entries(describes[object_name]['fields'], object_name, '', '', 0)
+    # (object, path prefix, label prefix) of the relationships to expand at the next level
+    level = [(object_name, '', '')]
+    with ThreadPoolExecutor(max_workers=DESCRIBE_WORKERS) as executor:
+        for current_depth in range(1, depth + 1):
+            relationships = []
+            for parent_object, path_prefix, label_prefix in level:
+                for field in describes[parent_object]['fields']:
+                    targets = field.get('referenceTo') or []
+                    if field.get('relationshipName') and len(targets) == 1:
+                        relationships.append((
+                            targets[0],
+                            f"{path_prefix}{field['relationshipName']}.",
+                            f"{label_prefix}{field['label'].removesuffix(' ID')} > ",
+                        ))
+            missing = sorted({target for target, _, _ in relationships if target not in describes})
+            for target, describe in zip(missing, executor.map(lambda name: _describe_or_none(sf, name), missing)):
+                describes[target] = describe
+            level = []
+            for target, path_prefix, label_prefix in relationships:
+                if describes.get(target) is None:
+                    continue
+                entries.extend(_field_entries(describes[target]['fields'], target, path_prefix, label_prefix, current_depth))
+                level.append((target, path_prefix, label_prefix))
+                if len(entries) >= max_entries:
+                    return FieldIndex(object_name, entries[:max_entries], depth)
+    return FieldIndex(object_name, entries, depth)
+
+
+def _describe_or_none(sf, object_name):
+    try:
+        return describe_sobject(sf, object_name)
+    except Exception as e:
+        # Objects the user cannot see are left out of the index
+        print(f"Error describing {object_name} for the field index: {str(e)}")
+        return None
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def field_index(sf, object_name, depth=DEFAULT_DEPTH):
+    """Cached field index of an object; rebuilt once it is older than the describe cache TTL."""
+    key = (org_key(sf), object_name, depth)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None and time.time() - index.built_at < DEFAULT_TTL_SECONDS:
+            _indexes.move_to_end(key)
+            return index
+    index = build_field_index(sf, object_name, depth)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -2,6 +2,8 @@ import streamlit as st
 from simple_salesforce import Salesforce
 from datetime import datetime
 import base64
+from lookup_service import lookup_service
+from ui_widgets import lookup_select
 
 # Function to create a new contact
 def create_new_contact(sf):
@@ -11,7 +13,7 @@ def create_new_contact(sf):
     last_name = st.text_input("* Last Name")
     email = st.text_input("Email")
     phone = st.text_input("Phone")
-    account_name = st.selectbox("Account Name", ["Search Accounts..."] + get_account_names(sf))
+    account_name = lookup_select(sf, 'Account', "Account Name", key="contact_account")
 
     if st.button("Create Contact"):
         try:
@@ -32,7 +34,7 @@ def create_new_contact(sf):
 def create_new_opportunity(sf):
     st.title("New Opportunity")
     name = st.text_input("Opportunity Name")
-    account_name = st.selectbox("Account Name", ["Search Accounts..."] + get_account_names(sf))
+    account_name = lookup_select(sf, 'Account', "Account Name", key="opportunity_account")
     close_date = st.date_input("Close Date")
     stage = st.selectbox("Stage", ["--None--", "Prospecting", "Qualification", "Proposal", "Closed Won", "Closed Lost"])
     amount = st.number_input("Amount", min_value=0.0, format="%.2f")
@@ -56,20 +58,22 @@ def create_new_event(sf):
     st.title("New Event")
     
     event_name = st.text_input("Event Name")
-    related_contact = st.selectbox("Related To (Contact)", ["Search Contacts..."] + get_contact_names(sf))
-    related_account = st.selectbox("Related To (Account)", ["Search Accounts..."] + get_account_names(sf))
-    assigned_to = st.selectbox("Assigned To", ["Search Users..."] + get_user_names(sf))
+    related_contact = lookup_select(sf, 'Contact', "Related To (Contact)", key="event_contact")
+    related_account = lookup_select(sf, 'Account', "Related To (Account)", key="event_account")
+    assigned_to = lookup_select(sf, 'User', "Assigned To", key="event_owner")
     start_date = st.date_input("Start Date")
     start_time = st.time_input("Start Time")
     duration_minutes = st.number_input("Duration (in minutes)", min_value=1, value=30)
 
     if st.button("Create Event"):
         try:
+            # All three lookups are resolved together, in at most one request
+            ids = lookup_service.resolve(sf, [('Account', related_account), ('Contact', related_contact), ('User', assigned_to)])
             event = {
                 'Subject': event_name,
-                'WhatId': get_account_id_by_name(sf, related_account),
-                'WhoId': get_contact_id_by_name(sf, related_contact),
-                'OwnerId': get_user_id_by_name(sf, assigned_to),
+                'WhatId': ids[('Account', related_account)],
+                'WhoId': ids[('Contact', related_contact)],
+                'OwnerId': ids[('User', assigned_to)],
                 'ActivityDateTime': datetime.combine(start_date, start_time).isoformat(),
                 'DurationInMinutes': duration_minutes
             }
@@ -81,7 +85,7 @@ def create_new_event(sf):
 # Function to create a new case
 def create_new_case(sf):
     st.title("New Case")
-    contact_name = st.selectbox("Contact Name", ["Search Contacts..."] + get_contact_names(sf))
+    contact_name = lookup_select(sf, 'Contact', "Contact Name", key="case_contact")
     status = st.selectbox("Status", ["New", "Working", "Escalated", "Closed"])
     subject = st.text_input("Subject")
     description = st.text_area("Description")
@@ -124,30 +128,19 @@ def create_new_lead(sf):
         except Exception as e:
             st.error(f"Error creating lead: {e}")
 
-# Helper functions to fetch names and IDs
-def get_account_names(sf):
-    accounts = sf.query("SELECT Name FROM Account")
-    return [account['Name'] for account in accounts['records']]
-
-def get_contact_names(sf):
-    contacts = sf.query("SELECT Name FROM Contact")
-    return [contact['Name'] for contact in contacts['records']]
-
-def get_user_names(sf):
-    users = sf.query("SELECT Name FROM User")
-    return [user['Name'] for user in users['records']]
+# Helper functions to resolve names to IDs; names picked from a lookup are usually already known
+def get_id_by_name(sf, object_name, name):
+    return lookup_service.resolve(sf, [(object_name, name)])[(object_name, name)]
 
 def get_account_id_by_name(sf, account_name):
-    accounts = sf.query(f"SELECT Id FROM Account WHERE Name = '{account_name}'")
-    return accounts['records'][0]['Id'] if accounts['records'] else None
+    return get_id_by_name(sf, 'Account', account_name)
 
 def get_contact_id_by_name(sf, contact_name):
-    contacts = sf.query(f"SELECT Id FROM Contact WHERE Name = '{contact_name}'")
-    return contacts['records'][0]['Id'] if contacts['records'] else None
+    return get_id_by_name(sf, 'Contact', contact_name)
 
 def get_user_id_by_name(sf, user_name):
-    users = sf.query(f"SELECT Id FROM User WHERE Name = '{user_name}'")
-    return users['records'][0]['Id'] if users['records'] else None
+    return get_id_by_name(sf, 'User', user_name)
+
 # Function to upload a file
 def upload_file_to_salesforce(sf):
     st.title("Upload File")
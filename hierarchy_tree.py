@@ -0,0 +1,72 @@
+class TreeIndex:
+    """
+    Parent -> children index over flat records such as UserRole or Account rows.
+
+    Building the index is a single pass over the records, and every traversal is an
+    iterative depth-first search, so large or deep hierarchies stay linear-time and
+    never hit the Python recursion limit.
+    """
+
+    def __init__(self, records, id_key='Id', parent_key='ParentId', sort_key='Name'):
+        self.id_key = id_key
+        self.parent_key = parent_key
+        self.nodes = {}
+        self.children = {}
+        for record in records:
+            self.nodes[record[id_key]] = record
+        for node_id, record in self.nodes.items():
+            parent_id = record.get(parent_key)
+            if parent_id in self.nodes:
+                self.children.setdefault(parent_id, []).append(node_id)
+        # Records whose parent is empty or outside the data set are treated as roots
+        self.roots = [node_id for node_id, record in self.nodes.items() if record.get(parent_key) not in self.nodes]
+        if sort_key:
+            def order(node_id):
+                return str(self.nodes[node_id].get(sort_key) or '')
+            self.roots.sort(key=order)
+            for child_ids in self.children.values():
+                child_ids.sort(key=order)
+
+    def walk(self, start_ids=None, collapsed=(), max_depth=None):
+        """
+        Yield (record, depth) in depth-first order, parents before children.
+
+        Children of node Ids in collapsed are skipped (the collapsed node itself is yielded),
+        as is anything deeper than max_depth.
+        """
+        collapsed = set(collapsed)
+        stack = [(node_id, 0) for node_id in reversed(start_ids if start_ids is not None else self.roots)]
+        while stack:
+            node_id, depth = stack.pop()
+            yield self.nodes[node_id], depth
+            if node_id in collapsed or (max_depth is not None and depth >= max_depth):
+                continue
+            stack.extend((child_id, depth + 1) for child_id in reversed(self.children.get(node_id, [])))
+
+    def path_to_root(self, node_id):
+        """Return the records from node_id up to its root, starting with the node itself."""
+        path = []
+        seen = set()
+        while node_id in self.nodes and node_id not in seen:
+            seen.add(node_id)
+            record = self.nodes[node_id]
+            path.append(record)
+            node_id = record.get(self.parent_key)
+        return path
+
+    def subtree_ids(self, node_id):
+        """Return the Ids of node_id and all of its descendants."""
+        return [record[self.id_key] for record, _ in self.walk([node_id])]
+
+    def rollup(self, values):
+        """
+        Sum a per-node value over each subtree.
+
+        values maps node Id to a number (missing Ids count as 0). Returns a dict of
+        node Id to the total for that node and all of its descendants.
+        """
+        totals = {}
+        order = [record[self.id_key] for record, _ in self.walk()]
+        for node_id in reversed(order):
+            totals[node_id] = values.get(node_id, 0) + sum(totals.get(child_id, 0) for child_id in self.children.get(node_id, []))
+        return totals
@@ -1,6 +1,10 @@
 # home.py
 import streamlit as st
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from simple_salesforce import Salesforce
+from snapshot_store import read_snapshot, save_snapshot
+from api_governor import with_current_priority
 from global_actions import (
     create_new_contact,
     create_new_opportunity,
@@ -10,19 +14,65 @@ from global_actions import (
     upload_file_to_salesforce,
 )
 
+# How long fetched metrics are reused (the background sync refreshes them every two minutes),
+# and how long each metric may take before it is skipped
+METRICS_FRESHNESS_SECONDS = 180
+METRIC_TIMEOUT_SECONDS = 10
+
+# Shared pool so a slow metric never blocks the Streamlit script from finishing
+metrics_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='home-metrics')
+
+def count_query(sf, soql_query):
+    return sf.query(soql_query)['totalSize']
+
+# Each metric is fetched independently, so all of them run concurrently
+METRIC_FETCHERS = {
+    'active_users': lambda sf: count_query(sf, "SELECT COUNT() FROM User WHERE IsActive = true"),
+    'limits': lambda sf: sf.limits(),
+    'scheduled_jobs': lambda sf: count_query(sf, "SELECT COUNT() FROM AsyncApexJob WHERE Status = 'Queued'"),
+}
+
+def fetch_metrics_concurrently(sf, timeout=METRIC_TIMEOUT_SECONDS):
+    """Run every metric fetch in parallel; a metric that fails or exceeds its timeout comes back as None."""
+    futures = {name: metrics_executor.submit(with_current_priority(fetch), sf) for name, fetch in METRIC_FETCHERS.items()}
+    deadline = time.monotonic() + timeout
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FuturesTimeoutError:
+            print(f"Metric '{name}' timed out after {timeout} seconds")
+            results[name] = None
+        except Exception as e:
+            print(f"Error fetching metric '{name}': {str(e)}")
+            results[name] = None
+    return results
+
+def get_cached_metrics(sf, max_age=METRICS_FRESHNESS_SECONDS):
+    """
+    Return metrics fetched within the last max_age seconds for this org, refreshing them when stale.
+
+    The background sync keeps the 'home_metrics' snapshot fresh, so the page normally
+    renders without waiting on Salesforce.
+    """
+    cached, _ = read_snapshot(sf, 'home_metrics', max_age)
+    if cached is not None:
+        return cached
+    results = fetch_metrics_concurrently(sf)
+    # Only remember complete results so a timed-out metric is retried on the next render
+    if all(value is not None for value in results.values()):
+        save_snapshot(sf, 'home_metrics', results)
+    return results
+
 # Function to fetch data from Salesforce
-def get_salesforce_data(sf):
-    active_users_query = "SELECT COUNT() FROM User WHERE IsActive = true"
-    active_users_result = sf.query(active_users_query)
-    active_users_count = active_users_result['totalSize']
+def get_salesforce_data(sf, max_age=METRICS_FRESHNESS_SECONDS):
+    metrics = get_cached_metrics(sf, max_age)
+    active_users_count = metrics['active_users']
+    scheduled_jobs_count = metrics['scheduled_jobs']
 
-    limits_result = sf.limits()
+    limits_result = metrics['limits'] or {}
     api_calls_made = limits_result.get('DailyApiRequests', {}).get('Remaining', 0)
     api_calls_limit = limits_result.get('DailyApiRequests', {}).get('Max', 0)
-    
-    scheduled_jobs_query = "SELECT COUNT() FROM AsyncApexJob WHERE Status = 'Queued'"
-    scheduled_jobs_result = sf.query(scheduled_jobs_query)
-    scheduled_jobs_count = scheduled_jobs_result['totalSize']
 
     data_storage = limits_result.get('DataStorageMB', {}).get('Remaining', 0)
     file_storage = limits_result.get('FileStorageMB', {}).get('Remaining', 0)
@@ -86,11 +136,11 @@ def display_metrics(sf):
     
     col_a, col_b, col_c = st.columns(3)
     with col_a:
-        st.metric(label="Active Users", value=f"{active_users_count}")
+        st.metric(label="Active Users", value=f"{active_users_count if active_users_count is not None else 'N/A'}")
     with col_b:
         st.metric(label="Salesforce API Calls", value=f"{api_calls_made}", delta=f"{api_calls_limit - api_calls_made} remaining")
     with col_c:
-        st.metric(label="Scheduled Jobs", value=f"{scheduled_jobs_count}")
+        st.metric(label="Scheduled Jobs", value=f"{scheduled_jobs_count if scheduled_jobs_count is not None else 'N/A'}")
     
     st.markdown("---")
     st.markdown("### 📊 Storage & Email Quotas")
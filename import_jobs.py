@@ -0,0 +1,411 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import pandas as pd
+from bulk_api import Bulk2Client, BULK_OPERATIONS, DEFAULT_CHUNK_SIZE, JOB_TERMINAL_STATES, collect_job_results, read_csv_chunks, send_chunk
+from salesforce_api import COLLECTION_BATCH_SIZE, QueryCursor, send_collection
+from query_cache import invalidate_object
+from api_governor import BULK, api_priority
+
+# Journal database, kept next to the user_data.db of db_utils
+JOURNAL_DB = 'import_jobs.db'
+# Uploaded files are copied here so a job can still be resumed after the browser session is gone
+IMPORT_FILES_DIR = os.environ.get('IMPORT_FILES_DIR', 'import_files')
+
+IMPORT_MODES = ['rest', 'bulk']
+REST_OPERATIONS = ['insert', 'update', 'upsert']
+# A job in one of these states can be resumed; a 'running' job left behind by a stopped process is resumable too
+RESUMABLE_STATES = ('pending', 'running', 'interrupted')
+
+
+class ImportJobError(Exception):
+    """Raised for an import job that cannot be created, resumed or cancelled."""
+
+
+def _soql_string(value):
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def _chunk_records(chunk):
+    """Rows of a CSV chunk as Salesforce records; empty cells are left out rather than sent as blank strings."""
+    return [{field: value for field, value in row.items() if value != ''} for row in chunk.to_dict('records')]
+
+
+class ImportJournal:
+    """
+    SQLite journal of import jobs: one row per job, one per chunk sent and one per imported row.
+
+    A chunk is marked 'sent' before it goes to Salesforce and 'done' in the same transaction
+    that stores its row results and moves the job's next_chunk forward, so after a crash the
+    journal tells exactly which chunks landed and which one was in flight.
+    """
+
+    def __init__(self, db_path=JOURNAL_DB):
+        self.db_path = db_path
+        self._initialize_database()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _initialize_database(self):
+        conn = self._connect()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS import_jobs (
+                job_id TEXT PRIMARY KEY,
+                org TEXT,
+                sobject TEXT,
+                operation TEXT,
+                mode TEXT,
+                external_id_field TEXT,
+                file_name TEXT,
+                file_path TEXT,
+                chunk_size INTEGER,
+                total_rows INTEGER,
+                next_chunk INTEGER DEFAULT 0,
+                rows_done INTEGER DEFAULT 0,
+                succeeded INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                status TEXT,
+                error TEXT,
+                created_at REAL,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS import_chunks (
+                job_id TEXT,
+                chunk_number INTEGER,
+                first_row INTEGER,
+                row_count INTEGER,
+                state TEXT,
+                bulk_job_id TEXT,
+                PRIMARY KEY (job_id, chunk_number)
+            );
+            CREATE TABLE IF NOT EXISTS import_results (
+                job_id TEXT,
+                chunk_number INTEGER,
+                row_number INTEGER,
+                external_id TEXT,
+                record_id TEXT,
+                success INTEGER,
+                message TEXT
+            );
+            CREATE INDEX IF NOT EXISTS import_results_job ON import_results (job_id, chunk_number);
+        ''')
+        conn.commit()
+        conn.close()
+
+    # Jobs
+    def add_job(self, job):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('''
+            INSERT INTO import_jobs (job_id, org, sobject, operation, mode, external_id_field, file_name, file_path,
+                                     chunk_size, total_rows, status, created_at, updated_at)
+            VALUES (:job_id, :org, :sobject, :operation, :mode, :external_id_field, :file_name, :file_path,
+                    :chunk_size, :total_rows, 'pending', :now, :now)
+        ''', dict(job, now=now))
+        conn.commit()
+        conn.close()
+
+    def job(self, job_id):
+        conn = self._connect()
+        row = conn.execute('SELECT * FROM import_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def jobs(self, org=None):
+        conn = self._connect()
+        rows = conn.execute('SELECT * FROM import_jobs WHERE ? IS NULL OR org = ? ORDER BY created_at DESC', (org, org)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def set_status(self, job_id, status, error=None):
+        conn = self._connect()
+        conn.execute('UPDATE import_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?',
+                     (status, error, time.time(), job_id))
+        conn.commit()
+        conn.close()
+
+    # Chunks
+    def chunk(self, job_id, chunk_number):
+        conn = self._connect()
+        row = conn.execute('SELECT * FROM import_chunks WHERE job_id = ? AND chunk_number = ?', (job_id, chunk_number)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def mark_sent(self, job_id, chunk_number, first_row, row_count, bulk_job_id=None):
+        conn = self._connect()
+        conn.execute('''
+            INSERT OR REPLACE INTO import_chunks (job_id, chunk_number, first_row, row_count, state, bulk_job_id)
+            VALUES (?, ?, ?, ?, 'sent', ?)
+        ''', (job_id, chunk_number, first_row, row_count, bulk_job_id))
+        conn.commit()
+        conn.close()
+
+    def set_bulk_job(self, job_id, chunk_number, bulk_job_id):
+        conn = self._connect()
+        conn.execute('UPDATE import_chunks SET bulk_job_id = ? WHERE job_id = ? AND chunk_number = ?',
+                     (bulk_job_id, job_id, chunk_number))
+        conn.commit()
+        conn.close()
+
+    def complete_chunk(self, job_id, chunk_number, results):
+        """Store the row results of a chunk and move the job past it, in one transaction."""
+        succeeded = sum(1 for result in results if result['success'])
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM import_results WHERE job_id = ? AND chunk_number = ?', (job_id, chunk_number))
+            conn.executemany('''
+                INSERT INTO import_results (job_id, chunk_number, row_number, external_id, record_id, success, message)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(job_id, chunk_number, result.get('row_number'), result.get('external_id'), result.get('id'),
+                   int(bool(result['success'])), result.get('message')) for result in results])
+            conn.execute("UPDATE import_chunks SET state = 'done' WHERE job_id = ? AND chunk_number = ?", (job_id, chunk_number))
+            conn.execute('''
+                UPDATE import_jobs SET next_chunk = ?, rows_done = rows_done + ?, succeeded = succeeded + ?,
+                                       failed = failed + ?, updated_at = ?
+                WHERE job_id = ?
+            ''', (chunk_number + 1, len(results), succeeded, len(results) - succeeded, time.time(), job_id))
+        conn.close()
+
+    def results(self, job_id):
+        conn = self._connect()
+        df = pd.read_sql_query('''
+            SELECT chunk_number AS chunk, row_number AS "row", external_id, record_id, success, message
+            FROM import_results WHERE job_id = ? ORDER BY chunk_number, row_number
+        ''', conn, params=(job_id,))
+        conn.close()
+        df['success'] = df['success'].astype(bool)
+        return df
+
+
+# Shared by the import page of this process
+import_journal = ImportJournal()
+# Jobs being run by this process, so one job is never run twice at the same time
+_active_jobs = set()
+_active_lock = threading.Lock()
+
+
+def _count_rows(path):
+    return sum(len(chunk) for chunk in read_csv_chunks(path, DEFAULT_CHUNK_SIZE))
+
+
+def create_import_job(sf, sobject, file, operation='insert', mode='rest', external_id_field=None,
+                      chunk_size=None, file_name=None):
+    """
+    Journal a new import of a CSV file (path or uploaded file) and return its job id.
+
+    The file is copied into IMPORT_FILES_DIR so the job can be resumed later. REST jobs send
+    one sObject Collections request per chunk of 200 rows; bulk jobs one Bulk API 2.0 ingest
+    job per chunk of chunk_size rows.
+    """
+    if mode not in IMPORT_MODES:
+        raise ImportJobError(f"Unsupported import mode '{mode}'. Expected one of {IMPORT_MODES}.")
+    operations = REST_OPERATIONS if mode == 'rest' else BULK_OPERATIONS
+    if operation not in operations:
+        raise ImportJobError(f"The {mode} import does not support '{operation}'. Expected one of {operations}.")
+    if operation == 'upsert' and not external_id_field:
+        raise ImportJobError("An external ID field is required for upsert.")
+
+    job_id = uuid.uuid4().hex
+    os.makedirs(IMPORT_FILES_DIR, exist_ok=True)
+    file_path = os.path.join(IMPORT_FILES_DIR, f"{job_id}.csv")
+    if isinstance(file, str):
+        file_name = file_name or os.path.basename(file)
+        shutil.copyfile(file, file_path)
+    else:
+        file_name = file_name or getattr(file, 'name', 'upload.csv')
+        file.seek(0)
+        with open(file_path, 'wb') as target:
+            shutil.copyfileobj(file, target)
+
+    columns = set(pd.read_csv(file_path, nrows=0).columns)
+    missing = [field for field in ({'update': ['Id'], 'delete': ['Id']}.get(operation, []) + [external_id_field])
+               if field and field not in columns]
+    if missing:
+        os.remove(file_path)
+        raise ImportJobError(f"The file has no {', '.join(missing)} column.")
+
+    import_journal.add_job({
+        'job_id': job_id,
+        'org': sf.sf_instance,
+        'sobject': sobject,
+        'operation': operation,
+        'mode': mode,
+        'external_id_field': external_id_field,
+        'file_name': file_name,
+        'file_path': file_path,
+        'chunk_size': COLLECTION_BATCH_SIZE if mode == 'rest' else int(chunk_size or DEFAULT_CHUNK_SIZE),
+        'total_rows': _count_rows(file_path),
+    })
+    return job_id
+
+
+def _existing_ids(sf, sobject, external_id_field, values):
+    """Map external ID value -> record Id for the values that already exist in Salesforce."""
+    if not values:
+        return {}
+    in_list = ', '.join(_soql_string(value) for value in values)
+    # Errors are raised rather than read as "nothing exists", which would resend and duplicate the rows
+    records = QueryCursor(sf, f"SELECT Id, {external_id_field} FROM {sobject} WHERE {external_id_field} IN ({in_list})")
+    return {str(record[external_id_field]): record['Id'] for record in records}
+
+
+def _run_rest_chunk(sf, job, chunk_number, chunk, first_row, in_flight):
+    records = _chunk_records(chunk)
+    external_id_field = job['external_id_field']
+    external_ids = [record.get(external_id_field) for record in records] if external_id_field else [None] * len(records)
+    results = [None] * len(records)
+    if in_flight and job['operation'] == 'insert':
+        # The previous attempt may have created some of these rows before the process stopped
+        if external_id_field:
+            existing = _existing_ids(sf, job['sobject'], external_id_field, [value for value in external_ids if value])
+            for index, value in enumerate(external_ids):
+                if value in existing:
+                    results[index] = {'success': True, 'id': existing[value], 'message': 'Created by an earlier attempt'}
+        else:
+            print(f"Resending chunk {chunk_number} of import {job['job_id']}; rows created by the interrupted attempt may be duplicated.")
+    pending = [index for index, result in enumerate(results) if result is None]
+    if pending:
+        sent = send_collection(sf, job['sobject'], job['operation'], [records[index] for index in pending], external_id_field)
+        for index, result in zip(pending, sent):
+            results[index] = result
+    return [dict(result, row_number=first_row + index, external_id=external_ids[index])
+            for index, result in enumerate(results)]
+
+
+def _bulk_rows(job, result, chunk, first_row):
+    """
+    Journal rows for the successful, failed and unprocessed rows of a bulk ingest job.
+
+    Bulk results come back in no particular order, so each one is matched to its row of
+    the chunk by the values that were sent and numbered from first_row, as on the REST path.
+    """
+    external_id_field = job['external_id_field']
+    columns = list(chunk.columns)
+    row_numbers = {}
+    for index, values in enumerate(chunk.itertuples(index=False, name=None)):
+        row_numbers.setdefault(values, []).append(first_row + index)
+    rows = []
+    for key, success in (('successful', True), ('failed', False), ('unprocessed', False)):
+        for record in result[key].to_dict('records'):
+            matches = row_numbers.get(tuple(record.get(column, '') for column in columns))
+            rows.append({
+                'row_number': matches.pop(0) if matches else None,
+                'success': success,
+                'id': record.get('sf__Id') or record.get('Id'),
+                'external_id': record.get(external_id_field) if external_id_field else None,
+                'message': record.get('sf__Error') or ('OK' if success else 'Unprocessed'),
+            })
+    return rows
+
+
+def _recover_bulk_chunk(client, bulk_job_id):
+    """Results of a chunk's bulk job that was submitted before the import stopped, or None when it must be resent."""
+    job = client.get_job(bulk_job_id)
+    if job.get('state') == 'Open':
+        # The upload never completed, so nothing was processed
+        client.abort_job(bulk_job_id)
+        return None
+    if job.get('state') == 'Aborted':
+        return None
+    if job.get('state') not in JOB_TERMINAL_STATES:
+        job = client.wait_for_job(bulk_job_id)
+    return collect_job_results(client, job)
+
+
+def _run_bulk_chunk(client, job, chunk_number, chunk, first_row, in_flight_job_id):
+    result = _recover_bulk_chunk(client, in_flight_job_id) if in_flight_job_id else None
+    if result is None:
+        result = send_chunk(client, job['sobject'], job['operation'], chunk, job['external_id_field'],
+                            job_callback=lambda bulk_job: import_journal.set_bulk_job(job['job_id'], chunk_number, bulk_job['id']))
+    return _bulk_rows(job, result, chunk, first_row)
+
+
+def run_import_job(sf, job_id, progress_callback=None):
+    """
+    Run (or resume) an import job from its first unfinished chunk.
+
+    progress_callback, if given, is called with (rows_done, total_rows) after each chunk.
+    Returns the journaled job. A failure leaves the job 'interrupted' with the error, ready
+    to be resumed; a cancel from another session stops it before the next chunk.
+    """
+    job = import_journal.job(job_id)
+    if job is None:
+        raise ImportJobError(f"Import job {job_id} does not exist.")
+    if job['status'] not in RESUMABLE_STATES:
+        raise ImportJobError(f"Import job {job_id} is {job['status']} and cannot be resumed.")
+    if not os.path.exists(job['file_path']):
+        raise ImportJobError(f"The file of import job {job_id} is no longer available.")
+    with _active_lock:
+        if job_id in _active_jobs:
+            raise ImportJobError(f"Import job {job_id} is already running.")
+        _active_jobs.add(job_id)
+
+    import_journal.set_status(job_id, 'running')
+    rows_done = job['rows_done']
+    client = Bulk2Client.from_salesforce(sf) if job['mode'] == 'bulk' else None
+    try:
+        with api_priority(BULK):
+            for chunk_number, chunk in enumerate(read_csv_chunks(job['file_path'], job['chunk_size'])):
+                if chunk_number < job['next_chunk']:
+                    continue
+                if import_journal.job(job_id)['status'] == 'cancelled':
+                    os.remove(job['file_path'])
+                    return import_journal.job(job_id)
+                first_row = chunk_number * job['chunk_size']
+                previous = import_journal.chunk(job_id, chunk_number)
+                in_flight = previous is not None and previous['state'] == 'sent'
+                if not in_flight:
+                    import_journal.mark_sent(job_id, chunk_number, first_row, len(chunk))
+                if job['mode'] == 'bulk':
+                    rows = _run_bulk_chunk(client, job, chunk_number, chunk, first_row,
+                                           previous['bulk_job_id'] if in_flight else None)
+                else:
+                    rows = _run_rest_chunk(sf, job, chunk_number, chunk, first_row, in_flight)
+                import_journal.complete_chunk(job_id, chunk_number, rows)
+                rows_done += len(chunk)
+                if progress_callback:
+                    progress_callback(rows_done, job['total_rows'])
+        import_journal.set_status(job_id, 'completed')
+        os.remove(job['file_path'])
+    except Exception as e:
+        print(f"Import job {job_id} stopped: {str(e)}")
+        if import_journal.job(job_id)['status'] == 'cancelled':
+            # A cancel made while the chunk was running stands, so the copy of the file goes
+            if os.path.exists(job['file_path']):
+                os.remove(job['file_path'])
+        else:
+            import_journal.set_status(job_id, 'interrupted', str(e))
+    finally:
+        with _active_lock:
+            _active_jobs.discard(job_id)
+        invalidate_object(sf, job['sobject'])
+    return import_journal.job(job_id)
+
+
+def cancel_import_job(job_id):
+    """Stop a job before its next chunk and discard its copy of the file; imported rows stay in Salesforce."""
+    job = import_journal.job(job_id)
+    if job is None:
+        raise ImportJobError(f"Import job {job_id} does not exist.")
+    if job['status'] not in RESUMABLE_STATES:
+        raise ImportJobError(f"Import job {job_id} is already {job['status']}.")
+    import_journal.set_status(job_id, 'cancelled', job['error'])
+    with _active_lock:
+        running = job_id in _active_jobs
+    if not running and os.path.exists(job['file_path']):
+        os.remove(job['file_path'])
+
+
+def list_import_jobs(sf):
+    return import_journal.jobs(sf.sf_instance)
+
+
+def import_job_results(job_id):
+    """Row-level results of a job as a DataFrame (chunk, row, external_id, record_id, success, message)."""
+    return import_journal.results(job_id)
@@ -0,0 +1,143 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+from query_cache import cache_identity
+from resilience import idempotent_writes
+from salesforce_api import composite_request
+from soql import SoqlQuery, eq, starts_with
+
+# Type-ahead asks Salesforce for at most this many matches per search
+SEARCH_LIMIT = 20
+MIN_SEARCH_CHARACTERS = 2
+# Streamlit reruns the whole form on every change, so recent searches are answered locally
+SEARCH_TTL_SECONDS = 60
+ID_TTL_SECONDS = 600
+MAX_CACHED_SEARCHES = 256
+MAX_CACHED_IDS = 5000
+
+# Characters with a meaning in a SOSL search term
+SOSL_RESERVED = re.compile(r'([?&|!{}\[\]()^~*:\\"\'+-])')
+# Labels of records whose names are shared by several matches carry the Id, e.g. "Acme (001...)"
+LABELLED_ID = re.compile(r"\(([a-zA-Z0-9]{15}|[a-zA-Z0-9]{18})\)$")
+
+
+def escape_sosl(text):
+    return SOSL_RESERVED.sub(r'\\\1', text)
+
+
+def id_query(object_name, name):
+    """The query resolving a record name to its Id (the first match when names are shared)."""
+    return SoqlQuery(object_name, ['Id']).where(eq('Name', name)).limit(1).to_soql()
+
+
+class LookupService:
+    """
+    Record lookups by name for forms: server-side type-ahead and name-to-Id resolution.
+
+    Searches run a LIKE prefix query on Name (indexed on every object), falling back to a
+    SOSL search so words in the middle of a name match too; both are capped at the
+    search limit. Every name seen in a search is remembered with its Id per org and user,
+    so the lookups of a form usually resolve without a query at all; the rest are sent
+    together in one composite request.
+    """
+
+    def __init__(self, search_ttl=SEARCH_TTL_SECONDS, id_ttl=ID_TTL_SECONDS):
+        self.search_ttl = search_ttl
+        self.id_ttl = id_ttl
+        self._searches = OrderedDict()
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, entries, key, ttl):
+        with self._lock:
+            entry = entries.get(key)
+            if entry is None or time.time() - entry[1] >= ttl:
+                entries.pop(key, None)
+                return None
+            entries.move_to_end(key)
+            return entry[0]
+
+    def _store(self, entries, key, value, limit):
+        with self._lock:
+            entries[key] = (value, time.time())
+            entries.move_to_end(key)
+            while len(entries) > limit:
+                entries.popitem(last=False)
+
+    def remember(self, sf, object_name, name, record_id):
+        self._store(self._ids, (cache_identity(sf), object_name, name), record_id, MAX_CACHED_IDS)
+
+    def search(self, sf, object_name, text, limit=SEARCH_LIMIT):
+        """
+        Records of an object whose name starts with (or, failing that, contains a word
+        starting with) text, as (label, Id) pairs ordered by name. Names shared by several
+        matches get the Id in their label so each option resolves to one record.
+        """
+        text = text.strip()
+        if len(text) < MIN_SEARCH_CHARACTERS:
+            return []
+        key = (cache_identity(sf), object_name, text.lower(), limit)
+        matches = self._cached(self._searches, key, self.search_ttl)
+        if matches is not None:
+            return matches
+
+        query = SoqlQuery(object_name, ['Id', 'Name']).where(starts_with('Name', text)).order_by('Name').limit(limit)
+        records = sf.query(query.to_soql())['records']
+        if not records:
+            found = sf.search(f"FIND {{{escape_sosl(text)}*}} IN NAME FIELDS "
+                              f"RETURNING {object_name}(Id, Name ORDER BY Name LIMIT {int(limit)})")
+            records = (found or {}).get('searchRecords', [])
+
+        counts = {}
+        for record in records:
+            counts[record['Name']] = counts.get(record['Name'], 0) + 1
+        matches = [(record['Name'] if counts[record['Name']] == 1 else f"{record['Name']} ({record['Id']})", record['Id'])
+                   for record in records]
+        for label, record_id in matches:
+            self.remember(sf, object_name, label, record_id)
+        self._store(self._searches, key, matches, MAX_CACHED_SEARCHES)
+        return matches
+
+    def resolve(self, sf, lookups):
+        """
+        Ids of (object, name) pairs as a dict keyed by the pairs; names with no record map
+        to None. Remembered names are answered locally and the rest are looked up in a
+        single composite request.
+        """
+        resolved, pending = {}, []
+        for object_name, name in dict.fromkeys(lookups):
+            if not name:
+                resolved[(object_name, name)] = None
+                continue
+            labelled = LABELLED_ID.search(name)
+            record_id = labelled.group(1) if labelled else self._cached(
+                self._ids, (cache_identity(sf), object_name, name), self.id_ttl)
+            if record_id is not None:
+                resolved[(object_name, name)] = record_id
+            else:
+                pending.append((object_name, name))
+        if not pending:
+            return resolved
+
+        # Every subrequest is a read, so the composite call is safe to retry
+        with idempotent_writes():
+            results = composite_request(sf, [{'method': 'GET', 'url': f"query/?q={quote(id_query(object_name, name))}"}
+                                             for object_name, name in pending])
+        for (object_name, name), result in zip(pending, results):
+            if not result['success']:
+                raise RuntimeError(f"Failed to look up {object_name} '{name}': {result['body']}")
+            records = result['body'].get('records', [])
+            resolved[(object_name, name)] = records[0]['Id'] if records else None
+            if records:
+                self.remember(sf, object_name, name, records[0]['Id'])
+        return resolved
+
+    def clear(self):
+        with self._lock:
+            self._searches.clear()
+            self._ids.clear()
+
+
+lookup_service = LookupService()
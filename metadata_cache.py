@@ -0,0 +1,168 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from email.utils import formatdate
+from simple_salesforce.exceptions import SalesforceError
+
+METADATA_CACHE_DB = 'metadata_cache.db'
+DEFAULT_TTL_SECONDS = 3600
+MAX_MEMORY_ENTRIES = 256
+GLOBAL_DESCRIBE_KEY = '__global__'
+
+
+def org_key(sf):
+    """Identify the org (and API version) a Salesforce connection points at."""
+    return f"{sf.sf_instance}/v{sf.sf_version}"
+
+
+class MetadataCache:
+    """Describe() results keyed by org and object.
+
+    Entries live in an in-memory LRU and are persisted to SQLite, so a fresh process
+    starts warm. Once an entry is older than the TTL it is revalidated with an
+    If-Modified-Since request; a 304 answer just renews the entry.
+    """
+
+    def __init__(self, db_path=METADATA_CACHE_DB, ttl=DEFAULT_TTL_SECONDS, max_entries=MAX_MEMORY_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'revalidated': 0, 'fetched': 0}
+        self._initialize_database()
+
+    # Persistence
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def _initialize_database(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS describe_cache (
+                org TEXT,
+                object_name TEXT,
+                fetched_at REAL,
+                last_modified TEXT,
+                payload BLOB,
+                PRIMARY KEY (org, object_name)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _load_from_disk(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT fetched_at, last_modified, payload FROM describe_cache WHERE org = ? AND object_name = ?', key
+        ).fetchone()
+        conn.close()
+        if row:
+            return {'fetched_at': row[0], 'last_modified': row[1], 'payload': json.loads(zlib.decompress(row[2]))}
+        return None
+
+    def _save_to_disk(self, key, entry):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO describe_cache (org, object_name, fetched_at, last_modified, payload) VALUES (?, ?, ?, ?, ?)',
+            (*key, entry['fetched_at'], entry['last_modified'], zlib.compress(json.dumps(entry['payload']).encode('utf-8')))
+        )
+        conn.commit()
+        conn.close()
+
+    def _touch_on_disk(self, key, entry):
+        conn = self._connect()
+        conn.execute('UPDATE describe_cache SET fetched_at = ? WHERE org = ? AND object_name = ?', (entry['fetched_at'], *key))
+        conn.commit()
+        conn.close()
+
+    # In-memory LRU
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        entry = self._load_from_disk(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    # Fetching
+    @staticmethod
+    def _describe_path(object_name):
+        if object_name == GLOBAL_DESCRIBE_KEY:
+            return 'sobjects/'
+        return f"sobjects/{object_name}/describe/"
+
+    def _fetch(self, sf, key, entry):
+        """Fetch a describe, revalidating the cached copy when there is one."""
+        headers = {'If-Modified-Since': entry['last_modified']} if entry else {}
+        now = time.time()
+        try:
+            payload = sf.restful(self._describe_path(key[1]), headers=headers)
+        except SalesforceError as e:
+            if entry and getattr(e, 'status', None) == 304:
+                entry['fetched_at'] = now
+                self._touch_on_disk(key, entry)
+                self.stats['revalidated'] += 1
+                return entry
+            raise
+        entry = {'fetched_at': now, 'last_modified': formatdate(now, usegmt=True), 'payload': payload}
+        self._save_to_disk(key, entry)
+        self.stats['fetched'] += 1
+        return entry
+
+    def get(self, sf, object_name=GLOBAL_DESCRIBE_KEY):
+        key = (org_key(sf), object_name)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry and time.time() - entry['fetched_at'] < self.ttl:
+                self.stats['hits'] += 1
+                return entry['payload']
+            try:
+                entry = self._fetch(sf, key, entry)
+            except Exception as e:
+                if entry is None:
+                    raise
+                # Serve the stale copy rather than failing the page
+                print(f"Error revalidating describe for {object_name}, using cached copy: {str(e)}")
+                return entry['payload']
+            self._remember(key, entry)
+            return entry['payload']
+
+    def invalidate(self, sf, object_name=None):
+        """Drop one object (or every object of the org when object_name is None) from the cache."""
+        org = org_key(sf)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == org and object_name in (None, key[1])]:
+                del self._entries[key]
+            conn = self._connect()
+            if object_name is None:
+                conn.execute('DELETE FROM describe_cache WHERE org = ?', (org,))
+            else:
+                conn.execute('DELETE FROM describe_cache WHERE org = ? AND object_name = ?', (org, object_name))
+            conn.commit()
+            conn.close()
+
+
+# Process-wide cache shared by every page
+metadata_cache = MetadataCache()
+
+
+def describe_global(sf):
+    """Cached equivalent of sf.describe()."""
+    return metadata_cache.get(sf, GLOBAL_DESCRIBE_KEY)
+
+
+def describe_sobject(sf, object_name):
+    """Cached equivalent of sf.<object_name>.describe()."""
+    return metadata_cache.get(sf, object_name)
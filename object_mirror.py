@@ -0,0 +1,488 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from metadata_cache import describe_sobject
+from record_frame import flatten_records, soql_field_types
+from salesforce_api import QueryCursor
+from query_cache import cached_query_frame, cache_identity
+
+MIRROR_DIR = os.environ.get('OBJECT_MIRROR_DIR', 'object_mirror')
+MIRROR_STATE_DB = 'mirror_state.db'
+# Compound and binary fields cannot be stored as plain columns
+SKIPPED_FIELD_TYPES = ['address', 'location', 'base64']
+# Records modified in the same second as the watermark are fetched again and de-duplicated by Id
+WATERMARK_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+class MirrorError(Exception):
+    """Raised when a mirror is missing or cannot answer a query locally."""
+
+
+def mirror_fields(sf, object_name):
+    """Every field of an object that can be mirrored, with Id and SystemModstamp always included."""
+    fields = [field['name'] for field in describe_sobject(sf, object_name)['fields']
+              if field['type'] not in SKIPPED_FIELD_TYPES]
+    if 'SystemModstamp' not in fields:
+        raise MirrorError(f"{object_name} has no SystemModstamp field and cannot be synced incrementally.")
+    return fields
+
+
+class ObjectMirror:
+    """
+    Local Parquet copies of Salesforce objects, kept current with incremental syncs.
+
+    The first sync of an object pulls every row. Later syncs only query rows whose
+    SystemModstamp is at or after the stored watermark and drop rows that the Get
+    Deleted resource reports as deleted, so a repeat sync of an unchanged object costs
+    two API calls. Sync state (fields, watermark, row count) lives in a small SQLite
+    database next to the Parquet files. Mirrors belong to the org and user that synced
+    them, so no login is served rows its sharing settings would hide.
+    """
+
+    def __init__(self, base_dir=MIRROR_DIR):
+        self.base_dir = base_dir
+        self._locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(base_dir, exist_ok=True)
+        self._initialize_database()
+
+    # Sync state
+    def _connect(self):
+        return sqlite3.connect(os.path.join(self.base_dir, MIRROR_STATE_DB))
+
+    def _initialize_database(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS mirror_state (
+                org TEXT,
+                object_name TEXT,
+                fields TEXT,
+                watermark TEXT,
+                synced_at TEXT,
+                row_count INTEGER,
+                PRIMARY KEY (org, object_name)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _org(sf):
+        # A mirror holds what one user can read, so mirrors are kept per org and user
+        return '/'.join(cache_identity(sf))
+
+    def state(self, sf, object_name):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT fields, watermark, synced_at, row_count FROM mirror_state WHERE org = ? AND lower(object_name) = ?',
+            (self._org(sf), object_name.lower())
+        ).fetchone()
+        conn.close()
+        if row:
+            return {'object_name': object_name, 'fields': json.loads(row[0]), 'watermark': row[1],
+                    'synced_at': row[2], 'row_count': row[3]}
+        return None
+
+    def list_mirrors(self, sf):
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT object_name, watermark, synced_at, row_count FROM mirror_state WHERE org = ? ORDER BY object_name',
+            (self._org(sf),)
+        ).fetchall()
+        conn.close()
+        return [{'object_name': row[0], 'watermark': row[1], 'synced_at': row[2], 'row_count': row[3]} for row in rows]
+
+    def _save_state(self, sf, object_name, fields, watermark, synced_at, row_count):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO mirror_state (org, object_name, fields, watermark, synced_at, row_count) VALUES (?, ?, ?, ?, ?, ?)',
+            (self._org(sf), object_name, json.dumps(fields), watermark, synced_at, row_count)
+        )
+        conn.commit()
+        conn.close()
+
+    # Storage
+    def _path(self, sf, object_name):
+        instance, user = cache_identity(sf)
+        org_dir = os.path.join(self.base_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', instance),
+                               hashlib.sha256(user.encode('utf-8')).hexdigest()[:16])
+        os.makedirs(org_dir, exist_ok=True)
+        return os.path.join(org_dir, f"{object_name.lower()}.parquet")
+
+    def _write(self, sf, object_name, df):
+        path = self._path(sf, object_name)
+        df.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+    def _object_lock(self, sf, object_name):
+        with self._lock:
+            return self._locks.setdefault((self._org(sf), object_name.lower()), threading.Lock())
+
+    def has_mirror(self, sf, object_name):
+        return self.state(sf, object_name) is not None and os.path.exists(self._path(sf, object_name))
+
+    def load(self, sf, object_name, columns=None):
+        """Read a mirrored object (optionally only some columns) into a DataFrame."""
+        if not self.has_mirror(sf, object_name):
+            raise MirrorError(f"{object_name} is not mirrored yet. Sync it first.")
+        return pd.read_parquet(self._path(sf, object_name), columns=columns)
+
+    def remove(self, sf, object_name):
+        with self._object_lock(sf, object_name):
+            path = self._path(sf, object_name)
+            if os.path.exists(path):
+                os.remove(path)
+            conn = self._connect()
+            conn.execute('DELETE FROM mirror_state WHERE org = ? AND lower(object_name) = ?', (self._org(sf), object_name.lower()))
+            conn.commit()
+            conn.close()
+
+    # Syncing
+    def sync(self, sf, object_name, fields=None, full=False, progress_callback=None):
+        """
+        Bring the mirror of object_name up to date and return a summary dict.
+
+        A full load happens on the first sync, when full=True, or when the requested
+        fields differ from the mirrored ones; otherwise only the delta is fetched.
+        progress_callback, if given, is called with a status message.
+        """
+        fields = fields or mirror_fields(sf, object_name)
+        for required in ('SystemModstamp', 'Id'):
+            if required not in fields:
+                fields = [required] + list(fields)
+        with self._object_lock(sf, object_name):
+            state = self.state(sf, object_name)
+            if full or state is None or state['fields'] != fields or not os.path.exists(self._path(sf, object_name)):
+                return self._full_load(sf, object_name, fields, progress_callback)
+            return self._apply_delta(sf, object_name, state, progress_callback)
+
+    def _fetch(self, sf, soql_query):
+        return flatten_records(list(QueryCursor(sf, soql_query)), soql_field_types(sf, soql_query))
+
+    def _full_load(self, sf, object_name, fields, progress_callback=None):
+        started = datetime.now(timezone.utc)
+        if progress_callback:
+            progress_callback(f"Loading all {object_name} records...")
+        df = self._fetch(sf, f"SELECT {', '.join(fields)} FROM {object_name}")
+        self._write(sf, object_name, df)
+        self._save_state(sf, object_name, fields, self._watermark(df, started), started.isoformat(), len(df))
+        return {'object_name': object_name, 'mode': 'full', 'upserted': len(df), 'deleted': 0, 'row_count': len(df)}
+
+    @staticmethod
+    def _watermark(df, fallback):
+        if df.empty or df['SystemModstamp'].isna().all():
+            return fallback.strftime(WATERMARK_FORMAT)
+        return df['SystemModstamp'].max().strftime(WATERMARK_FORMAT)
+
+    def _deleted_ids(self, sf, object_name, since, until, existing_ids):
+        """Ids removed since the last sync: from Get Deleted when possible, else by comparing Id lists."""
+        describe = describe_sobject(sf, object_name)
+        if describe.get('replicateable') and until - since < timedelta(days=29):
+            # The window must be at least a minute long
+            start = min(since - timedelta(minutes=1), until - timedelta(minutes=1))
+            try:
+                result = sf.__getattr__(object_name).deleted(start, until)
+                earliest = result.get('earliestDateAvailable')
+                if not earliest or pd.Timestamp(earliest) <= pd.Timestamp(start):
+                    return {record['id'] for record in result.get('deletedRecords', [])}
+            except Exception as e:
+                print(f"Get Deleted failed for {object_name}, comparing Ids instead: {str(e)}")
+        current_ids = {record['Id'] for record in QueryCursor(sf, f"SELECT Id FROM {object_name}")}
+        return set(existing_ids) - current_ids
+
+    def _apply_delta(self, sf, object_name, state, progress_callback=None):
+        started = datetime.now(timezone.utc)
+        if progress_callback:
+            progress_callback(f"Fetching {object_name} changes since {state['watermark']}...")
+        changed = self._fetch(
+            sf, f"SELECT {', '.join(state['fields'])} FROM {object_name} WHERE SystemModstamp >= {state['watermark']}"
+        )
+        existing = self.load(sf, object_name)
+        deleted = self._deleted_ids(sf, object_name, datetime.fromisoformat(state['synced_at']), started, existing['Id'])
+
+        changed_ids = set(changed['Id']) if not changed.empty else set()
+        removed = int(existing['Id'].isin(deleted - changed_ids).sum())
+        kept = existing[~existing['Id'].isin(deleted | changed_ids)]
+        df = pd.concat([kept, changed], ignore_index=True) if not changed.empty else kept.reset_index(drop=True)
+        # Concatenating categoricals with different categories falls back to object
+        for column in existing.columns:
+            if isinstance(existing[column].dtype, pd.CategoricalDtype) and column in df:
+                df[column] = df[column].astype('category')
+
+        self._write(sf, object_name, df)
+        watermark = max(state['watermark'], self._watermark(changed, started)) if not changed.empty else state['watermark']
+        self._save_state(sf, object_name, state['fields'], watermark, started.isoformat(), len(df))
+        return {'object_name': object_name, 'mode': 'delta', 'upserted': len(changed), 'deleted': removed, 'row_count': len(df)}
+
+    # Local queries
+    def query(self, sf, soql_query):
+        """
+        Answer a SOQL query from the mirror instead of Salesforce.
+
+        Supports plain field lists on one mirrored object with WHERE (comparisons, LIKE,
+        IN / NOT IN, AND / OR / NOT, parentheses), ORDER BY, LIMIT and OFFSET. Anything
+        else (relationship fields, sub-queries, aggregates, date literals such as
+        LAST_N_DAYS) raises MirrorError so the caller can fall back to Salesforce.
+        """
+        parsed = parse_local_query(soql_query)
+        state = self.state(sf, parsed['object_name'])
+        if state is None:
+            raise MirrorError(f"{parsed['object_name']} is not mirrored yet. Sync it first.")
+        canonical = {field.lower(): field for field in state['fields']}
+        missing = [field for field in parsed['referenced'] if field.lower() not in canonical]
+        if missing:
+            raise MirrorError(f"The mirror of {parsed['object_name']} has no column(s) {', '.join(missing)}.")
+
+        df = self.load(sf, parsed['object_name'], columns=sorted({canonical[field.lower()] for field in parsed['referenced']}))
+        if parsed['where'] is not None:
+            df = df[evaluate_condition(df, parsed['where'], canonical)]
+        if parsed['order_by']:
+            columns = [canonical[field.lower()] for field, _, _ in parsed['order_by']]
+            ascending = [direction == 'ASC' for _, direction, _ in parsed['order_by']]
+            nulls_first = parsed['order_by'][0][2] == 'FIRST'
+            df = df.sort_values(columns, ascending=ascending, na_position='first' if nulls_first else 'last', kind='stable')
+        offset = parsed['offset'] or 0
+        if parsed['limit'] is not None:
+            df = df.iloc[offset:offset + parsed['limit']]
+        elif offset:
+            df = df.iloc[offset:]
+        return df[[canonical[field.lower()] for field in parsed['fields']]].reset_index(drop=True)
+
+
+# Minimal SOQL reader for local queries
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:\\.|[^'\\])*')
+      | (?P<datetime>\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2}))?)(?![\w.])
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<operator>!=|<>|<=|>=|=|<|>)
+      | (?P<punct>[(),])
+      | (?P<word>[A-Za-z_][\w.]*(?::\d+)?)
+    )""", re.VERBOSE)
+KEYWORDS = {'select', 'from', 'where', 'and', 'or', 'not', 'in', 'like', 'order', 'by', 'asc', 'desc',
+            'nulls', 'first', 'last', 'limit', 'offset', 'null', 'true', 'false'}
+
+
+def _tokenize(text):
+    tokens, position = [], 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            raise MirrorError(f"Cannot run this query locally near: {text[position:position + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'word' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.upper()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.referenced = set()
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token_kind, token_value = self.peek()
+        if token_kind == kind and (value is None or token_value == value):
+            self.position += 1
+            return token_value
+        return None
+
+    def expect(self, kind, value=None):
+        result = self.accept(kind, value)
+        if result is None:
+            raise MirrorError(f"Cannot run this query locally: expected {value or kind}, found {self.peek()[1]!r}.")
+        return result
+
+    def field(self):
+        name = self.expect('word')
+        if '.' in name or ':' in name:
+            raise MirrorError(f"'{name}' cannot be evaluated against the mirror.")
+        self.referenced.add(name)
+        return name
+
+    def literal(self):
+        kind, value = self.next()
+        if kind == 'string':
+            return re.sub(r"\\(.)", r"\1", value[1:-1])
+        if kind == 'number':
+            return float(value)
+        if kind == 'datetime':
+            stamp = pd.Timestamp(value)
+            return stamp.tz_convert('UTC').tz_localize(None) if stamp.tzinfo else stamp
+        if kind == 'keyword' and value in ('TRUE', 'FALSE'):
+            return value == 'TRUE'
+        if kind == 'keyword' and value == 'NULL':
+            return None
+        raise MirrorError(f"Cannot run this query locally: unsupported value {value!r}.")
+
+    # condition := term (OR term)* ; term := factor (AND factor)*
+    def condition(self):
+        node = self.term()
+        while self.accept('keyword', 'OR'):
+            node = ('or', node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.accept('keyword', 'AND'):
+            node = ('and', node, self.factor())
+        return node
+
+    def factor(self):
+        if self.accept('keyword', 'NOT'):
+            return ('not', self.factor())
+        if self.accept('punct', '('):
+            node = self.condition()
+            self.expect('punct', ')')
+            return node
+        name = self.field()
+        negated = self.accept('keyword', 'NOT') is not None
+        if self.accept('keyword', 'IN'):
+            self.expect('punct', '(')
+            values = [self.literal()]
+            while self.accept('punct', ','):
+                values.append(self.literal())
+            self.expect('punct', ')')
+            return ('not_in' if negated else 'in', name, values)
+        if negated:
+            raise MirrorError("Cannot run this query locally: NOT must be followed by IN.")
+        if self.accept('keyword', 'LIKE'):
+            return ('like', name, self.literal())
+        operator = self.expect('operator')
+        return ('!=' if operator == '<>' else operator, name, self.literal())
+
+
+def parse_local_query(soql_query):
+    """Parse a single-object SOQL query into its fields, WHERE tree, ORDER BY, LIMIT and OFFSET."""
+    parser = _Parser(_tokenize(soql_query))
+    parser.expect('keyword', 'SELECT')
+    fields = [parser.field()]
+    while parser.accept('punct', ','):
+        fields.append(parser.field())
+    parser.expect('keyword', 'FROM')
+    object_name = parser.expect('word')
+
+    where = None
+    if parser.accept('keyword', 'WHERE'):
+        where = parser.condition()
+    order_by = []
+    if parser.accept('keyword', 'ORDER'):
+        parser.expect('keyword', 'BY')
+        while True:
+            name = parser.field()
+            direction = parser.accept('keyword', 'DESC') or parser.accept('keyword', 'ASC') or 'ASC'
+            nulls = 'FIRST' if direction == 'ASC' else 'LAST'
+            if parser.accept('keyword', 'NULLS'):
+                nulls = parser.accept('keyword', 'FIRST') or parser.expect('keyword', 'LAST')
+            order_by.append((name, direction, nulls))
+            if not parser.accept('punct', ','):
+                break
+    limit = int(parser.expect('number')) if parser.accept('keyword', 'LIMIT') else None
+    offset = int(parser.expect('number')) if parser.accept('keyword', 'OFFSET') else None
+    if parser.peek()[0] is not None:
+        raise MirrorError(f"Cannot run this query locally near {parser.peek()[1]!r}.")
+    return {'fields': fields, 'object_name': object_name, 'where': where, 'order_by': order_by,
+            'limit': limit, 'offset': offset, 'referenced': parser.referenced | set(fields)}
+
+
+def _is_text(series):
+    return not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)
+                or pd.api.types.is_bool_dtype(series))
+
+
+def evaluate_condition(df, node, canonical):
+    """Boolean mask of the rows matching a parsed WHERE tree; text comparisons are case-insensitive like SOQL."""
+    operator = node[0]
+    if operator == 'and':
+        return evaluate_condition(df, node[1], canonical) & evaluate_condition(df, node[2], canonical)
+    if operator == 'or':
+        return evaluate_condition(df, node[1], canonical) | evaluate_condition(df, node[2], canonical)
+    if operator == 'not':
+        return ~evaluate_condition(df, node[1], canonical)
+
+    series = df[canonical[node[1].lower()]]
+    value = node[2]
+    text = _is_text(series)
+    if text:
+        series = series.astype('string').str.lower()
+
+    def fold(item):
+        return item.lower() if text and isinstance(item, str) else item
+
+    if operator in ('in', 'not_in'):
+        values = [fold(item) for item in value if item is not None]
+        mask = series.isin(values)
+        if None in value:
+            mask = mask | series.isna()
+        return ~mask.fillna(False).astype(bool) if operator == 'not_in' else mask.fillna(False).astype(bool)
+    if value is None:
+        if operator == '=':
+            return series.isna()
+        if operator == '!=':
+            return series.notna()
+        raise MirrorError("Only = and != can compare with null.")
+    if operator == 'like':
+        pattern = '^' + re.escape(fold(value)).replace('%', '.*').replace('_', '.') + '$'
+        return series.str.match(pattern).fillna(False).astype(bool)
+
+    value = fold(value)
+    comparisons = {
+        '=': lambda: series == value,
+        '!=': lambda: series != value,
+        '<': lambda: series < value,
+        '<=': lambda: series <= value,
+        '>': lambda: series > value,
+        '>=': lambda: series >= value,
+    }
+    mask = comparisons[operator]()
+    if operator == '!=':
+        # SOQL treats null as different from any value
+        return mask.fillna(True).astype(bool)
+    return mask.fillna(False).astype(bool)
+
+
+# Process-wide mirror store; set OBJECT_MIRROR_DIR to keep it elsewhere
+object_mirror = ObjectMirror()
+
+
+def sync_object(sf, object_name, fields=None, full=False, progress_callback=None):
+    return object_mirror.sync(sf, object_name, fields, full, progress_callback)
+
+
+def query_mirror(sf, soql_query):
+    return object_mirror.query(sf, soql_query)
+
+
+def query_frame(sf, soql_query, fetch_frame, prefer_mirror=True):
+    """
+    Answer a query from the local mirror when it can, otherwise through the query cache.
+
+    fetch_frame() is only called when neither the mirror nor the cache has the answer.
+    Returns (frame, source) where source is 'mirror', 'cache' or 'salesforce'.
+    """
+    if prefer_mirror:
+        try:
+            return query_mirror(sf, soql_query), 'mirror'
+        except MirrorError:
+            pass
+    frame, from_cache = cached_query_frame(sf, soql_query, fetch_frame)
+    return frame, 'cache' if from_cache else 'salesforce'
@@ -0,0 +1,246 @@
+from datetime import datetime
+from io import BytesIO
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth, getFont
+from reportlab.platypus import SimpleDocTemplate, LongTable, Table, TableStyle, Paragraph, Spacer, Image
+
+MARGIN = 0.5 * inch
+HEADER_FONT = 'Helvetica-Bold'
+BODY_FONT = 'Helvetica'
+HEADER_FONT_SIZE = 9
+BODY_FONT_SIZE = 8
+HEADER_ROW_HEIGHT = 18
+ROW_HEIGHT = 12
+CELL_PADDING = 6
+MIN_COLUMN_WIDTH = 0.5 * inch
+MAX_COLUMN_WIDTH = 3 * inch
+# Rows measured when sizing the columns of a table
+WIDTH_SAMPLE_ROWS = 500
+
+# Every command that touches the body is applied cell by cell, so the body only gets one;
+# left alignment and bottom alignment are the defaults (left-aligned cells are drawn without
+# measuring each string again)
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONT', (0, 0), (-1, 0), HEADER_FONT, HEADER_FONT_SIZE),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+    ('FONT', (0, 1), (-1, -1), BODY_FONT, BODY_FONT_SIZE),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+])
+
+
+def cell_text(value):
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+_glyph_widths = {}
+
+
+def _glyph_width_table(font):
+    if font not in _glyph_widths:
+        _glyph_widths[font] = getFont(font).widths
+    return _glyph_widths[font]
+
+
+def text_width(text, font=BODY_FONT, size=BODY_FONT_SIZE):
+    """stringWidth with a fast path for Latin-1 text, which the standard fonts cover glyph by glyph."""
+    try:
+        encoded = text.encode('latin-1')
+    except UnicodeEncodeError:
+        return stringWidth(text, font, size)
+    return sum(map(_glyph_width_table(font).__getitem__, encoded)) * size / 1000
+
+
+def fit_text(text, width, font=BODY_FONT, size=BODY_FONT_SIZE):
+    """Cut text so it fits a column of the given width, ending it with '...' when shortened."""
+    text = text.replace('\n', ' ')
+    available = width - CELL_PADDING
+    # Helvetica glyphs are at most about one em wide, so short strings need no measuring
+    if len(text) * size * 1.02 <= available or text_width(text, font, size) <= available:
+        return text
+    available -= text_width('...', font, size)
+    try:
+        glyphs = list(map(_glyph_width_table(font).__getitem__, text.encode('latin-1')))
+        scale = size / 1000
+    except UnicodeEncodeError:
+        glyphs = [stringWidth(character, font, size) for character in text]
+        scale = 1
+    used = 0
+    for position, glyph in enumerate(glyphs):
+        used += glyph * scale
+        if used > available:
+            return text[:position] + '...'
+    return text
+
+
+def fit_column(values, width):
+    """Cell texts of one column cut to its width; columns whose longest text clearly fits are not measured."""
+    texts = [cell_text(value) for value in values]
+    if max(map(len, texts), default=0) * BODY_FONT_SIZE * 1.02 <= width - CELL_PADDING:
+        return [text.replace('\n', ' ') for text in texts]
+    return [fit_text(text, width) for text in texts]
+
+
+def natural_column_widths(df, headers):
+    """Width each column needs for its header and (a sample of) its values, within the min/max bounds."""
+    sample = df.head(WIDTH_SAMPLE_ROWS)
+    widths = []
+    for position, header in enumerate(headers):
+        width = text_width(str(header), HEADER_FONT, HEADER_FONT_SIZE)
+        for value in sample.iloc[:, position]:
+            width = max(width, text_width(cell_text(value)))
+        widths.append(min(max(width + CELL_PADDING + 2, MIN_COLUMN_WIDTH), MAX_COLUMN_WIDTH))
+    return widths
+
+
+def fit_column_widths(widths, available):
+    """Shrink column widths proportionally so the table fits the page width."""
+    total = sum(widths)
+    if total <= available:
+        return list(widths)
+    return [width * available / total for width in widths]
+
+
+class _FlowableStream(list):
+    """
+    The flowable list handed to reportlab, filled from a generator as the document consumes it.
+
+    reportlab only looks at the head of the list, so just the next table or two exists at
+    any time instead of one flowable per page of the whole report.
+    """
+
+    def __init__(self, flowables):
+        super().__init__()
+        self._source = iter(flowables)
+
+    def _fill(self):
+        while list.__len__(self) < 2:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                break
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+
+class PdfReport:
+    """
+    Shared builder for the app's PDF reports: titles, text, images and DataFrame tables.
+
+    Tables are rendered as one LongTable per page of rows, with a repeating header row,
+    fixed row heights and column widths worked out once from a sample of the data, so
+    layout time grows linearly with the row count. Pages are laid out as the tables are
+    generated, and the page turns landscape when a table is too wide for portrait.
+    """
+
+    def __init__(self, title=None, pagesize=letter):
+        self.pagesize = pagesize
+        self.styles = getSampleStyleSheet()
+        self.parts = []
+        self.wide = False
+        if title:
+            self.add_title(title)
+
+    def add_title(self, text):
+        self.parts.append(('flowable', Paragraph(text, self.styles['Title'])))
+        return self
+
+    def add_paragraph(self, text, style='Normal'):
+        self.parts.append(('flowable', Paragraph(text, self.styles[style])))
+        return self
+
+    def add_spacer(self, height=0.25 * inch):
+        self.parts.append(('flowable', Spacer(1, height)))
+        return self
+
+    def add_image(self, path, width=6 * inch, height=4 * inch):
+        self.parts.append(('flowable', Image(path, width, height)))
+        return self
+
+    def add_timestamp(self, label="Report generated on:"):
+        self.add_spacer()
+        timestamp = Table([[label, datetime.now().strftime("%Y-%m-%d %H:%M:%S")]], colWidths=[2.5 * inch, 2.5 * inch])
+        timestamp.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+            ('FONTNAME', (0, 0), (-1, -1), HEADER_FONT),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        self.parts.append(('flowable', timestamp))
+        return self
+
+    def add_table(self, df, headers=None):
+        """Add a DataFrame as a table; headers optionally relabels its columns."""
+        headers = [str(header) for header in (headers or df.columns)]
+        widths = natural_column_widths(df, headers)
+        portrait_width = self.pagesize[0] - 2 * MARGIN
+        if sum(widths) > portrait_width:
+            self.wide = True
+        self.parts.append(('table', (df, headers, widths)))
+        return self
+
+    def _page_size(self):
+        return landscape(self.pagesize) if self.wide else self.pagesize
+
+    def _table_flowables(self, df, headers, widths, frame_width, frame_height):
+        widths = fit_column_widths(widths, frame_width)
+        header = [fit_text(header, width, HEADER_FONT, HEADER_FONT_SIZE) for header, width in zip(headers, widths)]
+        rows_per_page = max(int((frame_height - HEADER_ROW_HEIGHT) // ROW_HEIGHT) - 1, 1)
+        if df.empty:
+            table = LongTable([header], colWidths=widths, rowHeights=[HEADER_ROW_HEIGHT])
+            table.setStyle(TABLE_STYLE)
+            yield table
+            return
+        for start in range(0, len(df), rows_per_page):
+            chunk = df.iloc[start:start + rows_per_page]
+            columns = [fit_column(chunk.iloc[:, position], width) for position, width in enumerate(widths)]
+            rows = [list(row) for row in zip(*columns)]
+            # A chunk is a page of rows; the first one may still split after a title, hence repeatRows
+            table = LongTable([header] + rows, colWidths=widths, repeatRows=1,
+                              rowHeights=[HEADER_ROW_HEIGHT] + [ROW_HEIGHT] * len(rows))
+            table.setStyle(TABLE_STYLE)
+            yield table
+
+    def _flowables(self, frame_width, frame_height):
+        for kind, part in self.parts:
+            if kind == 'table':
+                yield from self._table_flowables(*part, frame_width, frame_height)
+            else:
+                yield part
+
+    def build(self, target=None):
+        """Write the report to a file path or file-like target; without a target the PDF bytes are returned."""
+        output = BytesIO() if target is None else target
+        doc = SimpleDocTemplate(output, pagesize=self._page_size(), leftMargin=MARGIN, rightMargin=MARGIN,
+                                topMargin=MARGIN, bottomMargin=MARGIN)
+        # Frames have 6pt of padding on each side
+        doc.build(_FlowableStream(self._flowables(doc.width - 12, doc.height - 12)))
+        if target is None:
+            return output.getvalue()
+        return target
+
+
+def dataframe_to_pdf(df, title=None, headers=None, timestamp=False, target=None):
+    """A PDF report of one DataFrame: optional title, the table and an optional generated-on stamp."""
+    report = PdfReport(title)
+    report.add_table(df, headers)
+    if timestamp:
+        report.add_timestamp()
+    return report.build(target)
@@ -1,23 +1,33 @@
 import streamlit as st
 import pandas as pd
-from salesforce_api import retrieve_records, create_record, update_record, delete_record
+from salesforce_api import retrieve_records, create_record, update_record, delete_record, update_records, delete_records
+from query_cache import query_cache
+from result_grid import query_grid_source
+from ui_widgets import show_result_grid, show_query_plan
+from record_frame import flatten_records
 
 def show_query_builder(sf):
     query_action = st.sidebar.selectbox(
         "Query Actions",
-        ['Fetch Records', 'Create Record', 'Update Record', 'Delete Record']
+        ['Fetch Records', 'Create Record', 'Update Record', 'Delete Record', 'Bulk Edit Records']
     )
 
     if query_action == 'Fetch Records':
         st.subheader("SOQL Query Runner")
         query = st.text_area("Enter SOQL Query", "SELECT Id, Name FROM Account LIMIT 10")
+        use_cache = st.checkbox("Use cached results when available", value=True)
+        show_query_plan(sf, query, key='query_runner_plan')
         if st.button("Run Query"):
-            records = retrieve_records(sf, query)
-            if records:
-                df = pd.DataFrame(records)
-                st.dataframe(df)
-            else:
-                st.error("No records fetched or query failed.")
+            try:
+                st.session_state['query_runner_source'] = query_grid_source(sf, query, use_cache=use_cache)
+            except Exception as e:
+                st.error(f"Query failed: {str(e)}")
+        if 'query_runner_source' in st.session_state:
+            source, origin = st.session_state['query_runner_source']
+            if origin == 'cache':
+                st.caption("Served from the query cache.")
+            show_result_grid(source, key='query_runner_grid')
+        show_query_cache_stats()
 
     elif query_action == 'Create Record':
         st.subheader("Create Record")
@@ -77,5 +87,93 @@ def show_query_builder(sf):
                 else:
                     st.error(f"Failed to delete record: {result.get('message')}")
 
+    elif query_action == 'Bulk Edit Records':
+        show_bulk_editor(sf)
+
+def show_query_cache_stats():
+    """Display hit/miss statistics of the shared query result cache."""
+    with st.expander("Query cache statistics"):
+        stats = query_cache.summary()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hits", stats['hits'])
+        col2.metric("Misses", stats['misses'])
+        col3.metric("Hit Rate", f"{stats['hit_rate']:.0%}")
+        col4.metric("Entries", stats['entries'])
+        st.caption(f"{stats['memory_mb']} MB in memory, {stats['evictions']} evictions, "
+                   f"{stats['invalidations']} invalidations, {stats['disk_hits']} disk hits.")
+        if st.button("Clear query cache"):
+            query_cache.clear()
+            st.success("Query cache cleared.")
+
+def _cell_changed(before, after):
+    """Compare two grid cells, treating missing values (None, NaN, pd.NA) as equal to each other."""
+    if pd.isna(before) or pd.isna(after):
+        return pd.isna(before) != pd.isna(after)
+    return before != after
+
+def _to_salesforce_value(value):
+    """Convert a pandas/numpy cell value into a JSON-serializable value for the REST API."""
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+def show_bulk_editor(sf):
+    """Edit many records in a grid and save the changes with batched sObject Collections calls."""
+    st.subheader("Bulk Edit Records")
+    sobject = st.text_input("Salesforce Object Type (e.g., Account)", key='bulk_sobject')
+    fields = st.text_input("Fields to edit (comma separated)", "Name", key='bulk_fields')
+    where_clause = st.text_input("Optional WHERE clause (without WHERE)", key='bulk_where')
+    limit = st.number_input("Maximum records", min_value=1, max_value=50000, value=2000, step=100, key='bulk_limit')
+
+    if st.button("Fetch Records to Edit", key='bulk_fetch'):
+        field_list = ['Id'] + [field.strip() for field in fields.split(',') if field.strip() and field.strip() != 'Id']
+        query = f"SELECT {', '.join(field_list)} FROM {sobject}"
+        if where_clause:
+            query += f" WHERE {where_clause}"
+        query += f" LIMIT {int(limit)}"
+        records = retrieve_records(sf, query)
+        if records:
+            df = flatten_records(records).reindex(columns=field_list)
+            df.insert(0, 'Delete', False)
+            st.session_state['bulk_original'] = df
+            st.session_state['bulk_sobject_loaded'] = sobject
+        else:
+            st.error("No records found or query failed.")
+
+    if 'bulk_original' in st.session_state:
+        original = st.session_state['bulk_original']
+        edited = st.data_editor(original, disabled=['Id'], hide_index=True, key='bulk_grid')
+
+        if st.button("Save Changes", key='bulk_save'):
+            editable_columns = [col for col in original.columns if col not in ('Delete', 'Id')]
+            to_delete = edited.loc[edited['Delete'], 'Id'].tolist()
+            changed = []
+            for (_, before), (_, after) in zip(original.iterrows(), edited.iterrows()):
+                if after['Delete']:
+                    continue
+                diff = {col: _to_salesforce_value(after[col]) for col in editable_columns
+                        if _cell_changed(before[col], after[col])}
+                if diff:
+                    changed.append({'Id': after['Id'], **diff})
+
+            results = []
+            if changed:
+                for record, result in zip(changed, update_records(sf, st.session_state['bulk_sobject_loaded'], changed)):
+                    results.append({'Id': record['Id'], 'Action': 'Update', **result})
+            if to_delete:
+                for record_id, result in zip(to_delete, delete_records(sf, to_delete)):
+                    results.append({'Id': record_id, 'Action': 'Delete', **result})
+
+            if results:
+                results_df = pd.DataFrame(results)
+                failures = results_df[~results_df['success']]
+                st.success(f"{len(results_df) - len(failures)} of {len(results_df)} changes saved.")
+                if not failures.empty:
+                    st.error("Some changes failed:")
+                    st.dataframe(failures)
+                del st.session_state['bulk_original']
+            else:
+                st.info("No changes to save.")
+
 # Assuming 'sf' is your Salesforce connection object
 # show_query_builder(sf)
@@ -0,0 +1,301 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from metadata_cache import describe_sobject
+
+DEFAULT_MAX_MEMORY_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 300
+# Objects that change constantly get shorter lifetimes; keys are lower-case object names
+OBJECT_TTL_SECONDS = {
+    'asyncapexjob': 30,
+    'crontrigger': 60,
+    'loginhistory': 60,
+    'setupaudittrail': 60,
+    'user': 120,
+}
+
+STRING_LITERAL = re.compile(r"'(?:\\.|[^'\\])*'")
+FROM_CLAUSE = re.compile(r"\bfrom\s+([a-z0-9_]+)", re.IGNORECASE)
+SUBQUERY_START = re.compile(r"\(\s*select\b", re.IGNORECASE)
+RELATIONSHIP_PATH = re.compile(r"\b([a-z_][a-z0-9_]*(?:\.[a-z_][a-z0-9_]*)+)\b", re.IGNORECASE)
+
+
+def normalize_soql(soql_query):
+    """
+    Canonical form of a SOQL statement used as a cache key.
+
+    Whitespace is collapsed and everything outside string literals is lower-cased
+    (SOQL keywords and identifiers are case-insensitive), so queries that differ only
+    in formatting share one cache entry. Literal values are kept verbatim.
+    """
+    def canonical(text):
+        text = re.sub(r'\s+', ' ', text.lower())
+        return re.sub(r'\s*([(),=<>!])\s*', r'\1', text)
+
+    parts = []
+    last = 0
+    for match in STRING_LITERAL.finditer(soql_query):
+        parts.append(canonical(soql_query[last:match.start()]))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(canonical(soql_query[last:]))
+    return ''.join(parts).strip()
+
+
+def _query_scopes(soql_query):
+    """
+    Split a statement into its SELECTs: a list of (text, parent) pairs, the outer query
+    first, where text leaves out nested SELECTs and parent is the index of the enclosing one.
+    """
+    text = STRING_LITERAL.sub("''", soql_query)
+    scopes = [[[], None]]
+    # One entry per open parenthesis: the scope it opened, or None for plain grouping
+    stack, current, position = [], 0, 0
+    while position < len(text):
+        char = text[position]
+        if char == '(' and SUBQUERY_START.match(text, position):
+            scopes.append([[], current])
+            stack.append(len(scopes) - 1)
+            current = len(scopes) - 1
+        elif char == '(':
+            stack.append(None)
+            scopes[current][0].append(char)
+        elif char == ')' and stack:
+            opened = stack.pop()
+            if opened is None:
+                scopes[current][0].append(char)
+            else:
+                current = scopes[opened][1]
+        else:
+            scopes[current][0].append(char)
+        position += 1
+    return [(''.join(characters), parent) for characters, parent in scopes]
+
+
+def _related_objects(sf, object_name, path):
+    """Objects the relationship segments of a field path (e.g. Account.Owner.Name) lead to from object_name."""
+    reached, current = set(), {object_name}
+    for segment in path.split('.')[:-1]:
+        targets = set()
+        for name in current:
+            field = next((field for field in describe_sobject(sf, name)['fields']
+                          if (field.get('relationshipName') or '').lower() == segment.lower()), None)
+            targets.update(field['referenceTo'] if field else [])
+        if not targets:
+            break
+        reached |= targets
+        current = targets
+    return reached
+
+
+def query_objects(soql_query, sf=None):
+    """
+    Lower-case names of the objects a SOQL statement reads from.
+
+    With sf, names are resolved through the cached describe: child sub-queries map to
+    the childSObject of their relationship, and relationship paths such as Account.Name
+    (in any clause) add the objects they reach through referenceTo, so a write to any of
+    them invalidates the result. Without sf, or when a describe cannot be read, the
+    names in FROM clauses are used as written.
+    """
+    scopes = _query_scopes(soql_query)
+    names = {name.lower() for text, _ in scopes for name in FROM_CLAUSE.findall(text)}
+    if sf is None:
+        return names
+    try:
+        objects = []
+        for text, parent in scopes:
+            match = FROM_CLAUSE.search(text)
+            object_name = match.group(1) if match else None
+            if object_name and parent is not None and objects[parent]:
+                # A sub-query in the SELECT list names a child relationship of the enclosing object
+                relationship = next((relationship for relationship in describe_sobject(sf, objects[parent])['childRelationships']
+                                     if (relationship.get('relationshipName') or '').lower() == object_name.lower()), None)
+                if relationship:
+                    object_name = relationship['childSObject']
+            objects.append(object_name)
+            if object_name:
+                names.add(object_name.lower())
+                for path in RELATIONSHIP_PATH.findall(text):
+                    names |= {name.lower() for name in _related_objects(sf, object_name, path)}
+    except Exception as e:
+        print(f"Query cache could not resolve the objects of a query: {str(e)}")
+    return names
+
+
+def cache_identity(sf):
+    """Org and user a connection belongs to; results are never shared across users."""
+    user = getattr(sf, 'cache_user', None) or hashlib.sha256(str(sf.session_id).encode('utf-8')).hexdigest()[:16]
+    return sf.sf_instance, user
+
+
+class QueryResultCache:
+    """
+    Size-bounded LRU of query results (DataFrames) keyed by org, user and normalized SOQL.
+
+    Each entry expires after the shortest TTL of the objects it reads from and is
+    dropped as soon as one of those objects is written through salesforce_api. When a
+    disk directory is configured, entries evicted from memory are spilled to Parquet
+    files and loaded back on the next hit.
+    """
+
+    def __init__(self, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES, disk_dir=None, default_ttl=DEFAULT_TTL_SECONDS):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.default_ttl = default_ttl
+        self.object_ttls = dict(OBJECT_TTL_SECONDS)
+        self._memory = OrderedDict()
+        self._disk = {}
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'disk_hits': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def set_object_ttl(self, object_name, ttl_seconds):
+        self.object_ttls[object_name.lower()] = ttl_seconds
+
+    def ttl_for(self, objects):
+        return min([self.object_ttls.get(name, self.default_ttl) for name in objects] or [self.default_ttl])
+
+    @staticmethod
+    def make_key(sf, soql_query):
+        # soql_query may also be a soql.SoqlQuery, whose text is already canonical
+        return (*cache_identity(sf), normalize_soql(str(soql_query)))
+
+    # Lookup and storage
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry['expires_at'] > time.time():
+                    self._memory.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry['frame'].copy()
+                self._drop(key)
+            disk_entry = self._disk.get(key)
+            if disk_entry is not None:
+                frame = self._load_from_disk(key, disk_entry)
+                if frame is not None:
+                    self.stats['hits'] += 1
+                    self.stats['disk_hits'] += 1
+                    self._store_in_memory(key, frame, disk_entry['objects'], disk_entry['expires_at'])
+                    return frame.copy()
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, frame, objects):
+        with self._lock:
+            self._drop(key)
+            self._store_in_memory(key, frame.copy(), objects, time.time() + self.ttl_for(objects))
+
+    def _store_in_memory(self, key, frame, objects, expires_at):
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        if size > self.max_memory_bytes:
+            return
+        self._memory[key] = {'frame': frame, 'objects': objects, 'expires_at': expires_at, 'size': size}
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            old_key, old_entry = self._memory.popitem(last=False)
+            self._memory_bytes -= old_entry['size']
+            self.stats['evictions'] += 1
+            self._spill_to_disk(old_key, old_entry)
+
+    # Optional Parquet spill-over
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(repr(key).encode('utf-8')).hexdigest() + '.parquet')
+
+    def _spill_to_disk(self, key, entry):
+        if not self.disk_dir or entry['expires_at'] <= time.time():
+            return
+        path = self._disk_path(key)
+        try:
+            entry['frame'].to_parquet(path, index=False)
+        except Exception as e:
+            # Columns that Arrow cannot represent (e.g. nested dicts) simply are not spilled
+            print(f"Query cache could not spill entry to disk: {str(e)}")
+            return
+        self._disk[key] = {'path': path, 'objects': entry['objects'], 'expires_at': entry['expires_at']}
+
+    def _load_from_disk(self, key, disk_entry):
+        import pandas as pd
+        self._disk.pop(key, None)
+        if disk_entry['expires_at'] <= time.time():
+            self._remove_file(disk_entry['path'])
+            return None
+        try:
+            frame = pd.read_parquet(disk_entry['path'])
+        except Exception as e:
+            print(f"Query cache could not read spilled entry: {str(e)}")
+            frame = None
+        self._remove_file(disk_entry['path'])
+        return frame
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # Invalidation
+    def _drop(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry['size']
+        disk_entry = self._disk.pop(key, None)
+        if disk_entry is not None:
+            self._remove_file(disk_entry['path'])
+
+    def invalidate_object(self, org, object_name):
+        """Drop every cached result of an org that reads from object_name."""
+        name = object_name.lower()
+        with self._lock:
+            stale = [key for key, entry in list(self._memory.items()) + list(self._disk.items())
+                     if key[0] == org and name in entry['objects']]
+            for key in stale:
+                self._drop(key)
+            self.stats['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._memory) + list(self._disk):
+                self._drop(key)
+
+    def summary(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._memory) + len(self._disk),
+                'memory_mb': round(self._memory_bytes / (1024 * 1024), 2),
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Process-wide cache; set QUERY_CACHE_DIR to spill evicted results to Parquet files
+query_cache = QueryResultCache(disk_dir=os.environ.get('QUERY_CACHE_DIR'))
+
+
+def cached_query_frame(sf, soql_query, fetch_frame, use_cache=True):
+    """
+    Return the result of soql_query as a DataFrame, calling fetch_frame() only on a cache miss.
+
+    Returns a (frame, from_cache) tuple.
+    """
+    key = query_cache.make_key(sf, soql_query)
+    if use_cache:
+        frame = query_cache.get(key)
+        if frame is not None:
+            return frame, True
+    frame = fetch_frame()
+    query_cache.put(key, frame, query_objects(soql_query, sf))
+    return frame, False
+
+
+def invalidate_object(sf, object_name):
+    """Drop cached results that read from object_name after a write to it."""
+    query_cache.invalidate_object(cache_identity(sf)[0], object_name)
@@ -0,0 +1,81 @@
+import re
+from metadata_cache import describe_sobject
+from result_grid import split_clauses
+
+# Plans with a relative cost above 1 are not selective and Salesforce runs them as table scans
+SELECTIVE_COST = 1.0
+# Standard fields Salesforce indexes on every object
+INDEXED_STANDARD_FIELDS = {'Id', 'Name', 'OwnerId', 'CreatedDate', 'SystemModstamp', 'RecordTypeId'}
+MAX_SUGGESTIONS = 5
+
+
+def explain_query(sf, soql_query):
+    """The query plans Salesforce considers for a query (the REST query resource with ?explain=)."""
+    return sf.restful('query/', params={'explain': soql_query})
+
+
+def indexed_fields(describe):
+    """Filterable fields of a describe that are indexed: standard indexed fields, lookups, external IDs and unique fields."""
+    return [field['name'] for field in describe['fields']
+            if field.get('filterable', True) and (
+                field['name'] in INDEXED_STANDARD_FIELDS or field['type'] in ('id', 'reference')
+                or field.get('externalId') or field.get('unique') or field.get('idLookup'))]
+
+
+def filter_fields(soql_query):
+    """Field names the top-level WHERE clause of a query refers to."""
+    _, clauses = split_clauses(soql_query)
+    where = re.sub(r"'(?:[^'\\]|\\.)*'", "''", clauses.get('WHERE', ''))
+    return set(re.findall(r"\b([A-Za-z_][\w.]*)\s*(?:=|!=|<>|<|>|\bLIKE\b|\bIN\b|\bNOT\s+IN\b|\bINCLUDES\b|\bEXCLUDES\b)",
+                          where, re.IGNORECASE))
+
+
+def analyze_plans(explain, soql_query='', indexed=None):
+    """
+    Summarize an explain response: the plan Salesforce would pick (the cheapest), warnings
+    about table scans and non-selective filters, and indexed fields worth filtering on.
+
+    indexed lists the indexed fields of the queried object; without it no fields are
+    suggested. Works on any explain response, so canned responses can be analyzed offline.
+    """
+    plans = sorted(explain.get('plans', []), key=lambda plan: plan.get('relativeCost', 0))
+    analysis = {'query': soql_query, 'plans': plans, 'plan': plans[0] if plans else None,
+                'warnings': [], 'suggestions': []}
+    plan = analysis['plan']
+    if plan is None:
+        analysis['warnings'].append("Salesforce returned no query plan for this query.")
+        return analysis
+
+    operation = plan.get('leadingOperationType')
+    cost = plan.get('relativeCost', 0)
+    if operation == 'TableScan':
+        analysis['warnings'].append(
+            f"Full table scan over {plan.get('sobjectCardinality', 'all')} {plan.get('sobjectType', '')} records; "
+            "the query may time out on large objects.")
+    elif cost > SELECTIVE_COST:
+        analysis['warnings'].append(f"The filter is not selective (relative cost {cost:.2f}).")
+    for note in plan.get('notes', []):
+        analysis['warnings'].append(f"{note.get('description', '')} ({', '.join(note.get('fields', []))})")
+
+    if operation == 'TableScan' or cost > SELECTIVE_COST:
+        used = {field.split('.')[-1] for field in filter_fields(soql_query)}
+        candidates = [field for field in indexed or [] if field not in used]
+        if candidates:
+            analysis['suggestions'].append(
+                f"Filter on an indexed field such as {', '.join(candidates[:MAX_SUGGESTIONS])} to avoid scanning the table.")
+        if not filter_fields(soql_query):
+            analysis['suggestions'].append("Add a WHERE clause; without one every record is read.")
+    return analysis
+
+
+def analyze_query(sf, soql_query):
+    """Explain a query and analyze its plans, suggesting indexed fields of the queried object."""
+    explain = explain_query(sf, soql_query)
+    plans = explain.get('plans', [])
+    indexed = None
+    if plans and plans[0].get('sobjectType'):
+        try:
+            indexed = indexed_fields(describe_sobject(sf, plans[0]['sobjectType']))
+        except Exception as e:
+            print(f"Error describing {plans[0]['sobjectType']} for the query plan: {str(e)}")
+    return analyze_plans(explain, soql_query, indexed)
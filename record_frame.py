@@ -0,0 +1,163 @@
+import re
+import pandas as pd
+from metadata_cache import describe_sobject
+
+PICKLIST_TYPES = ['picklist', 'multipicklist', 'combobox']
+INTEGER_TYPES = ['int', 'long']
+FLOAT_TYPES = ['double', 'currency', 'percent']
+STRING_DTYPE = 'string[pyarrow]'
+
+SELECT_KEYWORD = re.compile(r"\s*select\s+", re.IGNORECASE)
+FROM_KEYWORD = re.compile(r"\s+from\s+([a-z0-9_]+)", re.IGNORECASE)
+
+
+def _flatten(record, prefix, row):
+    """Add the fields of one (possibly nested) record to row, keyed by dotted path, skipping 'attributes'."""
+    for key, value in record.items():
+        if key == 'attributes':
+            continue
+        path = prefix + key
+        if isinstance(value, dict) and 'records' not in value:
+            _flatten(value, path + '.', row)
+        elif isinstance(value, dict):
+            # Child relationship sub-query: keep the child records together in one cell
+            row[path] = value['records']
+        else:
+            row[path] = value
+
+
+def _typed_column(values, field_type=None):
+    """Build a column with the tightest dtype for its describe type, or inferred from the values."""
+    try:
+        if field_type in PICKLIST_TYPES:
+            return pd.Categorical(values)
+        if field_type == 'datetime':
+            # Salesforce returns UTC; keep it tz-naive so the frame can still be written to Excel
+            parsed = pd.to_datetime(pd.Series(values, dtype=object), utc=True, format='ISO8601', errors='coerce')
+            return parsed.dt.tz_localize(None)
+        if field_type == 'date':
+            return pd.to_datetime(pd.Series(values, dtype=object), format='%Y-%m-%d', errors='coerce')
+        if field_type in INTEGER_TYPES:
+            return pd.array(values, dtype='Int64')
+        if field_type in FLOAT_TYPES:
+            return pd.array(values, dtype='Float64')
+        if field_type == 'boolean':
+            return pd.array(values, dtype='boolean')
+
+        sample = next((value for value in values if value is not None), None)
+        if isinstance(sample, bool):
+            return pd.array(values, dtype='boolean')
+        if isinstance(sample, int):
+            return pd.array(values, dtype='Int64')
+        if isinstance(sample, float):
+            return pd.array(values, dtype='Float64')
+        if isinstance(sample, str):
+            return pd.array(values, dtype=STRING_DTYPE)
+    except (TypeError, ValueError):
+        # Mixed values (e.g. an aggregate alias holding ints and floats) fall back to object
+        pass
+    return pd.Series(values, dtype=object).infer_objects()
+
+
+def flatten_records(records, field_types=None):
+    """
+    Turn REST query records into a typed DataFrame in a single pass.
+
+    Parent relationships become dotted columns (e.g. 'Owner.Name'), child sub-queries
+    stay as lists of records, and the 'attributes' metadata is skipped rather than dropped
+    afterwards. field_types maps column paths to describe types (see soql_field_types) so
+    picklists become categoricals, dates datetime64 and numbers nullable Int64/Float64;
+    columns without a known type get a dtype inferred from their values, with strings
+    stored as Arrow strings.
+    """
+    field_types = field_types or {}
+    columns = {}
+    for index, record in enumerate(records):
+        row = {}
+        _flatten(record, '', row)
+        for path, values in columns.items():
+            values.append(row.pop(path, None))
+        for path, value in row.items():
+            columns[path] = [None] * index + [value]
+
+    # A null parent relationship leaves a bare column next to its dotted children
+    empty_parents = [path for path, values in columns.items()
+                     if all(value is None for value in values) and any(other.startswith(path + '.') for other in columns)]
+    for path in empty_parents:
+        del columns[path]
+
+    return pd.DataFrame({path: _typed_column(values, field_types.get(path)) for path, values in columns.items()},
+                        index=pd.RangeIndex(len(records)))
+
+
+def _parse_select(soql_query):
+    """Return the top-level SELECT items (sub-queries and aggregates included) and the FROM object of a query."""
+    match = SELECT_KEYWORD.match(soql_query)
+    if not match:
+        return [], None
+    fields, depth, current = [], 0, ''
+    position = match.end()
+    while position < len(soql_query):
+        char = soql_query[position]
+        if depth == 0:
+            from_match = FROM_KEYWORD.match(soql_query, position)
+            if from_match:
+                fields.append(current.strip())
+                return [field for field in fields if field], from_match.group(1)
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            fields.append(current.strip())
+            current = ''
+            position += 1
+            continue
+        current += char
+        position += 1
+    return [], None
+
+
+def soql_field_types(sf, soql_query):
+    """
+    Map the column paths a SOQL query returns to their describe types.
+
+    Relationship paths such as 'CreatedBy.Name' are followed through the describe of
+    each related object, and paths are keyed with the canonical API names so they match
+    the column names of flatten_records. Fields that cannot be resolved are left out.
+    """
+    select_fields, object_name = _parse_select(soql_query)
+    field_types = {}
+    for field_path in select_fields:
+        if ' ' in field_path or '(' in field_path:
+            continue
+        try:
+            describe = describe_sobject(sf, object_name)
+            canonical = []
+            segments = field_path.split('.')
+            for segment in segments[:-1]:
+                relationship = next(field for field in describe['fields']
+                                    if (field.get('relationshipName') or '').lower() == segment.lower())
+                canonical.append(relationship['relationshipName'])
+                describe = describe_sobject(sf, relationship['referenceTo'][0])
+            field = next(field for field in describe['fields'] if field['name'].lower() == segments[-1].lower())
+        except Exception:
+            continue
+        canonical.append(field['name'])
+        field_types['.'.join(canonical)] = field['type']
+    return field_types
+
+
+def soql_columns(sf, soql_query):
+    """
+    The columns flatten_records produces for a query, in SELECT order, or None when some
+    of them cannot be resolved from describe metadata (sub-queries, aggregates, TYPEOF).
+
+    Unlike the columns of a page of records, these do not depend on the data: a parent
+    that is null throughout one page still has its 'Parent.Field' columns.
+    """
+    select_fields, _ = _parse_select(soql_query)
+    field_types = soql_field_types(sf, soql_query)
+    if not select_fields or len(field_types) != len(select_fields):
+        return None
+    return list(field_types)
@@ -1,5 +1,7 @@
 import streamlit as st
 from simple_salesforce import Salesforce
+from salesforce_api import QueryCursor
+from hierarchy_tree import TreeIndex
 
 # Function to fetch all records of an object
 def fetch_records(sf, object_name):
@@ -15,22 +17,110 @@ def fetch_records(sf, object_name):
         st.error(f"Error fetching records from {object_name}: {str(e)}")
         return []
 
+# SOQL allows at most five levels of child-to-parent relationship traversal per query
+MAX_PARENT_LEVELS = 5
+# Parent Ids per "WHERE ParentId IN (...)" query when walking down the tree
+CHILD_QUERY_BATCH_SIZE = 200
+
+def relationship_name(parent_field):
+    """Derive the relationship name of a lookup field (ParentId -> Parent, Parent__c -> Parent__r)."""
+    if parent_field.endswith('__c'):
+        return parent_field[:-3] + '__r'
+    if parent_field.endswith('Id'):
+        return parent_field[:-2]
+    return parent_field
+
+class HierarchyTraversal:
+    """
+    Loads a self-referencing hierarchy (e.g. Account.ParentId) with as few queries as possible.
+
+    Ancestors are fetched up to five levels per query through relationship paths
+    (Parent.Parent...), descendants breadth-first with batched IN queries. Every node
+    loaded is memoized, so walking up and then down the same tree never fetches a record twice.
+    """
+
+    def __init__(self, sf, object_name, parent_field='ParentId'):
+        self.sf = sf
+        self.object_name = object_name
+        self.parent_field = parent_field
+        self.relationship = relationship_name(parent_field)
+        self.nodes = {}
+        self.children = {}
+        self.children_loaded = set()
+        self.query_count = 0
+
+    def _query(self, soql_query):
+        self.query_count += 1
+        # Errors are raised rather than read as "no records", which would show a cut-off tree as complete
+        return list(QueryCursor(self.sf, soql_query))
+
+    def _remember(self, record_id, name, parent_id):
+        self.nodes[record_id] = {'Id': record_id, 'Name': name, self.parent_field: parent_id}
+
+    def _ancestor_fields(self):
+        fields = ['Id', 'Name', self.parent_field]
+        for level in range(1, MAX_PARENT_LEVELS + 1):
+            prefix = '.'.join([self.relationship] * level)
+            fields += [f"{prefix}.Id", f"{prefix}.Name", f"{prefix}.{self.parent_field}"]
+        return fields
+
+    def _load_ancestors_from(self, record_id):
+        """Fetch a record plus up to five of its ancestors in one query."""
+        query = f"SELECT {', '.join(self._ancestor_fields())} FROM {self.object_name} WHERE Id = '{record_id}'"
+        records = self._query(query)
+        record = records[0] if records else None
+        while record:
+            self._remember(record['Id'], record.get('Name'), record.get(self.parent_field))
+            record = record.get(self.relationship)
+
+    def get_ancestors(self, record_id):
+        """Return the chain from the record up to its ultimate parent, starting with the record itself."""
+        chain = []
+        seen = set()
+        current = record_id
+        while current and current not in seen:  # Guard against cyclic data
+            if current not in self.nodes:
+                self._load_ancestors_from(current)
+                if current not in self.nodes:
+                    break
+            seen.add(current)
+            node = self.nodes[current]
+            chain.append(node)
+            current = node.get(self.parent_field)
+        return chain
+
+    def load_descendants(self, root_id, max_depth=None, max_nodes=50000):
+        """Load every descendant of root_id breadth-first, one batched query per level (per 200 parents)."""
+        frontier = [root_id]
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth) and len(self.nodes) < max_nodes:
+            pending = [node_id for node_id in frontier if node_id not in self.children_loaded]
+            for start in range(0, len(pending), CHILD_QUERY_BATCH_SIZE):
+                batch = pending[start:start + CHILD_QUERY_BATCH_SIZE]
+                ids = ', '.join(f"'{node_id}'" for node_id in batch)
+                query = f"SELECT Id, Name, {self.parent_field} FROM {self.object_name} WHERE {self.parent_field} IN ({ids})"
+                for record in self._query(query):
+                    self._remember(record['Id'], record.get('Name'), record.get(self.parent_field))
+                    self.children.setdefault(record[self.parent_field], []).append(record['Id'])
+                self.children_loaded.update(batch)
+            frontier = [child for node_id in frontier for child in self.children.get(node_id, [])]
+            depth += 1
+        return self.children
+
+    def load_ultimate_parent_tree(self, record_id, max_depth=None):
+        """Walk up to the ultimate parent of a record and load the full tree below it."""
+        chain = self.get_ancestors(record_id)
+        if not chain:
+            return None
+        root_id = chain[-1]['Id']
+        self.load_descendants(root_id, max_depth=max_depth)
+        return root_id
+
 # Function to get hierarchy of records
 def get_hierarchy(sf, object_name, record_id, parent_field):
+    """Return the record followed by its ancestors, up to the ultimate parent."""
     try:
-        hierarchy = []
-        query = f"SELECT Id, Name, {parent_field} FROM {object_name} WHERE Id = '{record_id}'"
-        record = sf.query(query)['records'][0]
-
-        while record:
-            hierarchy.append(record)
-            parent_id = record.get(parent_field)
-            if parent_id:
-                record = sf.query(f"SELECT Id, Name, {parent_field} FROM {object_name} WHERE Id = '{parent_id}'")['records'][0] if sf.query(f"SELECT Id, Name, {parent_field} FROM {object_name} WHERE Id = '{parent_id}'")['records'] else None
-            else:
-                break
-
-        return hierarchy
+        return HierarchyTraversal(sf, object_name, parent_field).get_ancestors(record_id)
     except Exception as e:
         st.error(f"Error fetching hierarchy: {str(e)}")
         return []
@@ -44,6 +134,17 @@ def display_hierarchy(hierarchy):
     else:
         st.write("No hierarchy found.")
 
+# Function to display the full tree under the ultimate parent
+def display_tree(traversal, root_id, selected_id):
+    st.write("### Full Hierarchy Tree:")
+    tree = TreeIndex(traversal.nodes.values(), parent_key=traversal.parent_field)
+    lines = []
+    for node, depth in tree.walk([root_id]):
+        marker = " ⬅️" if node['Id'] == selected_id else ""
+        lines.append(f"{'    ' * depth}- {node['Name']} ({node['Id']}){marker}")
+    st.markdown("\n".join(lines))
+    st.caption(f"{len(lines)} records loaded with {traversal.query_count} queries.")
+
 # Main function to run the hierarchy viewer
 def hierarchy_viewer(sf):
     st.title("Record Hierarchy Viewer")
@@ -56,12 +157,21 @@ def hierarchy_viewer(sf):
         record_names = {rec['Name']: rec['Id'] for rec in records}
         selected_name = st.selectbox("Select a record", list(record_names.keys()))
 
+        show_full_tree = st.checkbox("Show the full tree under the ultimate parent")
+
         if st.button("Show Hierarchy"):
             selected_id = record_names[selected_name]
             st.write(f"Search results for '{selected_name}':")
             st.write(f"Name: {selected_name}, ID: {selected_id}")
-            hierarchy = get_hierarchy(sf, object_name, selected_id, 'ParentId')
-            display_hierarchy(hierarchy)
+            try:
+                traversal = HierarchyTraversal(sf, object_name, 'ParentId')
+                hierarchy = traversal.get_ancestors(selected_id)
+                display_hierarchy(hierarchy)
+                if show_full_tree and hierarchy:
+                    root_id = traversal.load_ultimate_parent_tree(selected_id)
+                    display_tree(traversal, root_id, selected_id)
+            except Exception as e:
+                st.error(f"Error fetching hierarchy: {str(e)}")
 
 # Assuming the Salesforce connection `sf` is already available from your main application
 def main(sf):
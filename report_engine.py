@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from export_engine import stream_export
+
+REPORT_FORMATS = ['PDF', 'Excel', 'CSV']
+REPORT_EXTENSIONS = {'PDF': 'pdf', 'Excel': 'xlsx', 'CSV': 'csv'}
+REPORT_MIME_TYPES = {
+    'PDF': 'application/pdf',
+    'Excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'CSV': 'text/csv',
+}
+REPORTS_DIR = os.environ.get('REPORTS_DIR', os.path.join(tempfile.gettempdir(), 'salesforce_reports'))
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', '2'))
+# Rows handed to the spreadsheet writers at a time
+REPORT_CHUNK_ROWS = 5000
+# Small reports are usually ready within this wait, so they can be downloaded on the same run
+REPORT_INLINE_WAIT_SECONDS = 2
+# Generated files are removed once they are this old
+REPORT_MAX_AGE_SECONDS = 3600
+
+
+def _frame_chunks(df, chunk_rows=REPORT_CHUNK_ROWS):
+    if df.empty:
+        yield df
+        return
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def build_report(df, file_format, file_path, pdf_builder=None):
+    """
+    Write a DataFrame report to file_path (runs in a worker process).
+
+    CSV and Excel are written chunk by chunk, Excel in xlsxwriter's constant-memory mode.
+    PDF reports are rendered by pdf_builder(df), which returns the PDF bytes.
+    """
+    if file_format == 'PDF':
+        if pdf_builder is None:
+            raise ValueError("A PDF builder is required for PDF reports.")
+        with open(file_path, 'wb') as file:
+            file.write(pdf_builder(df))
+    elif file_format in ('CSV', 'Excel'):
+        stream_export(_frame_chunks(df), file_path, file_format)
+    else:
+        raise ValueError(f"Unsupported report format '{file_format}'. Expected one of {REPORT_FORMATS}.")
+    return file_path
+
+
+class ReportHandle:
+    """A report being generated in the background; the file can be downloaded once it is done."""
+
+    def __init__(self, future, file_path, file_name, file_format):
+        self.future = future
+        self.file_path = file_path
+        self.file_name = file_name
+        self.file_format = file_format
+        self.mime = REPORT_MIME_TYPES[file_format]
+        self.submitted_at = time.time()
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        """Wait up to timeout seconds; returns True when the report is done."""
+        try:
+            self.future.exception(timeout=timeout)
+        except FutureTimeoutError:
+            return False
+        return True
+
+    def error(self):
+        """The exception that stopped the report, or None."""
+        return self.future.exception() if self.future.done() else None
+
+    def read(self):
+        with open(self.file_path, 'rb') as file:
+            return file.read()
+
+
+class ReportEngine:
+    """
+    Generates report files on a process pool, so large exports neither block the page
+    that asked for them nor compete with it for the GIL.
+    """
+
+    def __init__(self, reports_dir=REPORTS_DIR, max_workers=REPORT_WORKERS):
+        self.reports_dir = reports_dir
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Workers are spawned rather than forked: a fork of the threaded server could
+                # inherit a lock held by another thread (prefetch, scheduler, SQLite) and hang
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _reset_pool(self):
+        with self._lock:
+            self._executor = None
+
+    def _remove_old_reports(self):
+        cutoff = time.time() - REPORT_MAX_AGE_SECONDS
+        for name in os.listdir(self.reports_dir):
+            path = os.path.join(self.reports_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def submit(self, df, file_format, base_name, pdf_builder=None):
+        """Start generating a report and return its ReportHandle right away."""
+        if file_format not in REPORT_FORMATS:
+            raise ValueError(f"Unsupported report format '{file_format}'. Expected one of {REPORT_FORMATS}.")
+        os.makedirs(self.reports_dir, exist_ok=True)
+        self._remove_old_reports()
+        file_name = f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', base_name)}.{REPORT_EXTENSIONS[file_format]}"
+        file_path = os.path.join(self.reports_dir, f"{uuid.uuid4().hex}_{file_name}")
+        try:
+            future = self._pool().submit(build_report, df, file_format, file_path, pdf_builder)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool and try once more
+            self._reset_pool()
+            future = self._pool().submit(build_report, df, file_format, file_path, pdf_builder)
+        return ReportHandle(future, file_path, file_name, file_format)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Shared by every page of this process
+report_engine = ReportEngine()
+
+
+def show_report_export(df, key, base_name, formats=REPORT_FORMATS, pdf_builder=None, version=None):
+    """
+    Export controls for a DataFrame: a report is only built when the user asks for it, in
+    the background, and offered for download once ready.
+
+    key identifies the export on the page; version (e.g. the time the data was fetched)
+    marks reports of older data as stale so they are not offered any more.
+    """
+    # Imported here so worker processes can load this module without Streamlit
+    import streamlit as st
+
+    handles = st.session_state.setdefault(f"report_handles:{key}", {})
+    export_format = st.selectbox("Select Export Format", formats, key=f"{key}_report_format")
+    if st.button("Export Data", key=f"{key}_report_generate"):
+        try:
+            handle = report_engine.submit(df, export_format, base_name, pdf_builder)
+            handles[export_format] = (version, handle)
+            handle.wait(REPORT_INLINE_WAIT_SECONDS)
+        except Exception as e:
+            st.error(f"Could not start the {export_format} export: {str(e)}")
+
+    entry = handles.get(export_format)
+    if entry is None or entry[0] != version:
+        return
+    handle = entry[1]
+    if not handle.done():
+        st.info(f"The {export_format} report is being prepared in the background (started "
+                f"{int(time.time() - handle.submitted_at)}s ago). You can keep using the page.")
+        st.button("Check Again", key=f"{key}_report_check")
+    elif handle.error() is not None:
+        st.error(f"The {export_format} export failed: {str(handle.error())}")
+    elif not os.path.exists(handle.file_path):
+        st.warning("The report file has expired. Export it again.")
+    else:
+        st.download_button(
+            label=f"Download {export_format} File",
+            data=handle.read(),
+            file_name=handle.file_name,
+            mime=handle.mime,
+            key=f"{key}_report_download"
+        )
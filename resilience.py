@@ -0,0 +1,217 @@
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import requests
+from api_governor import GovernedAdapter
+
+# Error classes
+TRANSIENT = 'transient'
+THROTTLED = 'throttled'
+AUTH = 'auth'
+PERMANENT = 'permanent'
+
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+TRANSIENT_ERROR_CODES = {'SERVER_UNAVAILABLE', 'UNABLE_TO_LOCK_ROW', 'QUERY_TIMEOUT', 'REQUEST_RUNNING_TOO_LONG'}
+THROTTLED_ERROR_CODES = {'REQUEST_LIMIT_EXCEEDED', 'CONCURRENT_REQUEST_LIMIT_EXCEEDED', 'TXN_SECURITY_METERING_ERROR'}
+# Answers that mean Salesforce did not apply the request, so repeating a create is safe
+NOT_PROCESSED_STATUS_CODES = {429, 503}
+NOT_PROCESSED_ERROR_CODES = {'SERVER_UNAVAILABLE', 'UNABLE_TO_LOCK_ROW'} | THROTTLED_ERROR_CODES
+# Methods Salesforce treats as idempotent (PATCH is update or upsert by external ID)
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'PATCH', 'DELETE'}
+
+MAX_ATTEMPTS = 4
+BASE_DELAY_SECONDS = 0.5
+MAX_DELAY_SECONDS = 30.0
+# A breaker opens after this many consecutive failures and lets a trial call through after the cool-down
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+
+VERSIONED_PATH = re.compile(r'/services/(?:data|async)/v[\d.]+/')
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling Salesforce while the endpoint's circuit breaker is open."""
+
+
+def error_codes(response):
+    """The errorCode values of a Salesforce error response body."""
+    codes = set()
+    try:
+        body = response.json()
+    except ValueError:
+        return codes
+    for error in body if isinstance(body, list) else [body]:
+        if isinstance(error, dict) and error.get('errorCode'):
+            codes.add(error['errorCode'])
+    return codes
+
+
+def classify_response(response):
+    """Classify a Salesforce HTTP response as None (success), TRANSIENT, THROTTLED, AUTH or PERMANENT."""
+    if response.status_code < 400:
+        return None
+    if response.status_code == 401:
+        return AUTH
+    codes = error_codes(response)
+    if codes & THROTTLED_ERROR_CODES or response.status_code == 429:
+        return THROTTLED
+    if codes & TRANSIENT_ERROR_CODES or response.status_code in TRANSIENT_STATUS_CODES:
+        return TRANSIENT
+    return PERMANENT
+
+
+def classify_exception(error):
+    """Classify a requests exception; connection failures and timeouts are transient."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return TRANSIENT
+    return PERMANENT
+
+
+def request_never_sent(error):
+    """True when a request failed before any byte reached Salesforce, so even a create can be retried."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    return isinstance(error, requests.exceptions.ConnectionError) and 'NewConnectionError' in repr(error)
+
+
+def response_not_processed(response):
+    """True when Salesforce reports it rejected a request without applying it."""
+    return response.status_code in NOT_PROCESSED_STATUS_CODES or bool(error_codes(response) & NOT_PROCESSED_ERROR_CODES)
+
+
+def backoff_delay(attempt, error_class=TRANSIENT):
+    """Exponential backoff with full jitter; throttled calls back off four times longer."""
+    base = BASE_DELAY_SECONDS * (4 if error_class == THROTTLED else 1)
+    return random.uniform(0, min(MAX_DELAY_SECONDS, base * 2 ** attempt))
+
+
+def endpoint_key(url):
+    """Group URLs into endpoints for the circuit breakers, e.g. 'host/query' or 'host/sobjects/Account'."""
+    parts = urlsplit(url)
+    path = VERSIONED_PATH.sub('/', parts.path).strip('/').split('/')
+    if path and path[0] in ('sobjects', 'composite', 'jobs') and len(path) > 1:
+        return f"{parts.netloc}/{path[0]}/{path[1]}"
+    return f"{parts.netloc}/{path[0] if path else ''}"
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial call after a cool-down -> closed on success."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let one trial call through and restart the cool-down for the others
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url):
+    key = endpoint_key(url)
+    with _breakers_lock:
+        if key not in breakers:
+            breakers[key] = CircuitBreaker()
+        return breakers[key]
+
+
+def breaker_states():
+    """Rows of {'endpoint', 'state', 'failures'} for every endpoint seen so far."""
+    with _breakers_lock:
+        return [{'endpoint': key, 'state': breaker.state, 'failures': breaker.failures}
+                for key, breaker in sorted(breakers.items())]
+
+
+_context = threading.local()
+
+
+@contextmanager
+def idempotent_writes():
+    """Mark the POST calls made inside the block (on this thread) as safe to repeat."""
+    previous = getattr(_context, 'idempotent', False)
+    _context.idempotent = True
+    try:
+        yield
+    finally:
+        _context.idempotent = previous
+
+
+def send_with_retry(send, request, max_attempts=MAX_ATTEMPTS):
+    """
+    Send a prepared request through send(request), retrying transient and throttled failures.
+
+    Idempotent methods are retried on any transient error. A POST is only retried when
+    Salesforce answered that it did not process it (503, lock or limit errors), when the
+    connection was never made, or inside idempotent_writes() - never after a timeout or
+    dropped connection, since the record may already have been created. Permanent and
+    auth errors are returned straight away; 401s are handled by the session manager.
+    """
+    breaker = breaker_for(request.url)
+    repeatable = request.method in IDEMPOTENT_METHODS or getattr(_context, 'idempotent', False)
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {endpoint_key(request.url)} after repeated failures; try again shortly.")
+        try:
+            response = send(request)
+        except requests.exceptions.RequestException as e:
+            error_class = classify_exception(e)
+            if error_class == TRANSIENT:
+                breaker.record_failure()
+            retry = error_class == TRANSIENT and (repeatable or request_never_sent(e))
+            if not retry or attempt + 1 >= max_attempts:
+                raise
+            print(f"Retrying {request.method} {endpoint_key(request.url)} after {type(e).__name__} (attempt {attempt + 1})")
+        else:
+            error_class = classify_response(response)
+            if error_class in (TRANSIENT, THROTTLED):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            retry = error_class in (TRANSIENT, THROTTLED) and (repeatable or response_not_processed(response))
+            if not retry or attempt + 1 >= max_attempts:
+                return response
+            print(f"Retrying {request.method} {endpoint_key(request.url)} after HTTP {response.status_code} (attempt {attempt + 1})")
+            response.close()
+        time.sleep(backoff_delay(attempt, error_class))
+        attempt += 1
+
+
+class ResilientAdapter(GovernedAdapter):
+    """Governed adapter that retries transient failures and trips a circuit breaker per endpoint."""
+
+    def send(self, request, **kwargs):
+        # Every attempt passes through the governor, so retries are throttled and counted too
+        return send_with_retry(lambda prepared: super(ResilientAdapter, self).send(prepared, **kwargs), request)
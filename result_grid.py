@@ -0,0 +1,192 @@
+import re
+from export_engine import records_to_frame
+from object_mirror import MirrorError, query_mirror
+from query_cache import query_cache, query_objects
+from record_frame import soql_field_types
+from salesforce_api import iter_query_pages
+from soql import NUMERIC_TYPES, coerce, contains, eq
+
+PAGE_SIZES = [25, 50, 100, 250]
+DEFAULT_PAGE_SIZE = 50
+
+# Top-level clauses of a SOQL query in the order Salesforce expects them
+CLAUSE_ORDER = ['WHERE', 'WITH', 'GROUP BY', 'HAVING', 'ORDER BY', 'LIMIT', 'OFFSET', 'FOR']
+CLAUSE_KEYWORD = re.compile(r"\b(WHERE|WITH|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT|OFFSET|FOR)\b", re.IGNORECASE)
+
+
+def split_clauses(soql_query):
+    """
+    Split a SOQL query into its SELECT ... FROM head and its top-level clauses.
+
+    Returns (head, clauses) where clauses maps 'WHERE', 'ORDER BY', 'LIMIT', ... to the
+    clause text without its keyword. Keywords inside sub-queries and string literals are
+    left alone.
+    """
+    depth, quoted, escaped, top_level = 0, False, False, []
+    for char in soql_query:
+        if escaped:
+            escaped = False
+        elif quoted:
+            if char == '\\':
+                escaped = True
+            elif char == "'":
+                quoted = False
+        elif char == "'":
+            quoted = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        top_level.append(depth == 0 and not quoted)
+
+    # Only keywords after the top-level FROM count, so fields named like a keyword are left alone
+    from_match = next((match for match in re.finditer(r"\bFROM\s+\w+", soql_query, re.IGNORECASE)
+                       if top_level[match.start()]), None)
+    matches = [match for match in CLAUSE_KEYWORD.finditer(soql_query)
+               if top_level[match.start()] and from_match and match.start() > from_match.end()]
+    head = soql_query[:matches[0].start()] if matches else soql_query
+    clauses = {}
+    for match, following in zip(matches, matches[1:] + [None]):
+        keyword = ' '.join(match.group(1).upper().split())
+        clauses[keyword] = soql_query[match.end():following.start() if following else len(soql_query)].strip()
+    return head.strip(), clauses
+
+
+def join_clauses(head, clauses):
+    return ' '.join([head] + [f"{keyword} {clauses[keyword]}" for keyword in CLAUSE_ORDER if clauses.get(keyword)])
+
+
+def filter_condition(column, text, field_type=None):
+    """A SOQL condition matching text in column: a contains-LIKE for text fields, '=' for the rest."""
+    if field_type in NUMERIC_TYPES or field_type in ('boolean', 'date', 'datetime', 'id', 'reference'):
+        return eq(column, coerce(text, field_type)).to_soql()
+    return contains(column, text.strip()).to_soql()
+
+
+class FrameGridSource:
+    """
+    Grid rows held locally (a mirror answer, a cached result or a frame already built);
+    sorting and filtering run on the frame, and the last view's row order is kept so
+    paging through it does not sort again.
+    """
+
+    sortable = True
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._view_key = None
+        self._view = None
+
+    @property
+    def columns(self):
+        return list(self.frame.columns)
+
+    def _rows(self, sort=None, filter=None):
+        key = (sort, filter)
+        if key != self._view_key:
+            view = self.frame
+            if filter and filter[1]:
+                column, text = filter
+                view = view[view[column].astype(str).str.contains(text, case=False, regex=False, na=False)]
+            if sort:
+                column, ascending = sort
+                view = view.sort_values(column, ascending=ascending, na_position='last', kind='stable')
+            self._view_key, self._view = key, view
+        return self._view
+
+    def page(self, start, size, sort=None, filter=None):
+        """The rows start..start+size of the sorted, filtered view and the view's row count."""
+        view = self._rows(sort, filter)
+        return view.iloc[start:start + size].reset_index(drop=True), len(view)
+
+
+class QueryGridSource:
+    """
+    Grid rows read from Salesforce through the query cursor, one result page at a time.
+
+    Only the pages up to the visible window are fetched. Sorting and filtering rewrite the
+    query's ORDER BY and WHERE, so Salesforce does the work and the rows of a view stream
+    in the new order; the records of the current view are kept for paging back.
+    """
+
+    def __init__(self, sf, soql_query):
+        self.sf = sf
+        self.soql_query = soql_query
+        self.head, self.clauses = split_clauses(soql_query)
+        # Aggregate results are sorted by aliases Salesforce does not accept in ORDER BY
+        self.sortable = 'GROUP BY' not in self.clauses
+        self.field_types = soql_field_types(sf, soql_query)
+        self._view_key = None
+        self._pages = None
+        self._records = []
+        self._total = None
+        self._columns = None
+        self._cached = False
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self.page(0, 1)
+        return self._columns
+
+    def view_query(self, sort=None, filter=None):
+        """The query of a sorted, filtered view of the result."""
+        clauses = dict(self.clauses)
+        if filter and filter[1]:
+            condition = filter_condition(filter[0], filter[1], self.field_types.get(filter[0]))
+            clauses['WHERE'] = f"({clauses['WHERE']}) AND {condition}" if clauses.get('WHERE') else condition
+        if sort:
+            clauses['ORDER BY'] = f"{sort[0]} {'ASC NULLS LAST' if sort[1] else 'DESC NULLS LAST'}"
+        return join_clauses(self.head, clauses)
+
+    def _open_view(self, sort, filter):
+        self.close()
+        self._view_key = (sort, filter)
+        self._pages = iter_query_pages(self.sf, self.view_query(sort, filter), prefetch=True)
+        self._records = []
+        self._total = None
+
+    def page(self, start, size, sort=None, filter=None):
+        """The rows start..start+size of the sorted, filtered view and the view's row count."""
+        if (sort, filter) != self._view_key:
+            self._open_view(sort, filter)
+        while self._pages is not None and len(self._records) < start + size:
+            result = next(self._pages, None)
+            if result is None:
+                self._pages = None
+                break
+            self._total = result.get('totalSize')
+            self._records.extend(result['records'])
+        window = records_to_frame(self._records[start:start + size], self.field_types)
+        if self._columns is None and self._records:
+            self._columns = list(records_to_frame(self._records[:1], self.field_types).columns)
+        if self._pages is None and self._view_key == (None, None) and not self._cached:
+            self._cached = True
+            # The whole unsorted result has been read; later runs of the query can page it locally
+            query_cache.put(query_cache.make_key(self.sf, self.soql_query),
+                            records_to_frame(self._records, self.field_types), query_objects(self.soql_query, self.sf))
+        return window, self._total if self._total is not None else len(self._records)
+
+    def close(self):
+        if self._pages is not None:
+            # Stops the prefetch thread of the abandoned view
+            self._pages.close()
+            self._pages = None
+
+
+def query_grid_source(sf, soql_query, prefer_mirror=False, use_cache=True):
+    """
+    The grid source for a query: the local mirror or the query cache when they can answer
+    it, otherwise Salesforce. Returns (source, origin) with origin 'mirror', 'cache' or
+    'salesforce'.
+    """
+    if prefer_mirror:
+        try:
+            return FrameGridSource(query_mirror(sf, soql_query)), 'mirror'
+        except MirrorError:
+            pass
+    if use_cache:
+        cached = query_cache.get(query_cache.make_key(sf, soql_query))
+        if cached is not None:
+            return FrameGridSource(cached), 'cache'
+    return QueryGridSource(sf, soql_query), 'salesforce'
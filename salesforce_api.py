@@ -1,11 +1,95 @@
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from simple_salesforce import Salesforce
+from bulk_api import Bulk2Client, ChunkedIngestError, bulk_ingest_csv, bulk_query_pages, DEFAULT_CHUNK_SIZE
+from export_engine import stream_export, records_to_frame
+from record_frame import soql_field_types, soql_columns
+from metadata_cache import describe_global, describe_sobject
+from query_cache import invalidate_object
+from api_governor import BULK, api_priority, with_current_priority
+
+def iter_query_pages(sf, soql_query, include_deleted=False, prefetch=False):
+    """
+    Yield every page of a SOQL query result, following nextRecordsUrl until the query is done.
+
+    With prefetch=True the next page is requested on a background thread while the
+    caller is still processing the current one.
+    """
+    def fetch_next(result):
+        return sf.query_more(result['nextRecordsUrl'], identifier_is_url=True)
+
+    def has_more(result):
+        return not result.get('done', True) and bool(result.get('nextRecordsUrl'))
+
+    result = sf.query(soql_query, include_deleted=include_deleted)
+    if not prefetch:
+        while True:
+            yield result
+            if not has_more(result):
+                break
+            result = fetch_next(result)
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while True:
+            next_page = executor.submit(with_current_priority(fetch_next), result) if has_more(result) else None
+            yield result
+            if next_page is None:
+                break
+            result = next_page.result()
+
+class QueryCursor:
+    """
+    Lazy, paginated view of a SOQL query.
+
+    Iterating yields records one at a time while only one page (plus the prefetched
+    next page) is held in memory. total_size is known once the first page has arrived.
+    """
+
+    def __init__(self, sf, soql_query, include_deleted=False, prefetch=True):
+        self.sf = sf
+        self.soql_query = soql_query
+        self.include_deleted = include_deleted
+        self.prefetch = prefetch
+        self.total_size = None
+
+    def pages(self):
+        """Yield the records of each page as a list."""
+        for page in iter_query_pages(self.sf, self.soql_query, self.include_deleted, self.prefetch):
+            self.total_size = page.get('totalSize')
+            yield page['records']
+
+    def __iter__(self):
+        for records in self.pages():
+            yield from records
+
+    def to_dataframe(self, chunksize=None, typed=False):
+        """
+        Return all records as one flattened DataFrame, or, when chunksize is given,
+        an iterator of DataFrames holding up to chunksize records each.
+
+        With typed=True the column dtypes follow the describe metadata of the queried
+        fields (categorical picklists, datetime64 dates, nullable numbers).
+        """
+        field_types = soql_field_types(self.sf, self.soql_query) if typed else None
+        if chunksize is None:
+            return records_to_frame(list(self), field_types)
+        return self._iter_frames(chunksize, field_types)
+
+    def _iter_frames(self, chunksize, field_types=None):
+        buffer = []
+        for record in self:
+            buffer.append(record)
+            if len(buffer) >= chunksize:
+                yield records_to_frame(buffer, field_types)
+                buffer = []
+        if buffer:
+            yield records_to_frame(buffer, field_types)
 
 def retrieve_records(sf, soql_query):
-    """Retrieve records using a SOQL query."""
+    """Retrieve every record of a SOQL query, following all result pages."""
     try:
-        results = sf.query(soql_query)
-        return results['records']
+        return list(QueryCursor(sf, soql_query))
     except Exception as e:
         print(f"Error retrieving records: {str(e)}")
         return []
@@ -14,6 +98,7 @@ def create_record(sf, sobject, data):
     """Create a record in a Salesforce object."""
     try:
         result = sf.__getattr__(sobject).create(data)
+        invalidate_object(sf, sobject)
         return {'success': True, 'id': result.get('id'), 'message': 'Record created successfully.'}
     except Exception as e:
         print(f"Error creating record: {str(e)}")
@@ -23,6 +108,7 @@ def update_record(sf, sobject, record_id, data):
     """Update a Salesforce record."""
     try:
         result = sf.__getattr__(sobject).update(record_id, data)
+        invalidate_object(sf, sobject)
         return {'success': True, 'message': 'Record updated successfully.'}
     except Exception as e:
         print(f"Error updating record: {str(e)}")
@@ -32,54 +118,242 @@ def delete_record(sf, sobject, record_id):
     """Delete a Salesforce record."""
     try:
         result = sf.__getattr__(sobject).delete(record_id)
+        invalidate_object(sf, sobject)
         return {'success': True, 'message': 'Record deleted successfully.'}
     except Exception as e:
         print(f"Error deleting record: {str(e)}")
         return {'success': False, 'message': str(e)}
 
+# sObject Collections accept up to 200 records per request, Composite up to 25 subrequests
+COLLECTION_BATCH_SIZE = 200
+COMPOSITE_BATCH_SIZE = 25
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _collection_results(response, batch):
+    """Map an sObject Collections response back onto the input rows of a batch, in order."""
+    if not response:
+        return [{'success': False, 'id': None, 'message': 'No response from Salesforce.'} for _ in batch]
+    results = []
+    for item in response:
+        errors = item.get('errors') or []
+        results.append({
+            'success': bool(item.get('success')),
+            'id': item.get('id'),
+            'message': '; '.join(f"{err.get('statusCode')}: {err.get('message')}" for err in errors) or 'OK'
+        })
+    return results
+
+def _run_collection_batches(items, send_batch):
+    results = []
+    for batch in _batches(items, COLLECTION_BATCH_SIZE):
+        try:
+            results.extend(_collection_results(send_batch(batch), batch))
+        except Exception as e:
+            print(f"Error in sObject Collections request: {str(e)}")
+            results.extend({'success': False, 'id': None, 'message': str(e)} for _ in batch)
+    return results
+
+def create_records(sf, sobject, records, all_or_none=False):
+    """
+    Create many records with the sObject Collections API, 200 records per request.
+
+    Returns:
+    list: One result dict per input record, in input order, with success, id and message.
+    """
+    def send(batch):
+        payload = {'allOrNone': all_or_none, 'records': [{'attributes': {'type': sobject}, **record} for record in batch]}
+        return sf.restful('composite/sobjects', method='POST', json=payload)
+    results = _run_collection_batches(records, send)
+    invalidate_object(sf, sobject)
+    return results
+
+def update_records(sf, sobject, records, all_or_none=False):
+    """
+    Update many records with the sObject Collections API, 200 records per request.
+
+    Each record must carry its 'Id'. Returns one result dict per input record, in input order.
+    """
+    def send(batch):
+        payload = {'allOrNone': all_or_none, 'records': [{'attributes': {'type': sobject}, **record} for record in batch]}
+        return sf.restful('composite/sobjects', method='PATCH', json=payload)
+    results = _run_collection_batches(records, send)
+    invalidate_object(sf, sobject)
+    return results
+
+def delete_records(sf, record_ids, all_or_none=False):
+    """Delete many records with the sObject Collections API, 200 Ids per request."""
+    def send(batch):
+        params = {'ids': ','.join(batch), 'allOrNone': str(all_or_none).lower()}
+        return sf.restful('composite/sobjects', params=params, method='DELETE')
+    record_ids = list(record_ids)
+    results = _run_collection_batches(record_ids, send)
+    invalidate_objects_for_ids(sf, record_ids)
+    return results
+
+def send_collection(sf, sobject, operation, records, external_id_field=None, all_or_none=False):
+    """
+    Send one sObject Collections request (up to 200 records) to insert, update or upsert records.
+
+    Unlike create_records and update_records, a failed request is raised instead of being
+    reported as failed rows, so callers can tell rows that were never sent from rejected rows.
+    """
+    payload = {'allOrNone': all_or_none, 'records': [{'attributes': {'type': sobject}, **record} for record in records]}
+    if operation == 'insert':
+        response = sf.restful('composite/sobjects', method='POST', json=payload)
+    elif operation == 'update':
+        response = sf.restful('composite/sobjects', method='PATCH', json=payload)
+    elif operation == 'upsert':
+        if not external_id_field:
+            raise ValueError("An external ID field is required for upsert.")
+        response = sf.restful(f"composite/sobjects/{sobject}/{external_id_field}", method='PATCH', json=payload)
+    else:
+        raise ValueError(f"Unsupported collection operation '{operation}'.")
+    return _collection_results(response, records)
+
+def invalidate_objects_for_ids(sf, record_ids):
+    """Invalidate cached query results of every object the given record Ids belong to (by key prefix)."""
+    prefixes = {record_id[:3] for record_id in record_ids if record_id}
+    try:
+        for sobject in describe_global(sf)['sobjects']:
+            if sobject.get('keyPrefix') in prefixes:
+                invalidate_object(sf, sobject['name'])
+    except Exception as e:
+        print(f"Error invalidating cached queries: {str(e)}")
+
+def composite_request(sf, subrequests, all_or_none=False):
+    """
+    Send REST subrequests through the Composite API, 25 subrequests per call.
+
+    Args:
+    subrequests (list): Dicts with 'method', 'url' (relative to the versioned data URL, e.g. 'sobjects/Account/001...')
+                        and an optional 'body'.
+
+    Returns:
+    list: One dict per subrequest, in input order, with success, status and body.
+    """
+    results = []
+    for batch in _batches(subrequests, COMPOSITE_BATCH_SIZE):
+        composite = [{
+            'method': request['method'],
+            'url': f"/services/data/v{sf.sf_version}/{request['url'].lstrip('/')}",
+            'referenceId': f"ref{index}",
+            **({'body': request['body']} if request.get('body') is not None else {})
+        } for index, request in enumerate(batch)]
+        try:
+            response = sf.restful('composite', method='POST', json={'allOrNone': all_or_none, 'compositeRequest': composite})
+            by_reference = {item['referenceId']: item for item in response['compositeResponse']}
+            for index in range(len(batch)):
+                item = by_reference.get(f"ref{index}", {})
+                status = item.get('httpStatusCode', 0)
+                results.append({'success': 200 <= status < 300, 'status': status, 'body': item.get('body')})
+        except Exception as e:
+            print(f"Error in Composite request: {str(e)}")
+            results.extend({'success': False, 'status': None, 'body': str(e)} for _ in batch)
+    return results
+
 def get_object_fields(sf, object_name):
     """Fetch metadata for a Salesforce object."""
     try:
-        object_description = sf.__getattr__(object_name).describe()
+        object_description = describe_sobject(sf, object_name)
         return {'success': True, 'fields': object_description['fields'], 'message': 'Object described successfully.'}
     except Exception as e:
         print(f"Error describing object: {str(e)}")
         return {'success': False, 'message': str(e)}
 
-def import_csv_to_salesforce(sf, sobject_type, file_path):
-    """Import data from a CSV file into Salesforce."""
+def import_csv_to_salesforce(sf, sobject_type, file_path, operation='insert', external_id_field=None, progress_callback=None):
+    """
+    Import data from a CSV file into Salesforce as a journaled import job.
+
+    Rows go out 200 at a time through sObject Collections, and every chunk and row result is
+    recorded in the import journal, so a failed import can be resumed from the import page.
+    """
+    # import_jobs builds on this module, so it is imported when first needed
+    from import_jobs import create_import_job, run_import_job
     try:
-        df = pd.read_csv(file_path)
-        records = df.to_dict('records')
-        for record in records:
-            sf.__getattr__(sobject_type).create(record)
-        return True, "Import successful."
+        job_id = create_import_job(sf, sobject_type, file_path, operation=operation, external_id_field=external_id_field)
+        job = run_import_job(sf, job_id, progress_callback)
+        if job['status'] != 'completed':
+            return False, f"Import stopped after {job['rows_done']} of {job['total_rows']} rows: {job['error']}"
+        return True, f"Import successful. {job['succeeded']} rows imported, {job['failed']} failed."
     except Exception as e:
         print(f"Error importing CSV to Salesforce: {str(e)}")
         return False, str(e)
 
-def export_salesforce_to_csv(sf, soql_query, file_path):
-    """Export data from Salesforce to a CSV file."""
+def bulk_import_csv_to_salesforce(sf, sobject_type, file_path, operation='insert', external_id_field=None,
+                                  chunk_size=DEFAULT_CHUNK_SIZE, progress_callback=None, start_chunk=0):
+    """
+    Import a CSV file into Salesforce in chunks through Bulk API 2.0 ingest jobs.
+
+    Chunks before start_chunk are skipped. When the import stops part way, the results of
+    the completed chunks are returned with 'next_chunk' set to the chunk to resume from.
+    """
     try:
-        records = sf.query(soql_query)['records']
-        df = pd.DataFrame(records)
-        df.to_csv(file_path, index=False)
-        return True, "Export successful."
+        client = Bulk2Client.from_salesforce(sf)
+        with api_priority(BULK):
+            results = bulk_ingest_csv(client, sobject_type, file_path, operation=operation,
+                                      external_id_field=external_id_field, chunk_size=chunk_size,
+                                      progress_callback=progress_callback, start_chunk=start_chunk)
+        message = (f"Bulk {operation} finished: {len(results['successful'])} succeeded, "
+                   f"{len(results['failed'])} failed, {len(results['unprocessed'])} unprocessed "
+                   f"across {len(results['jobs'])} job(s).")
+        return True, message, dict(results, next_chunk=None)
+    except ChunkedIngestError as e:
+        print(f"Bulk import stopped at chunk {e.next_chunk}: {str(e)}")
+        return False, str(e), dict(e.partial_results, next_chunk=e.next_chunk)
     except Exception as e:
-        print(f"Error exporting Salesforce data to CSV: {str(e)}")
-        return False, str(e)
+        print(f"Error bulk importing CSV to Salesforce: {str(e)}")
+        return False, str(e), None
 
-def export_salesforce_to_excel(sf, soql_query, file_path):
-    """Export data from Salesforce to an Excel file."""
+def export_salesforce_to_file(sf, soql_query, file_path, file_format='CSV', engine='bulk', progress_callback=None):
+    """
+    Stream the full result of a SOQL query to a CSV, Parquet or Excel file.
+
+    Args:
+    engine (str): 'bulk' runs a Bulk API 2.0 query job, 'rest' follows the REST nextRecordsUrl pages.
+    progress_callback (callable): Called with (rows_written, total_rows) after each page; total_rows may be None.
+
+    Returns:
+    tuple: (success, message)
+    """
     try:
-        records = sf.query(soql_query)['records']
-        df = pd.DataFrame(records)
-        df.to_excel(file_path, index=False)
-        return True, "Export successful."
+        total = {'rows': None}
+
+        def report(rows_written):
+            if progress_callback:
+                progress_callback(rows_written, total['rows'])
+
+        columns = None
+        if engine == 'bulk':
+            def record_total(job):
+                total['rows'] = job.get('numberRecordsProcessed')
+            pages = bulk_query_pages(Bulk2Client.from_salesforce(sf), soql_query, job_callback=record_total)
+        else:
+            def rest_pages():
+                for page in iter_query_pages(sf, soql_query, prefetch=True):
+                    total['rows'] = page.get('totalSize')
+                    yield records_to_frame(page['records'])
+            pages = rest_pages()
+            # Page columns depend on which parents are null, so the header comes from the SELECT list
+            columns = soql_columns(sf, soql_query)
+
+        with api_priority(BULK):
+            rows_written = stream_export(pages, file_path, file_format, report, columns)
+        return True, f"Export successful. {rows_written} rows written"
     except Exception as e:
-        print(f"Error exporting Salesforce data to Excel: {str(e)}")
+        print(f"Error exporting Salesforce data to {file_format}: {str(e)}")
         return False, str(e)
 
+def export_salesforce_to_csv(sf, soql_query, file_path, engine='rest'):
+    """Export data from Salesforce to a CSV file."""
+    return export_salesforce_to_file(sf, soql_query, file_path, 'CSV', engine)
+
+def export_salesforce_to_excel(sf, soql_query, file_path, engine='rest'):
+    """Export data from Salesforce to an Excel file."""
+    return export_salesforce_to_file(sf, soql_query, file_path, 'Excel', engine)
+
 def describe_object(sf, object_name):
     """
     Fetch and return the description of a Salesforce object including its fields.
@@ -92,7 +366,7 @@ def describe_object(sf, object_name):
     dict: A dictionary containing success status, fields of the object if successful, and an error message if not.
     """
     try:
-        description = sf.__getattr__(object_name).describe()
+        description = describe_sobject(sf, object_name)
         fields = description['fields']
         clean_fields = [{
             'label': field['label'],
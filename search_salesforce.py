@@ -1,69 +1,38 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Spacer
-from reportlab.lib import colors
+from datetime import datetime
+from pdf_report import dataframe_to_pdf
+from report_engine import show_report_export
 
 def show_search_salesforce(sf):
     st.subheader("Search Salesforce using SOSL")
     search_query = st.text_area("Enter SOSL Query (e.g., FIND {Test} IN ALL FIELDS RETURNING Account(Name))", "FIND {Test} IN ALL FIELDS RETURNING Account(Name)")
     if st.button("Run Search"):
-        results = search_salesforce(sf, search_query)
+        # Kept across reruns so the export controls keep working after the search button resets
+        st.session_state['search_results'] = (search_query, search_salesforce(sf, search_query), datetime.now())
+    if 'search_results' in st.session_state:
+        query, results, fetched_at = st.session_state['search_results']
         if results['success']:
             if results['records']:
                 df = pd.DataFrame([{'Type': rec.get('attributes', {}).get('type', 'N/A'), 
                                     'Name': rec.get('Name', 'N/A'), 
                                     'Id': rec.get('Id', 'N/A')} for rec in results['records']])
                 st.dataframe(df)
-                export_buttons(df)
+                # A rerun of the same search can return new records, so the fetch time is part of the version
+                export_buttons(df, version=(query, fetched_at))
             else:
                 st.warning("No records found.")
         else:
             st.error(f"Search failed: {results['message']}")
 
-def export_buttons(df):
+def export_buttons(df, version=None):
+    """Export controls for the search results; a file is only generated for the format the user asks for."""
     st.write("Export Results:")
-    pdf = generate_pdf(df)
-    csv = df.to_csv(index=False).encode('utf-8')
-    excel = generate_excel(df)
-    
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.download_button("Download as PDF", data=pdf, file_name="salesforce_results.pdf", mime="application/pdf")
-    with col2:
-        st.download_button("Download as CSV", data=csv, file_name="salesforce_results.csv", mime="text/csv")
-    with col3:
-        st.download_button("Download as Excel", data=excel, file_name="salesforce_results.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    show_report_export(df, key='search_results', base_name="salesforce_results", pdf_builder=generate_pdf, version=version)
 
 def generate_pdf(df):
     """Generate a PDF file from a DataFrame."""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    data = [df.columns.to_list()] + df.values.tolist()
-    t = Table(data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    elements.append(t)
-    doc.build(elements)
-    pdf = buffer.getvalue()
-    buffer.close()
-    return pdf
-
-def generate_excel(df):
-    """Generate an Excel file from a DataFrame."""
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False)
-    return output.getvalue()
+    return dataframe_to_pdf(df)
 
 def search_salesforce(sf, sosl_query):
     """Search Salesforce using SOSL (Salesforce Object Search Language)."""
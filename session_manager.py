@@ -0,0 +1,121 @@
+import threading
+import time
+import requests
+from resilience import ResilientAdapter
+from authentication import authenticate_salesforce_with_user
+
+DEFAULT_POOL_SIZE = 10
+# Salesforce sessions time out after two hours by default; re-login a little before that
+DEFAULT_TOKEN_LIFETIME_SECONDS = 2 * 60 * 60 - 5 * 60
+
+
+def build_http_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Create a requests.Session with a keep-alive connection pool and gzip-compressed responses.
+
+    Every request goes through the API governor, which counts it and throttles
+    background and bulk work as the org's daily quota runs low, and transient
+    failures are retried with backoff behind a circuit breaker per endpoint.
+    """
+    session = requests.Session()
+    adapter = ResilientAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+    return session
+
+
+class SalesforceSessionManager:
+    """
+    Process-level cache of authenticated Salesforce connections keyed by user and org.
+
+    Each connection keeps its own pooled HTTP session, so Streamlit reruns and page
+    reloads reuse both the access token and the open TCP/TLS connections instead of
+    logging in again. An expired token is refreshed transparently: any 401 answer is
+    replayed once with a fresh token.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, token_lifetime=DEFAULT_TOKEN_LIFETIME_SECONDS):
+        self.pool_size = pool_size
+        self.token_lifetime = token_lifetime
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def session_key(user_data):
+        return (user_data.get('username'), user_data.get('domain'))
+
+    def get(self, user_data):
+        """Return a cached, authenticated Salesforce connection for the user, logging in only when needed."""
+        key = self.session_key(user_data)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() < entry['expires_at']:
+                return entry['sf']
+            if entry:
+                if self._refresh_token(entry):
+                    return entry['sf']
+                self.release(user_data)
+
+            http_session = build_http_session(self.pool_size)
+            sf = authenticate_salesforce_with_user(user_data, session=http_session)
+            if sf is None:
+                http_session.close()
+                return None
+            # Lets per-user caches (e.g. query_cache) tell users of the same org apart
+            sf.cache_user = user_data.get('username')
+            entry = {
+                'sf': sf,
+                'user_data': dict(user_data),
+                'http_session': http_session,
+                'expires_at': time.time() + self.token_lifetime,
+            }
+            http_session.hooks['response'].append(self._make_401_hook(entry))
+            self._entries[key] = entry
+            return sf
+
+    def _refresh_token(self, entry):
+        """Log in again over the same pooled session and swap the new token into the existing connection."""
+        fresh = authenticate_salesforce_with_user(entry['user_data'], session=entry['http_session'])
+        if fresh is None or fresh.sf_instance != entry['sf'].sf_instance:
+            return False
+        sf = entry['sf']
+        sf.session_id = fresh.session_id
+        sf._generate_headers()
+        entry['expires_at'] = time.time() + self.token_lifetime
+        return True
+
+    def _make_401_hook(self, entry):
+        def refresh_on_401(response, *args, **kwargs):
+            if response.status_code != 401 or getattr(response.request, 'token_refreshed', False):
+                return response
+            sent_token = response.request.headers.get('Authorization', '').split(' ')[-1]
+            with self._lock:
+                # Another request may already have refreshed the token
+                if sent_token == entry['sf'].session_id and not self._refresh_token(entry):
+                    return response
+                token = entry['sf'].session_id
+            retry = response.request.copy()
+            retry.headers['Authorization'] = f"Bearer {token}"
+            retry.token_refreshed = True
+            return entry['http_session'].send(retry, **kwargs)
+        return refresh_on_401
+
+    def release(self, user_data):
+        """Forget the connection of a user (e.g. on logout) and close its connection pool."""
+        with self._lock:
+            entry = self._entries.pop(self.session_key(user_data), None)
+        if entry:
+            entry['http_session'].close()
+
+
+# Shared by every Streamlit session served by this process
+session_manager = SalesforceSessionManager()
+
+
+def get_salesforce_session(user_data):
+    return session_manager.get(user_data)
+
+
+def release_salesforce_session(user_data):
+    session_manager.release(user_data)
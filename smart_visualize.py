@@ -3,42 +3,82 @@ import pandas as pd
 import plotly.express as px
 import streamlit as st
 from simple_salesforce import Salesforce
+from metadata_cache import describe_global, describe_sobject
+from salesforce_api import QueryCursor
+from query_cache import cached_query_frame
+from aggregation_planner import (
+    NUMERIC_TYPES, DATE_TYPES, aggregate_by_group, aggregate_time_series, histogram,
+    local_group, local_time_series, local_histogram
+)
+from object_mirror import object_mirror
 from reportlab.lib.units import inch
-from st_aggrid import AgGrid
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Image
+from result_grid import FrameGridSource
+from ui_widgets import show_result_grid
+from pdf_report import PdfReport
 from datetime import datetime
 from pptx import Presentation
 from pptx.util import Inches
 import tempfile
 
+# Rows shown in the data grid; charts are aggregated over all rows in Salesforce
+PREVIEW_ROWS = 2000
+MAX_BAR_GROUPS = 50
+
 # Functions to fetch data and visualize
 
 def get_salesforce_fields(sf, object_name):
     try:
-        object_description = sf.__getattr__(object_name).describe()
+        object_description = describe_sobject(sf, object_name)
         return [field['name'] for field in object_description['fields']]
     except Exception as e:
         st.error(f"Failed to fetch fields for {object_name}: {str(e)}")
         return []
 
-def fetch_salesforce_data(sf, object_name, fields):
-    soql_query = f"SELECT {', '.join(fields)} FROM {object_name}"
-    results = sf.query_all(soql_query)
-    return pd.json_normalize(results['records'])
-
-def display_data_with_aggrid(df):
-    AgGrid(df)
-
-def choose_visualization(df, field):
-    if df[field].dtype in ['float64', 'int64']:
-        fig = px.histogram(df, x=field, title=f'Distribution of {field}', color_discrete_sequence=px.colors.qualitative.Plotly)
-    elif df[field].dtype == 'object' and len(df[field].unique()) <= 20:
-        fig = px.pie(df, names=field, title=f'Distribution of {field}', color_discrete_sequence=px.colors.qualitative.Plotly)
+def get_field_metadata(sf, object_name):
+    try:
+        return {field['name']: field for field in describe_sobject(sf, object_name)['fields']}
+    except Exception as e:
+        st.error(f"Failed to fetch fields for {object_name}: {str(e)}")
+        return {}
+
+def fetch_salesforce_data(sf, object_name, fields, preview_rows=PREVIEW_ROWS):
+    """Fetch a preview of the selected fields; the charts are aggregated in Salesforce over every row."""
+    soql_query = f"SELECT {', '.join(fields)} FROM {object_name} LIMIT {preview_rows}"
+    df, _ = cached_query_frame(sf, soql_query, lambda: QueryCursor(sf, soql_query).to_dataframe(typed=True))
+    return df
+
+def display_data_grid(df, preview):
+    # Kept in the session so paging and sorting the grid (which rerun the page) keep the rows
+    st.session_state['visualize_grid'] = (FrameGridSource(df), preview)
+
+def choose_visualization(sf, object_name, field, field_info, mirror_df=None):
+    """
+    Pick a chart for a field from its type and build it from aggregates computed in
+    Salesforce, or locally when the full object is given as mirror_df.
+    """
+    field_type = field_info.get('type')
+    colors_sequence = px.colors.qualitative.Plotly
+    if field_type in NUMERIC_TYPES:
+        df = (histogram(sf, object_name, field, field_type=field_type) if mirror_df is None
+              else local_histogram(mirror_df, field, field_type=field_type))
+        fig = px.bar(df, x='bucket', y='count', title=f'Distribution of {field}', color_discrete_sequence=colors_sequence)
+    elif field_type in DATE_TYPES:
+        if mirror_df is None:
+            df = aggregate_time_series(sf, object_name, field, 'Month', field_type=field_type)
+        else:
+            df = local_time_series(mirror_df, field, 'Month')
+        fig = px.line(df, x='period', y='value', labels={'value': 'Count'}, title=f'Records per month of {field}', color_discrete_sequence=colors_sequence)
+    elif field_info.get('groupable'):
+        df = aggregate_by_group(sf, object_name, field) if mirror_df is None else local_group(mirror_df, field)
+        if len(df) <= 20:
+            fig = px.pie(df, names=field, values='value', title=f'Distribution of {field}', color_discrete_sequence=colors_sequence)
+        else:
+            fig = px.bar(df.head(MAX_BAR_GROUPS), x=field, y='value', labels={'value': 'Count'},
+                         title=f'Count of {field} (top {MAX_BAR_GROUPS})', color_discrete_sequence=colors_sequence)
     else:
-        fig = px.bar(df, x=field, title=f'Count of {field}', color_discrete_sequence=px.colors.qualitative.Plotly)
-    
+        st.info(f"{field} cannot be grouped in SOQL, so it is not charted.")
+        return None
+
     st.plotly_chart(fig)
     return fig
 
@@ -57,40 +97,15 @@ def save_plot_as_image(fig):
 # Export to PDF with timestamp and visualizations
 def export_to_pdf(df, figures):
     pdf_path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
-    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-    elements = []
 
-    # Add timestamp
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    elements.append(Table([[f"Data Report generated on {timestamp}"]]))
-
-    # Convert the dataframe to a list of lists for the table
-    data = [df.columns.tolist()] + df.values.tolist()
-
-    # Create a Table object
-    table = Table(data)
-    
-    # Style the table
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-
-    elements.append(table)
-
-    # Add visualizations to the PDF
+    # Timestamp, the data as paged tables, then the visualizations
+    report = PdfReport()
+    report.add_paragraph(f"Data Report generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    report.add_table(df)
     for fig in figures:
-        img_path = save_plot_as_image(fig)
-        elements.append(Image(img_path, 6*inch, 4*inch))
+        report.add_image(save_plot_as_image(fig), 6*inch, 4*inch)
+    report.build(pdf_path)
 
-    doc.build(elements)
-    
     return pdf_path
 
 def export_to_pptx(figures):
@@ -106,22 +121,47 @@ def export_to_pptx(figures):
 # Main smart visualize function
 def smart_visualize(sf):
     st.subheader("Smart Visualize Salesforce Data")
-    object_names = [obj["name"] for obj in sf.describe()["sobjects"]]
+    object_names = [obj["name"] for obj in describe_global(sf)["sobjects"]]
     selected_object = st.selectbox("Select Salesforce Object", object_names)
 
     fields = get_salesforce_fields(sf, selected_object)
     selected_fields = st.multiselect("Select fields to visualize", fields)
 
+    mirror_state = object_mirror.state(sf, selected_object)
+    use_mirror = False
+    if mirror_state and set(selected_fields) <= set(mirror_state['fields']):
+        use_mirror = st.checkbox(f"Use local mirror (synced {mirror_state['synced_at'][:19]}, no API calls)", value=True)
+
     show_data = st.button("Show Data")
     if show_data:
-        df = fetch_salesforce_data(sf, selected_object, selected_fields)
-        display_data_with_aggrid(df)
-        figures = [choose_visualization(df, field) for field in selected_fields]
+        mirror_df = None
+        if use_mirror:
+            mirror_df = object_mirror.load(sf, selected_object, columns=selected_fields)
+            df = mirror_df.head(PREVIEW_ROWS)
+        else:
+            df = fetch_salesforce_data(sf, selected_object, selected_fields)
+        display_data_grid(mirror_df if use_mirror else df, preview=not use_mirror)
+        field_metadata = get_field_metadata(sf, selected_object)
+        figures = []
+        for field in selected_fields:
+            try:
+                fig = choose_visualization(sf, selected_object, field, field_metadata.get(field, {}), mirror_df)
+            except Exception as e:
+                st.error(f"Failed to chart {field}: {str(e)}")
+                fig = None
+            if fig is not None:
+                figures.append(fig)
 
         # Save data and figures in session state to avoid recomputation
         st.session_state['data'] = df
         st.session_state['figures'] = figures
 
+    if 'visualize_grid' in st.session_state:
+        source, preview = st.session_state['visualize_grid']
+        if preview:
+            st.caption(f"Showing up to {PREVIEW_ROWS} rows; charts cover every record.")
+        show_result_grid(source, key='visualize_grid_view')
+
     # Ensure that we have both data and figures available in the session state
     if 'data' in st.session_state and 'figures' in st.session_state:
         # Generate PDF with data and figures
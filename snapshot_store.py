@@ -0,0 +1,98 @@
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+SNAPSHOT_DB = 'snapshots.db'
+
+
+class SnapshotStore:
+    """
+    Latest fetched value of each dataset (API limits, scheduled jobs, ...) per org.
+
+    Values are kept in memory and persisted to SQLite, so snapshots written by the
+    background worker process are visible to the Streamlit pages and survive restarts.
+    """
+
+    def __init__(self, db_path=SNAPSHOT_DB):
+        self.db_path = db_path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._initialize_database()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _initialize_database(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                org TEXT,
+                dataset TEXT,
+                fetched_at REAL,
+                payload BLOB,
+                PRIMARY KEY (org, dataset)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def put(self, org, dataset, value, fetched_at=None):
+        fetched_at = fetched_at or time.time()
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO snapshots (org, dataset, fetched_at, payload) VALUES (?, ?, ?, ?)',
+            (org, dataset, fetched_at, zlib.compress(pickle.dumps(value)))
+        )
+        conn.commit()
+        conn.close()
+        with self._lock:
+            self._entries[(org, dataset)] = (fetched_at, value)
+
+    def get(self, org, dataset):
+        """Return (value, fetched_at) of the newest snapshot, or (None, None) when there is none."""
+        conn = self._connect()
+        row = conn.execute('SELECT fetched_at FROM snapshots WHERE org = ? AND dataset = ?', (org, dataset)).fetchone()
+        with self._lock:
+            cached = self._entries.get((org, dataset))
+        # Another process may have written a newer snapshot since it was cached here
+        if row and (cached is None or row[0] > cached[0]):
+            payload = conn.execute('SELECT payload FROM snapshots WHERE org = ? AND dataset = ?', (org, dataset)).fetchone()[0]
+            cached = (row[0], pickle.loads(zlib.decompress(payload)))
+            with self._lock:
+                self._entries[(org, dataset)] = cached
+        conn.close()
+        if cached is None:
+            return None, None
+        return cached[1], cached[0]
+
+
+# Shared by the pages and the background scheduler of this process
+snapshot_store = SnapshotStore()
+
+
+def read_snapshot(sf, dataset, max_age=None):
+    """Return (value, fetched_at) of a dataset snapshot, or (None, None) when missing or older than max_age seconds."""
+    value, fetched_at = snapshot_store.get(sf.sf_instance, dataset)
+    if fetched_at is None or (max_age is not None and time.time() - fetched_at > max_age):
+        return None, None
+    return value, fetched_at
+
+
+def save_snapshot(sf, dataset, value):
+    snapshot_store.put(sf.sf_instance, dataset, value)
+
+
+def snapshot_or_fetch(sf, dataset, fetch, max_age, force=False):
+    """
+    Return (value, fetched_at) from the newest snapshot when it is younger than max_age
+    seconds; otherwise call fetch(sf), save the result as the new snapshot and return it.
+    """
+    if not force:
+        value, fetched_at = read_snapshot(sf, dataset, max_age)
+        if fetched_at is not None:
+            return value, fetched_at
+    value = fetch(sf)
+    save_snapshot(sf, dataset, value)
+    return value, time.time()
@@ -0,0 +1,421 @@
+import hashlib
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from metadata_cache import describe_sobject
+
+NUMERIC_TYPES = {'int', 'long', 'double', 'currency', 'percent'}
+OPERATORS = {'=', '!=', '<', '<=', '>', '>=', 'LIKE', 'IN', 'NOT IN', 'INCLUDES', 'EXCLUDES'}
+LIST_OPERATORS = {'IN', 'NOT IN', 'INCLUDES', 'EXCLUDES'}
+RANGE_OPERATORS = {'<', '<=', '>', '>='}
+# Relative date literals such as TODAY, LAST_N_DAYS:30 or THIS_FISCAL_QUARTER
+DATE_LITERAL = re.compile(r"^[A-Z_]+(?::\d+)?$")
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*$")
+AGGREGATE = re.compile(r"^(COUNT|COUNT_DISTINCT|SUM|AVG|MIN|MAX)\(\s*([A-Za-z0-9_.]*)\s*\)(?:\s+([A-Za-z_]\w*))?$",
+                       re.IGNORECASE)
+STRING_ESCAPES = {'\\': '\\\\', "'": "\\'", '"': '\\"', '\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'}
+
+
+class SoqlError(ValueError):
+    """A query that cannot be built, or that does not match the org's describe metadata."""
+
+
+class DateLiteral:
+    """A relative date literal (e.g. LAST_N_DAYS:30), written without quotes."""
+
+    def __init__(self, text):
+        if not DATE_LITERAL.match(text):
+            raise SoqlError(f"'{text}' is not a SOQL date literal.")
+        self.text = text
+
+    def __repr__(self):
+        return f"DateLiteral({self.text!r})"
+
+
+class LikePattern:
+    """A LIKE pattern whose % and _ are wildcards; see contains() and starts_with() for literal text."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+
+    def __repr__(self):
+        return f"LikePattern({self.pattern!r})"
+
+
+def escape_string(value):
+    return ''.join(STRING_ESCAPES.get(character, character) for character in value)
+
+
+def escape_like(value):
+    """Escape text for use inside a LikePattern, so its %, _ and backslashes match literally."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def literal(value):
+    """The SOQL literal of a Python value, escaped; lists become a parenthesized, sorted set."""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, Decimal)):
+        return str(value)
+    if isinstance(value, float):
+        return format(Decimal(repr(value)), 'f')
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, DateLiteral):
+        return value.text
+    if isinstance(value, LikePattern):
+        # Backslashes are kept, so escaped wildcards stay escaped
+        return "'" + ''.join(STRING_ESCAPES.get(character, character) if character != '\\' else character
+                             for character in value.pattern) + "'"
+    if isinstance(value, (list, tuple, set, frozenset)):
+        if not value:
+            raise SoqlError("An IN list needs at least one value.")
+        return '(' + ', '.join(sorted({literal(item) for item in value})) + ')'
+    if isinstance(value, str):
+        return f"'{escape_string(value)}'"
+    raise SoqlError(f"Cannot use a {type(value).__name__} value in SOQL.")
+
+
+def coerce(text, field_type):
+    """
+    Convert text entered in a form into the Python value for a field of the given describe
+    type, so it is written as the right kind of literal (raises SoqlError when it cannot be).
+    """
+    if not isinstance(text, str):
+        return text
+    text = text.strip()
+    if text.lower() == 'null':
+        return None
+    try:
+        if field_type in ('int', 'long'):
+            return int(text)
+        if field_type in NUMERIC_TYPES:
+            return Decimal(text)
+        if field_type == 'boolean':
+            if text.lower() not in ('true', 'false'):
+                raise ValueError(text)
+            return text.lower() == 'true'
+        if field_type in ('date', 'datetime'):
+            if DATE_LITERAL.match(text):
+                return DateLiteral(text)
+            if field_type == 'date':
+                return date.fromisoformat(text)
+            parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    except (ValueError, InvalidOperation):
+        raise SoqlError(f"'{text}' is not a valid {field_type} value.")
+    return text
+
+
+class Condition:
+    """field operator value, e.g. Condition('Amount', '>', 1000)."""
+
+    def __init__(self, field, operator, value):
+        operator = ' '.join(operator.upper().split())
+        if operator not in OPERATORS:
+            raise SoqlError(f"Unsupported operator '{operator}'.")
+        if not IDENTIFIER.match(field):
+            raise SoqlError(f"'{field}' is not a field name.")
+        if operator in LIST_OPERATORS and not isinstance(value, (list, tuple, set, frozenset)):
+            value = [value]
+        self.field = field
+        self.operator = operator
+        self.value = value
+
+    def fields(self):
+        return [self.field]
+
+    def conditions(self):
+        return [self]
+
+    def to_soql(self):
+        return f"{self.field} {self.operator} {literal(self.value)}"
+
+    def __str__(self):
+        return self.to_soql()
+
+    def __eq__(self, other):
+        return isinstance(other, (Condition, BooleanCondition)) and self.to_soql() == other.to_soql()
+
+    def __hash__(self):
+        return hash(self.to_soql())
+
+
+class BooleanCondition:
+    """Conditions joined with AND or OR; operands are de-duplicated and sorted, since their order does not matter."""
+
+    def __init__(self, operator, operands):
+        self.operator = operator
+        flattened = []
+        for operand in operands:
+            if isinstance(operand, BooleanCondition) and operand.operator == operator:
+                flattened.extend(operand.operands)
+            elif operand is not None:
+                flattened.append(operand)
+        self.operands = sorted(set(flattened), key=lambda operand: operand.to_soql())
+
+    def fields(self):
+        return [field for operand in self.operands for field in operand.fields()]
+
+    def conditions(self):
+        return [condition for operand in self.operands for condition in operand.conditions()]
+
+    def to_soql(self):
+        parts = [operand.to_soql() if isinstance(operand, Condition) or len(operand.operands) < 2
+                 else f"({operand.to_soql()})" for operand in self.operands]
+        return f" {self.operator} ".join(parts)
+
+    def __str__(self):
+        return self.to_soql()
+
+    def __eq__(self, other):
+        return isinstance(other, (Condition, BooleanCondition)) and self.to_soql() == other.to_soql()
+
+    def __hash__(self):
+        return hash(self.to_soql())
+
+    def __bool__(self):
+        return bool(self.operands)
+
+
+def all_of(*conditions):
+    return BooleanCondition('AND', conditions)
+
+
+def any_of(*conditions):
+    return BooleanCondition('OR', conditions)
+
+
+def eq(field, value):
+    return Condition(field, '=', value)
+
+
+def between(field, low, high):
+    return all_of(Condition(field, '>=', low), Condition(field, '<=', high))
+
+
+def on_days(field, first_day, last_day):
+    """
+    A datetime field falling on any UTC day from first_day to last_day, the last day
+    included: the upper bound is midnight after it, so the whole day matches.
+    """
+    return all_of(Condition(field, '>=', datetime.combine(first_day, time.min, timezone.utc)),
+                  Condition(field, '<', datetime.combine(last_day + timedelta(days=1), time.min, timezone.utc)))
+
+
+def contains(field, text):
+    return Condition(field, 'LIKE', LikePattern(f"%{escape_like(text)}%"))
+
+
+def starts_with(field, text):
+    return Condition(field, 'LIKE', LikePattern(f"{escape_like(text)}%"))
+
+
+def form_condition(field, operator, value, field_type=None):
+    """
+    The condition a filter form describes: the value is converted for the field's describe
+    type, IN-style operators take comma-separated values and LIKE takes a pattern as typed.
+    """
+    operator = ' '.join(operator.upper().split())
+    if operator in LIST_OPERATORS:
+        values = value if isinstance(value, (list, tuple)) else [part for part in str(value).split(',') if part.strip()]
+        return Condition(field, operator, [coerce(part, field_type) for part in values])
+    if operator == 'LIKE':
+        return Condition(field, 'LIKE', LikePattern(str(value)))
+    return Condition(field, operator, coerce(value, field_type))
+
+
+def resolve_field(sf, object_name, path):
+    """The describe of the field a (possibly dotted) path names, following parent relationships."""
+    describe = describe_sobject(sf, object_name)
+    segments = path.split('.')
+    for segment in segments[:-1]:
+        relationship = next((field for field in describe['fields']
+                             if (field.get('relationshipName') or '').lower() == segment.lower()), None)
+        if relationship is None:
+            raise SoqlError(f"{describe['name']} has no relationship named '{segment}' (in {path}).")
+        describe = describe_sobject(sf, relationship['referenceTo'][0])
+    field = next((field for field in describe['fields'] if field['name'].lower() == segments[-1].lower()), None)
+    if field is None:
+        raise SoqlError(f"{describe['name']} has no field named '{segments[-1]}' (in {path}).")
+    return field
+
+
+class SoqlQuery:
+    """
+    A SOQL SELECT statement built from parts instead of string concatenation.
+
+    Literals are escaped and typed, conditions are written in a canonical order and
+    duplicate fields are dropped, so one logical query always produces the same text and
+    key(). validate(sf) checks fields, operators and values against describe metadata
+    before the query is sent.
+    """
+
+    def __init__(self, object_name, fields=None):
+        if not IDENTIFIER.match(object_name):
+            raise SoqlError(f"'{object_name}' is not an object name.")
+        self.object_name = object_name
+        self.select_fields = []
+        self.subqueries = []
+        self.condition = None
+        self.group_by_fields = []
+        self.order = []
+        self.limit_value = None
+        self.offset_value = None
+        if fields:
+            self.fields(*fields)
+
+    def fields(self, *fields):
+        for field in fields:
+            if not (IDENTIFIER.match(field) or AGGREGATE.match(field)):
+                raise SoqlError(f"'{field}' is not a field name.")
+            if field.lower() not in (existing.lower() for existing in self.select_fields):
+                self.select_fields.append(field)
+        return self
+
+    def subquery(self, query):
+        """Add a child relationship sub-query (a SoqlQuery on the relationship name)."""
+        self.subqueries.append(query)
+        return self
+
+    def where(self, *conditions):
+        """Add conditions, ANDed with any already present."""
+        self.condition = all_of(self.condition, *conditions)
+        return self
+
+    def group_by(self, *fields):
+        for field in fields:
+            if not IDENTIFIER.match(field):
+                raise SoqlError(f"'{field}' is not a field name.")
+            if field not in self.group_by_fields:
+                self.group_by_fields.append(field)
+        return self
+
+    def order_by(self, field, descending=False, nulls_last=None):
+        if not (IDENTIFIER.match(field) or AGGREGATE.match(field)):
+            raise SoqlError(f"'{field}' is not a field name.")
+        self.order.append((field, descending, nulls_last))
+        return self
+
+    def limit(self, count):
+        self.limit_value = int(count) if count is not None else None
+        return self
+
+    def offset(self, count):
+        self.offset_value = int(count) if count is not None else None
+        return self
+
+    def to_soql(self):
+        if not self.select_fields and not self.subqueries:
+            raise SoqlError(f"Select at least one field of {self.object_name}.")
+        select = self.select_fields + [f"({subquery.to_soql()})" for subquery in self.subqueries]
+        soql = f"SELECT {', '.join(select)} FROM {self.object_name}"
+        if self.condition:
+            soql += f" WHERE {self.condition.to_soql()}"
+        if self.group_by_fields:
+            soql += f" GROUP BY {', '.join(self.group_by_fields)}"
+        if self.order:
+            soql += " ORDER BY " + ', '.join(
+                f"{field} {'DESC' if descending else 'ASC'}"
+                + ('' if nulls_last is None else ' NULLS LAST' if nulls_last else ' NULLS FIRST')
+                for field, descending, nulls_last in self.order)
+        if self.limit_value is not None:
+            soql += f" LIMIT {self.limit_value}"
+        if self.offset_value is not None:
+            soql += f" OFFSET {self.offset_value}"
+        return soql
+
+    def __str__(self):
+        return self.to_soql()
+
+    def key(self):
+        """A stable hash of the query, equal for equivalent queries."""
+        return hashlib.sha256(self.to_soql().encode('utf-8')).hexdigest()
+
+    def __eq__(self, other):
+        return isinstance(other, SoqlQuery) and self.to_soql() == other.to_soql()
+
+    def __hash__(self):
+        return hash(self.to_soql())
+
+    def validate(self, sf, parent_object=None):
+        """
+        Check the query against describe metadata: fields exist, filtered fields are
+        filterable, sorted and grouped fields sortable and groupable, values fit the field
+        types, and restricted picklists only get their values. Raises SoqlError listing
+        every problem. Sub-queries are checked against the child object of their relationship.
+        """
+        object_name = self.object_name
+        if parent_object is not None:
+            relationship = next((child for child in describe_sobject(sf, parent_object)['childRelationships']
+                                 if (child.get('relationshipName') or '').lower() == self.object_name.lower()), None)
+            if relationship is None:
+                raise SoqlError(f"{parent_object} has no child relationship named '{self.object_name}'.")
+            object_name = relationship['childSObject']
+
+        problems = []
+
+        def check(path, flag=None, usage=None):
+            try:
+                field = resolve_field(sf, object_name, path)
+            except SoqlError as e:
+                problems.append(str(e))
+                return None
+            if flag and not field.get(flag, True):
+                problems.append(f"{path} cannot be used {usage}.")
+            return field
+
+        for field in self.select_fields:
+            aggregate = AGGREGATE.match(field)
+            if aggregate is None:
+                check(field)
+            elif aggregate.group(2):
+                check(aggregate.group(2))
+        for condition in self.condition.conditions() if self.condition else []:
+            field = check(condition.field, 'filterable', 'in WHERE')
+            if field is not None:
+                problems.extend(_value_problems(condition, field))
+        for field in self.group_by_fields:
+            check(field, 'groupable', 'in GROUP BY')
+        for field, _, _ in self.order:
+            if not AGGREGATE.match(field):
+                check(field, 'sortable', 'in ORDER BY')
+        for subquery in self.subqueries:
+            try:
+                subquery.validate(sf, object_name)
+            except SoqlError as e:
+                problems.append(str(e))
+        if problems:
+            raise SoqlError('; '.join(problems))
+        return self
+
+
+def _value_problems(condition, field):
+    values = condition.value if isinstance(condition.value, (list, tuple, set, frozenset)) else [condition.value]
+    field_type = field['type']
+    problems = []
+    for value in values:
+        if value is None or isinstance(value, DateLiteral) and field_type in ('date', 'datetime'):
+            continue
+        if field_type in NUMERIC_TYPES:
+            if isinstance(value, bool) or not isinstance(value, (int, float, Decimal)):
+                problems.append(f"{condition.field} is a {field_type} field; {literal(value)} is not a number.")
+        elif field_type == 'boolean' and not isinstance(value, bool):
+            problems.append(f"{condition.field} is a checkbox; compare it with true or false.")
+        elif field_type in ('date', 'datetime') and not isinstance(value, (date, DateLiteral)):
+            problems.append(f"{condition.field} is a {field_type} field; {literal(value)} is not a date.")
+        elif field_type in ('picklist', 'multipicklist') and field.get('restrictedPicklist') and isinstance(value, str):
+            allowed = {option['value'] for option in field.get('picklistValues', [])}
+            if value not in allowed:
+                problems.append(f"'{value}' is not a value of the {condition.field} picklist.")
+    if condition.operator in RANGE_OPERATORS and field_type in ('boolean', 'multipicklist', 'reference', 'id'):
+        problems.append(f"{condition.field} cannot be compared with {condition.operator}.")
+    if condition.operator in ('INCLUDES', 'EXCLUDES') and field_type != 'multipicklist':
+        problems.append(f"{condition.operator} only works on multi-select picklists, not {condition.field}.")
+    return problems
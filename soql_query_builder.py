@@ -1,14 +1,20 @@
 import streamlit as st
 import pandas as pd
 from simple_salesforce import Salesforce
-from st_aggrid import AgGrid
+from metadata_cache import describe_global
+from field_index import field_index, DEFAULT_DEPTH, MAX_DEPTH
+from ui_widgets import field_picker, show_result_grid, show_query_plan
+from object_mirror import object_mirror
+from result_grid import query_grid_source
+from query_builder import show_query_cache_stats
+from soql import SoqlQuery, SoqlError, form_condition
 
 def show_soql_query_builder(sf):
     st.title("Advanced SOQL Query Builder")
 
     # Fetching Salesforce objects
     try:
-        sobjects = sf.describe()['sobjects']
+        sobjects = describe_global(sf)['sobjects']
         object_names = [obj['name'] for obj in sobjects if obj['queryable']]
     except Exception as e:
         st.error(f"Failed to fetch objects: {e}")
@@ -17,41 +23,17 @@ def show_soql_query_builder(sf):
     # Selecting Salesforce object
     object_selected = st.selectbox("Select Salesforce Object", object_names, index=0)
     field_details = {}
-    field_names = []
-    parent_relationships = {}
     selected_fields = []
 
     if object_selected:
         try:
-            object_description = sf.__getattr__(object_selected).describe()
-            field_details = {field['name']: field for field in object_description['fields']}
-            field_names = list(field_details.keys())
-
-            # Parent relationship extraction
-            parent_relationships = {
-                field['relationshipName']: field['referenceTo'][0]
-                for field in object_description['fields']
-                if field.get('relationshipName') and 'referenceTo' in field
-            }
-
-            # Asking user if they want to add parent fields
-            add_parent = st.checkbox("Do you want to add parent fields?")
-
-            if add_parent and parent_relationships:
-                parent_object = st.selectbox("Select Parent Object", list(parent_relationships.keys()))
-                parent_object_name = parent_relationships[parent_object]
-
-                # Fetching fields from the parent object
-                parent_object_description = sf.__getattr__(parent_object_name).describe()
-                parent_field_names = [f"{parent_object_name}.{field['name']}" for field in parent_object_description['fields']]
-
-                # Displaying fields of the selected parent object
-                selected_parent_fields = st.multiselect(f"Select Fields from {parent_object_name}", parent_field_names)
-                selected_fields.extend(selected_parent_fields)
-
-            # Selecting fields for the main query
-            selected_child_fields = st.multiselect("Select Fields", field_names)
-            selected_fields.extend(selected_child_fields)
+            # Fields of the object and of its parents up to the chosen depth, searchable by
+            # name, label or relationship path (e.g. Owner.Profile.Name)
+            depth = st.number_input("Parent relationship levels to include", min_value=0, max_value=MAX_DEPTH,
+                                    value=DEFAULT_DEPTH, step=1, key="builder_field_depth")
+            index = field_index(sf, object_selected, depth)
+            field_details = index.fields
+            selected_fields = field_picker(index, "Select Fields", key=f"builder_fields:{object_selected}")
 
         except Exception as e:
             st.error(f"Failed to fetch fields for {object_selected}: {str(e)}")
@@ -76,9 +58,13 @@ def show_soql_query_builder(sf):
 
         if st.button("Add Filter"):
             if filter_field and operator and value:
-                formatted_value = f"'{value}'" if field_details[filter_field]['type'] in ['string', 'picklist'] else value
-                st.session_state.filters.append(f"{filter_field} {operator} {formatted_value}")
-                st.success(f"Added filter: {filter_field} {operator} {formatted_value}")
+                # Filters are kept as typed conditions; the value is converted and escaped for the field
+                try:
+                    condition = form_condition(filter_field, operator, value, field_details[filter_field]['type'])
+                    st.session_state.filters.append(condition)
+                    st.success(f"Added filter: {condition}")
+                except SoqlError as e:
+                    st.error(f"Invalid filter: {str(e)}")
             else:
                 st.warning("Please fill all filter fields.")
 
@@ -94,39 +80,49 @@ def show_soql_query_builder(sf):
         order_direction = st.selectbox("Order Direction", ["ASC", "DESC"], key="order_direction")
         limit = st.number_input("Limit", min_value=1, value=100, step=1, key="limit")
 
-    # Construct Query
-    if st.button("Run Query"):
-        query = f"SELECT {', '.join(selected_fields)} FROM {object_selected}"
-        
-        # Adding WHERE filters
-        if st.session_state.filters:
-            query += " WHERE " + " AND ".join(st.session_state.filters)
-        
-        # Adding ORDER BY and LIMIT clauses
-        if order_by_field and order_by_field in selected_fields:
-            query += f" ORDER BY {order_by_field} {order_direction} LIMIT {limit}"
-        else:
-            query += f" LIMIT {limit}"  # Default to just a limit if no valid order by
+    use_mirror = object_mirror.has_mirror(sf, object_selected) and st.checkbox(
+        "Run against the local mirror when possible", value=True, key="builder_use_mirror")
 
-        st.write("Constructed Query:", query)
-
-        # Execute Query
+    # Construct Query, checked against the object's describe before anything is sent
+    query = None
+    if selected_fields:
         try:
-            results = sf.query_all(query)
-            df = pd.DataFrame(results['records'])
+            soql_query = SoqlQuery(object_selected, selected_fields).where(*st.session_state.filters).limit(limit)
+            if order_by_field and order_by_field in selected_fields:
+                soql_query.order_by(order_by_field, descending=order_direction == "DESC")
+            query = soql_query.validate(sf).to_soql()
+        except SoqlError as e:
+            st.error(f"Invalid query: {str(e)}")
 
-            # Displaying Account names correctly
-            for field in selected_fields:
-                if 'Account.' in field:
-                    df[field] = df.apply(lambda x: x['Account'].get(field.split('.')[1]) if isinstance(x['Account'], dict) else '', axis=1)
+    # The plan can be checked before the query is run
+    if query:
+        show_query_plan(sf, query, key='builder_plan')
 
-            AgGrid(df)
+    if st.button("Run Query"):
+        if not query:
+            st.warning("Select at least one field and fix the query before running it.")
+            return
+        st.write("Constructed Query:", query)
+
+        # Execute Query; rows are read a page at a time as the grid needs them
+        try:
+            st.session_state['builder_source'] = query_grid_source(sf, query, use_mirror)
         except Exception as e:
             st.error(f"Failed to run query: {e}")
 
+    if 'builder_source' in st.session_state:
+        source, origin = st.session_state['builder_source']
+        if origin != 'salesforce':
+            st.caption(f"Served from the {'local mirror' if origin == 'mirror' else 'query cache'}.")
+        # Relationship fields come back already flattened into "Parent.Field" columns
+        show_result_grid(source, key='builder_grid')
+
     if st.button("Clear Filters and Subqueries"):
         st.session_state.filters.clear()
-        selected_fields.clear()
+        st.session_state.pop(f"builder_fields:{object_selected}", None)
+        st.rerun()
+
+    show_query_cache_stats()
 
 if __name__ == "__main__":
     sf = Salesforce(username='your_username', password='your_password', security_token='your_token')
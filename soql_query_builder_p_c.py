@@ -1,13 +1,21 @@
 import streamlit as st
-import pandas as pd
+from datetime import datetime
 from simple_salesforce import Salesforce
+from metadata_cache import describe_global, describe_sobject
+from field_index import field_index, DEFAULT_DEPTH, MAX_DEPTH
+from ui_widgets import field_picker, show_result_grid, show_query_plan
+from record_frame import soql_field_types
+from subquery_frames import parent_child_frames, child_field_types, PARENT_ID_COLUMN
+from report_engine import show_report_export
+from result_grid import FrameGridSource
+from soql import SoqlQuery, SoqlError, form_condition
 
 def show_advanced_soql_query_builder(sf):
     st.title("Advanced SOQL Query Builder with Parent-Child Relationship")
 
     # Fetching Salesforce objects
     try:
-        sobjects = sf.describe()['sobjects']
+        sobjects = describe_global(sf)['sobjects']
         object_names = [obj['name'] for obj in sobjects if obj['queryable']]
     except Exception as e:
         st.error(f"Failed to fetch objects: {e}")
@@ -21,7 +29,7 @@ def show_advanced_soql_query_builder(sf):
 
     # Parent Object Selection
     parent_object = st.selectbox("Select Parent Object", object_names)
-    parent_fields, child_relationships, selected_parent_fields = [], {}, []
+    child_relationships, selected_parent_fields = {}, []
     selected_child_fields, child_order_by, child_limits = {}, {}, {}
     parent_field_details = {}
     summary_mode = st.checkbox("Display as Summary Table")
@@ -29,9 +37,11 @@ def show_advanced_soql_query_builder(sf):
     if parent_object:
         try:
             # Describe parent object
-            parent_description = sf.__getattr__(parent_object).describe()
-            parent_field_details = {field['name']: field for field in parent_description['fields']}
-            parent_fields = list(parent_field_details.keys())
+            parent_description = describe_sobject(sf, parent_object)
+            depth = st.number_input("Lookup levels to include", min_value=0, max_value=MAX_DEPTH,
+                                    value=DEFAULT_DEPTH, step=1, key="pc_field_depth")
+            parent_index = field_index(sf, parent_object, depth)
+            parent_field_details = parent_index.fields
 
             # Gather child relationships for potential subqueries
             child_relationships = {
@@ -41,7 +51,7 @@ def show_advanced_soql_query_builder(sf):
             }
 
             # Select fields from Parent Object
-            selected_parent_fields = st.multiselect("Select Fields from Parent Object", parent_fields)
+            selected_parent_fields = field_picker(parent_index, "Select Fields from Parent Object", key=f"pc_parent_fields:{parent_object}")
 
             # Parent filters section
             st.subheader("Parent Filters")
@@ -59,14 +69,17 @@ def show_advanced_soql_query_builder(sf):
             parent_filter_operator = st.selectbox("Parent Filter Operator", ["=", ">", "<", "LIKE", "IN"], key="parent_filter_operator")
             if st.button("Add Parent Filter"):
                 if parent_filter_field and parent_filter_operator and parent_filter_value:
-                    formatted_value = f"'{parent_filter_value}'" if field_type in ['string', 'picklist'] else parent_filter_value
-                    st.session_state.parent_filters.append(f"{parent_filter_field} {parent_filter_operator} {formatted_value}")
-                    st.write("Added Parent Filter:", st.session_state.parent_filters[-1])
+                    try:
+                        st.session_state.parent_filters.append(
+                            form_condition(parent_filter_field, parent_filter_operator, parent_filter_value, field_type))
+                        st.write("Added Parent Filter:", str(st.session_state.parent_filters[-1]))
+                    except SoqlError as e:
+                        st.error(f"Invalid filter: {str(e)}")
 
             # Display current parent filters
             st.write("Current Parent Filters:")
             for f in st.session_state.parent_filters:
-                st.write(f)
+                st.write(str(f))
 
             # Parent order and limit
             st.subheader("Parent Advanced Filters")
@@ -91,13 +104,14 @@ def show_advanced_soql_query_builder(sf):
                 st.session_state.child_filters[selected_child_relationship] = []
 
             try:
-                # Describe child object
-                child_description = sf.__getattr__(child_object_name).describe()
-                child_field_details = {field['name']: field for field in child_description['fields']}
-                child_fields = list(child_field_details.keys())
+                # Child fields, including the child's own lookups (e.g. Contacts' Owner.Name)
+                child_index = field_index(sf, child_object_name, depth)
+                child_field_details = child_index.fields
 
                 # Select fields from Child Object
-                selected_child_fields[selected_child_relationship] = st.multiselect(f"Select Fields from {child_object_name}", child_fields)
+                selected_child_fields[selected_child_relationship] = field_picker(
+                    child_index, f"Select Fields from {child_object_name}",
+                    key=f"pc_child_fields:{parent_object}:{selected_child_relationship}")
 
                 # Filters for child object
                 st.subheader(f"Filters for {child_object_name}")
@@ -115,16 +129,18 @@ def show_advanced_soql_query_builder(sf):
                 child_filter_operator = st.selectbox(f"Filter Operator for {child_object_name}", ["=", ">", "<", "LIKE", "IN"], key="child_filter_operator")
                 if st.button(f"Add Filter for {child_object_name}"):
                     if child_filter_field and child_filter_operator and child_filter_value:
-                        formatted_child_value = f"'{child_filter_value}'" if child_field_type in ['string', 'picklist'] else child_filter_value
-                        st.session_state.child_filters[selected_child_relationship].append(
-                            f"{child_filter_field} {child_filter_operator} {formatted_child_value}"
-                        )
-                        st.write(f"Added Filter for {child_object_name}:", st.session_state.child_filters[selected_child_relationship][-1])
+                        try:
+                            st.session_state.child_filters[selected_child_relationship].append(
+                                form_condition(child_filter_field, child_filter_operator, child_filter_value, child_field_type)
+                            )
+                            st.write(f"Added Filter for {child_object_name}:", str(st.session_state.child_filters[selected_child_relationship][-1]))
+                        except SoqlError as e:
+                            st.error(f"Invalid filter: {str(e)}")
 
                 # Display current child filters
                 st.write("Current Filters for", child_object_name)
                 for f in st.session_state.child_filters[selected_child_relationship]:
-                    st.write(f)
+                    st.write(str(f))
 
                 # Order by and limit for child
                 child_order_by[selected_child_relationship] = st.selectbox(f"Order By for {child_object_name}", selected_child_fields[selected_child_relationship], key="child_order_by")
@@ -135,97 +151,104 @@ def show_advanced_soql_query_builder(sf):
                 st.error(f"Failed to fetch fields for {child_object_name}: {str(e)}")
                 return
 
-    # Constructing the SOQL Query
-    if st.button("Run Query"):
-        if not selected_parent_fields:
-            st.warning("Please select at least one field from the Parent Object.")
-            return
-
-        # Build query with parent fields
-        parent_fields_str = ", ".join(selected_parent_fields)
-        query = f"SELECT {parent_fields_str}"
+    # Constructing the SOQL Query, checked against describe metadata before anything is sent
+    query = None
+    if selected_parent_fields:
+        # Id is always selected so child rows can be joined to their parents
+        soql_query = SoqlQuery(parent_object, ['Id'] + selected_parent_fields)
 
         # Build child subqueries
-        child_queries = []
         for child_relationship, fields in selected_child_fields.items():
             if fields:
-                fields_str = ", ".join(fields)
-                child_query = f"(SELECT {fields_str} FROM {child_relationship}"
-
-                # Add child filters
-                if st.session_state.child_filters[child_relationship]:
-                    child_query += " WHERE " + " AND ".join(st.session_state.child_filters[child_relationship])
-
-                # Add child order and limit
+                child_query = SoqlQuery(child_relationship, fields).where(*st.session_state.child_filters[child_relationship])
                 if child_order_by[child_relationship]:
-                    child_query += f" ORDER BY {child_order_by[child_relationship]} {child_order_direction}"
+                    child_query.order_by(child_order_by[child_relationship], descending=child_order_direction == "DESC")
                 if child_limits[child_relationship]:
-                    child_query += f" LIMIT {child_limits[child_relationship]}"
+                    child_query.limit(child_limits[child_relationship])
+                soql_query.subquery(child_query)
 
-                child_query += ")"
-                child_queries.append(child_query)
-
-        if child_queries:
-            query += ", " + ", ".join(child_queries)
-
-        query += f" FROM {parent_object}"
-
-        # Add parent filters
-        if st.session_state.parent_filters:
-            query += " WHERE " + " AND ".join(st.session_state.parent_filters)
-
-        # Add parent order and limit
+        # Add parent filters, order and limit
+        soql_query.where(*st.session_state.parent_filters)
         if parent_order_by:
-            query += f" ORDER BY {parent_order_by} {parent_order_direction}"
+            soql_query.order_by(parent_order_by, descending=parent_order_direction == "DESC")
         if parent_limit:
-            query += f" LIMIT {parent_limit}"
+            soql_query.limit(parent_limit)
+        try:
+            query = soql_query.validate(sf).to_soql()
+        except SoqlError as e:
+            st.error(f"Invalid query: {str(e)}")
+
+    # The plan can be checked before the query is run
+    if query:
+        show_query_plan(sf, query, key='pc_plan')
+
+    if st.button("Run Query"):
+        if not query:
+            st.warning("Please select at least one field from the Parent Object and fix the query before running it.")
+            return
 
         st.write("Constructed Query:", query)
 
         # Execute query
         try:
-            results = sf.query_all(query)
-            records = results['records']
-
-            if summary_mode:
-                flattened_data = []
-                for record in records:
-                    account_data = {field: record.get(field) for field in selected_parent_fields}
-                    for child_relationship in selected_child_fields.keys():
-                        if child_relationship in record and record[child_relationship]:
-                            for child_record in record[child_relationship]['records']:
-                                child_data = {f"{child_relationship}.{field}": child_record.get(field) for field in selected_child_fields[child_relationship]}
-                                flattened_data.append({**account_data, **child_data})
-                        else:
-                            flattened_data.append(account_data)
-
-                df = pd.DataFrame(flattened_data)
-                st.dataframe(df)
-
-            else:
-                for record in records:
-                    st.markdown(f"### Account: {record.get('Name', 'No Name')}")
-                    account_data = {field: record.get(field) for field in selected_parent_fields}
-                    for field, value in account_data.items():
-                        st.write(f"**{field}:** {value}")
-
-                    # Child data in expanders
-                    for child_relationship in selected_child_fields.keys():
-                        if child_relationship in record and record[child_relationship]:
-                            st.markdown(f"**{child_relationship}**")
-                            with st.expander(f"Show {child_relationship}"):
-                                child_records = record[child_relationship]['records']
-                                child_data = [
-                                    {field: child_record.get(field) for field in selected_child_fields[child_relationship]}
-                                    for child_record in child_records
-                                ]
-                                st.table(pd.DataFrame(child_data))
-                        else:
-                            st.write(f"No records found for {child_relationship}")
-
+            relationships = [relationship for relationship, fields in selected_child_fields.items() if fields]
+            child_types = {relationship: child_field_types(sf, child_relationships[relationship], selected_child_fields[relationship])
+                           for relationship in relationships}
+            parent_frame, child_frames, summary = parent_child_frames(
+                sf, query, relationships, soql_field_types(sf, query), child_types)
+            st.session_state.pc_results = {
+                'query': query,
+                'parent_object': parent_object,
+                'parent_frame': parent_frame,
+                'child_frames': child_frames,
+                'summary': summary,
+                'fetched_at': datetime.now(),
+            }
         except Exception as e:
             st.error(f"Failed to run query: {e}")
 
+    # Results are kept across reruns so they can be exported
+    results = st.session_state.get('pc_results')
+    if results:
+        show_parent_child_results(results, summary_mode)
+
+def show_parent_child_results(results, summary_mode):
+    parent_frame, child_frames = results['parent_frame'], results['child_frames']
+    st.caption(f"{len(parent_frame)} parent records and "
+               + ", ".join(f"{len(frame)} {relationship}" for relationship, frame in child_frames.items())
+               + f" fetched at {results['fetched_at'].strftime('%Y-%m-%d %H:%M:%S')}.")
+
+    # Grid sources are kept with the results so sorted views survive reruns
+    if summary_mode:
+        summary_source = results.setdefault('summary_source', FrameGridSource(results['summary']))
+        show_result_grid(summary_source, key='pc_summary_grid')
+        show_report_export(results['summary'], key='pc_summary', base_name=f"{results['parent_object']}_summary",
+                           formats=['Excel', 'CSV'], version=results['fetched_at'])
+        return
+
+    # One grid of parents, and the children of the parent picked from the rows on screen
+    parent_source = results.setdefault('parent_source', FrameGridSource(parent_frame))
+    window = show_result_grid(parent_source, key='pc_parent_grid')
+    if window.empty or not child_frames:
+        return
+    names = dict(zip(window['Id'], window['Name'] if 'Name' in window else window['Id']))
+    parent_id = st.selectbox("Show child records of", list(names), format_func=lambda record_id: f"{names[record_id]} ({record_id})",
+                             key='pc_child_parent')
+
+    # Child row positions per parent, grouped once per result
+    child_positions = results.setdefault('child_positions', {
+        relationship: frame.groupby(PARENT_ID_COLUMN, sort=False).indices if not frame.empty else {}
+        for relationship, frame in child_frames.items()
+    })
+    for relationship, frame in child_frames.items():
+        positions = child_positions[relationship].get(parent_id)
+        st.markdown(f"**{relationship}**")
+        if positions is None:
+            st.write(f"No records found for {relationship}")
+            continue
+        child_rows = frame.iloc[positions].drop(columns=[PARENT_ID_COLUMN])
+        show_result_grid(FrameGridSource(child_rows), key=f"pc_child_grid:{relationship}")
+
 if __name__ == "__main__":
     # Initialize Salesforce connection
     sf = Salesforce(username='your_username', password='your_password', security_token='your_token')
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import numpy as np
+import pandas as pd
+from api_governor import with_current_priority
+from record_frame import flatten_records, soql_field_types
+from salesforce_api import iter_query_pages
+
+# Column of a child frame holding the Id of its parent record
+PARENT_ID_COLUMN = 'ParentId__'
+# Child collections paged in parallel when a sub-query returns more than one batch
+CHILD_PAGE_WORKERS = 4
+
+
+def _remaining_child_records(sf, collection):
+    """The child records of a sub-query collection past its first batch, following nextRecordsUrl."""
+    records = []
+    while not collection.get('done', True) and collection.get('nextRecordsUrl'):
+        collection = sf.query_more(collection['nextRecordsUrl'], identifier_is_url=True)
+        records.extend(collection['records'])
+    return records
+
+
+def complete_child_records(sf, collections, executor):
+    """
+    The full child record lists of one page of parents (None for a parent without children).
+
+    Salesforce only inlines the first batch of each sub-query; the rest of every
+    unfinished collection is fetched on the executor.
+    """
+    record_lists = [collection['records'] if collection else [] for collection in collections]
+    pending = {position: executor.submit(with_current_priority(_remaining_child_records), sf, collection)
+               for position, collection in enumerate(collections)
+               if collection and not collection.get('done', True)}
+    for position, future in pending.items():
+        record_lists[position] = record_lists[position] + future.result()
+    return record_lists
+
+
+def child_field_types(sf, child_object, fields):
+    """Describe types of the fields a sub-query selects, keyed like the child frame columns."""
+    return soql_field_types(sf, f"SELECT {', '.join(fields)} FROM {child_object}")
+
+
+def page_frames(sf, records, relationships, parent_types=None, child_types=None, executor=None):
+    """
+    Split one page of parent records into a parent frame and one child frame per relationship.
+
+    Child records of all parents are flattened together in a single pass, and the
+    PARENT_ID_COLUMN is filled by repeating each parent Id by its child count, so no
+    per-record merging is done. child_types maps relationship names to field types.
+    """
+    child_types = child_types or {}
+    parent_frame = flatten_records(records, parent_types).drop(columns=list(relationships), errors='ignore')
+    child_frames = {}
+    if not relationships:
+        return parent_frame, child_frames
+    if records and 'Id' not in records[0]:
+        raise ValueError("The parent query must select Id to join child records to their parents.")
+    parent_ids = [record['Id'] for record in records]
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor(max_workers=CHILD_PAGE_WORKERS)
+    try:
+        for relationship in relationships:
+            record_lists = complete_child_records(sf, [record.get(relationship) for record in records], executor)
+            child_frame = flatten_records(list(chain.from_iterable(record_lists)), child_types.get(relationship))
+            child_frame.insert(0, PARENT_ID_COLUMN, np.repeat(np.array(parent_ids, dtype=object),
+                                                              [len(child_records) for child_records in record_lists]))
+            child_frames[relationship] = child_frame
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return parent_frame, child_frames
+
+
+def iter_parent_child_frames(sf, soql_query, relationships, parent_types=None, child_types=None):
+    """Yield (parent_frame, child_frames) for every page of a parent-to-child query, children complete."""
+    with ThreadPoolExecutor(max_workers=CHILD_PAGE_WORKERS) as executor:
+        for page in iter_query_pages(sf, soql_query, prefetch=True):
+            yield page_frames(sf, page['records'], relationships, parent_types, child_types, executor)
+
+
+def summary_frame(parent_frame, child_frames):
+    """
+    One row per parent and child, as the summary table shows them: the parent columns
+    followed by the child columns prefixed with the relationship name. Parents without
+    children in a relationship keep one row with empty child columns; rows stay in
+    parent order.
+    """
+    if not child_frames or parent_frame.empty:
+        # A query matching no parents returns one empty page, whose frame has no Id column
+        return parent_frame.reset_index(drop=True)
+    parents = parent_frame.assign(**{PARENT_ID_COLUMN: parent_frame['Id'], '_parent_position': np.arange(len(parent_frame))})
+    joined = []
+    for relationship, child_frame in child_frames.items():
+        children = child_frame.rename(columns={column: f"{relationship}.{column}"
+                                               for column in child_frame.columns if column != PARENT_ID_COLUMN})
+        joined.append(parents.merge(children, on=PARENT_ID_COLUMN, how='left'))
+    summary = pd.concat(joined, ignore_index=True) if len(joined) > 1 else joined[0]
+    summary = summary.sort_values('_parent_position', kind='stable')
+    return summary.drop(columns=[PARENT_ID_COLUMN, '_parent_position']).reset_index(drop=True)
+
+
+def parent_child_frames(sf, soql_query, relationships, parent_types=None, child_types=None):
+    """All pages of a parent-to-child query as (parent_frame, child_frames, summary)."""
+    parent_pages, child_pages, summary_pages = [], {relationship: [] for relationship in relationships}, []
+    for parent_frame, child_frames in iter_parent_child_frames(sf, soql_query, relationships, parent_types, child_types):
+        parent_pages.append(parent_frame)
+        for relationship, child_frame in child_frames.items():
+            child_pages[relationship].append(child_frame)
+        summary_pages.append(summary_frame(parent_frame, child_frames))
+    if not parent_pages:
+        return pd.DataFrame(), {relationship: pd.DataFrame() for relationship in relationships}, pd.DataFrame()
+    return (pd.concat(parent_pages, ignore_index=True),
+            {relationship: pd.concat(frames, ignore_index=True) for relationship, frames in child_pages.items()},
+            pd.concat(summary_pages, ignore_index=True))
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from snapshot_store import read_snapshot, save_snapshot
+from object_mirror import object_mirror
+from home import fetch_metrics_concurrently
+from scheduled_jobs import fetch_scheduled_jobs
+from audit_logs import fetch_login_history, fetch_audit_logs
+from session_manager import get_salesforce_session
+from api_governor import BACKGROUND, api_priority
+
+# Seconds between scheduler ticks and default refresh interval of each dataset
+TICK_SECONDS = 5
+DATASET_INTERVALS = {
+    'api_limits': 300,
+    'home_metrics': 120,
+    'scheduled_jobs': 600,
+    'login_history': 600,
+    'audit_logs': 900,
+}
+MIRROR_INTERVAL_SECONDS = 900
+# Background refreshes pause when less than this share of DailyApiRequests is left,
+# and run at half speed when less than twice this share is left
+API_RESERVE_RATIO = 0.2
+
+
+def fetch_api_limits(sf):
+    return sf.limits()
+
+
+DATASET_FETCHERS = {
+    'api_limits': fetch_api_limits,
+    'home_metrics': fetch_metrics_concurrently,
+    'scheduled_jobs': fetch_scheduled_jobs,
+    'login_history': fetch_login_history,
+    'audit_logs': fetch_audit_logs,
+}
+
+
+def mirror_dataset(object_name):
+    return f"mirror:{object_name}"
+
+
+def api_quota_ratio(limits):
+    """Share of DailyApiRequests still available, or None when unknown."""
+    daily = (limits or {}).get('DailyApiRequests') or {}
+    if not daily.get('Max'):
+        return None
+    return daily.get('Remaining', 0) / daily['Max']
+
+
+class SyncScheduler:
+    """
+    Periodically refreshes dataset snapshots and object mirrors on a thread pool.
+
+    get_sf is called for every run, so the connection (and its token) always comes
+    from the session manager. Each dataset runs at most once at a time, and every
+    dataset except the API limits themselves is deferred while the org's remaining
+    DailyApiRequests are below the reserve.
+    """
+
+    def __init__(self, get_sf, intervals=None, mirror_objects=None, max_workers=4, reserve_ratio=API_RESERVE_RATIO):
+        self.get_sf = get_sf
+        self.intervals = dict(intervals or DATASET_INTERVALS)
+        self.extra_mirror_objects = list(mirror_objects or [])
+        self.reserve_ratio = reserve_ratio
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='background-sync')
+        self.status = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Scheduling
+    def datasets(self, sf):
+        """Dataset name -> (fetch, interval) for the datasets and mirrors to keep fresh."""
+        datasets = {name: (DATASET_FETCHERS[name], interval) for name, interval in self.intervals.items()}
+        mirrored = {state['object_name'] for state in object_mirror.list_mirrors(sf)} | set(self.extra_mirror_objects)
+        for object_name in sorted(mirrored):
+            datasets[mirror_dataset(object_name)] = (
+                lambda sf, object_name=object_name: object_mirror.sync(sf, object_name), MIRROR_INTERVAL_SECONDS
+            )
+        return datasets
+
+    def _interval_factor(self, sf):
+        ratio = api_quota_ratio(read_snapshot(sf, 'api_limits')[0])
+        if ratio is None or ratio >= 2 * self.reserve_ratio:
+            return 1
+        if ratio >= self.reserve_ratio:
+            return 2
+        return None
+
+    def tick(self):
+        """Start every dataset whose interval has elapsed; returns the names started."""
+        sf = self.get_sf()
+        if sf is None:
+            return []
+        factor = self._interval_factor(sf)
+        now = time.time()
+        started = []
+        for name, (fetch, interval) in self.datasets(sf).items():
+            with self._lock:
+                if name in self._running:
+                    continue
+                last_run = self.status.get(name, {}).get('last_run', 0)
+                if name != 'api_limits':
+                    if factor is None:
+                        self.status.setdefault(name, {})['state'] = 'deferred: API quota below reserve'
+                        continue
+                    interval *= factor
+                if now - last_run < interval:
+                    continue
+                self._running.add(name)
+                self.status.setdefault(name, {}).update({'state': 'running', 'last_run': now})
+            self.executor.submit(self._run, name, fetch)
+            started.append(name)
+        return started
+
+    def _run(self, name, fetch):
+        started = time.time()
+        try:
+            sf = self.get_sf()
+            # Background refreshes queue behind interactive calls when the quota runs low
+            with api_priority(BACKGROUND):
+                value = fetch(sf)
+            if not name.startswith('mirror:'):
+                # Mirrors are their own snapshot; everything else is stored for the pages
+                save_snapshot(sf, name, value)
+            state = {'state': 'ok', 'error': None}
+        except Exception as e:
+            print(f"Background refresh of {name} failed: {str(e)}")
+            state = {'state': 'failed', 'error': str(e)}
+        with self._lock:
+            self.status[name].update(state, duration=round(time.time() - started, 2), finished_at=time.time())
+            self._running.discard(name)
+
+    # Lifecycle
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Background sync tick failed: {str(e)}")
+            self._stop.wait(TICK_SECONDS)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='background-sync-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, wait=False):
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+        self.executor.shutdown(wait=wait)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run_once(self):
+        """Refresh every due dataset now and wait for them to finish (used by the worker's --once mode)."""
+        names = self.tick()
+        while True:
+            with self._lock:
+                if not self._running.intersection(names):
+                    break
+            time.sleep(0.2)
+        return {name: dict(self.status[name]) for name in names}
+
+
+def configured_mirror_objects():
+    """Objects listed in SYNC_MIRROR_OBJECTS (comma separated) are mirrored even before a first manual sync."""
+    return [name.strip() for name in os.environ.get('SYNC_MIRROR_OBJECTS', '').split(',') if name.strip()]
+
+
+# In-process scheduler, started by app.py after login unless BACKGROUND_SYNC=0
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def background_sync_enabled():
+    return os.environ.get('BACKGROUND_SYNC', '1') != '0'
+
+
+def start_background_sync(user_data):
+    """Start (once per process) the scheduler for the logged-in user; the connection comes from the session manager."""
+    global _scheduler
+    if not background_sync_enabled():
+        return None
+    credentials = dict(user_data)
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SyncScheduler(lambda: get_salesforce_session(credentials), mirror_objects=configured_mirror_objects())
+        else:
+            _scheduler.get_sf = lambda: get_salesforce_session(credentials)
+        _scheduler.start()
+        return _scheduler
+
+
+def stop_background_sync():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.stop()
+            _scheduler = None
+
+
+def get_background_sync():
+    return _scheduler
@@ -0,0 +1,42 @@
+# sync_worker.py
+# Runs the background sync scheduler as its own process, next to the Streamlit app:
+#     python sync_worker.py            keep refreshing until stopped
+#     python sync_worker.py --once     refresh every dataset once and exit
+# Start the app with BACKGROUND_SYNC=0 when this worker is used, so only one process syncs.
+import argparse
+import time
+from user_store import load_user_data
+from session_manager import get_salesforce_session
+from sync_scheduler import SyncScheduler, configured_mirror_objects
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh Salesforce snapshots and object mirrors in the background.")
+    parser.add_argument('--once', action='store_true', help="Refresh every dataset once, then exit.")
+    parser.add_argument('--workers', type=int, default=4, help="Number of datasets refreshed in parallel.")
+    args = parser.parse_args()
+
+    user_data = load_user_data()
+    if not user_data:
+        print("No registered user found. Register and log in through the app first.")
+        return
+
+    scheduler = SyncScheduler(lambda: get_salesforce_session(user_data),
+                              mirror_objects=configured_mirror_objects(), max_workers=args.workers)
+    if args.once:
+        for name, status in scheduler.run_once().items():
+            print(f"{name}: {status['state']} in {status.get('duration', 0)}s{' - ' + status['error'] if status.get('error') else ''}")
+        scheduler.stop(wait=True)
+        return
+
+    scheduler.start()
+    print("Background sync running. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        scheduler.stop(wait=True)
+
+
+if __name__ == "__main__":
+    main()
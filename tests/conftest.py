@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Caches, journals and mirrors create their SQLite files in the working directory on import
+os.chdir(tempfile.mkdtemp(prefix='salesforce_utility_tests_'))
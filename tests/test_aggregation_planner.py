@@ -0,0 +1,63 @@
+import re
+from urllib.parse import unquote
+import pandas as pd
+import pytest
+import aggregation_planner
+from aggregation_planner import bucket_edges, histogram, local_histogram
+
+NUMBER = r"-?\d+(?:\.\d+)?"
+
+
+def run_histogram(monkeypatch, low, high, field_type, bins=20):
+    """Run histogram() against a canned range, returning its frame and the bucket queries sent."""
+    monkeypatch.setattr(aggregation_planner, 'run_aggregate_query',
+                        lambda sf, soql_query: pd.DataFrame([{'low': low, 'high': high}]))
+    sent = []
+
+    def composite_request(sf, subrequests):
+        sent.extend(unquote(request['url'].split('q=', 1)[1]) for request in subrequests)
+        return [{'success': True, 'status': 200, 'body': {'totalSize': 1}} for _ in subrequests]
+
+    monkeypatch.setattr(aggregation_planner, 'composite_request', composite_request)
+    return histogram(None, 'Account', 'NumberOfEmployees', bins, field_type=field_type), sent
+
+
+def bounds(soql_query):
+    return re.findall(rf"(?:>=|<=|<) ({NUMBER})\b", soql_query)
+
+
+def test_integer_fields_get_whole_number_bounds(monkeypatch):
+    df, sent = run_histogram(monkeypatch, 1, 1000, 'int')
+    assert len(sent) == 20
+    for soql_query in sent:
+        assert all(re.fullmatch(r"-?\d+", bound) for bound in bounds(soql_query)), soql_query
+    assert sent[-1].endswith("NumberOfEmployees <= 1000)")
+    assert df['count'].sum() == 20
+
+
+def test_narrow_integer_range_gets_fewer_buckets(monkeypatch):
+    df, sent = run_histogram(monkeypatch, 3, 6, 'int')
+    assert df[['low', 'high']].values.tolist() == [[3, 4], [4, 5], [5, 6]]
+    assert len(sent) == 3
+
+
+@pytest.mark.parametrize('low, high', [(0.0, 1e16), (0.0, 2e-4), (-5e-6, 5e-6)])
+def test_float_bounds_are_fixed_point(monkeypatch, low, high):
+    _, sent = run_histogram(monkeypatch, low, high, 'double')
+    for soql_query in sent:
+        assert 'e' not in soql_query.split('WHERE', 1)[1].lower().replace('numberofemployees', '')
+        assert len(bounds(soql_query)) == 2
+
+
+def test_single_value_range(monkeypatch):
+    df, sent = run_histogram(monkeypatch, 7, 7, 'long')
+    assert sent == ["SELECT COUNT() FROM Account WHERE (NumberOfEmployees >= 7 AND NumberOfEmployees <= 7)"]
+    assert df['bucket'].tolist() == ['7 – 7']
+
+
+def test_local_histogram_matches_server_buckets():
+    values = pd.DataFrame({'NumberOfEmployees': [3, 4, 4, 5, 6, 6, 6]})
+    df = local_histogram(values, 'NumberOfEmployees', 20, 'int')
+    assert df[['low', 'high']].values.tolist() == [[3, 4], [4, 5], [5, 6]]
+    assert df['count'].tolist() == [1, 2, 4]
+    assert bucket_edges(3.0, 6.0, 20, 'int') == [3, 4, 5, 6]
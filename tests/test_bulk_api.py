@@ -0,0 +1,216 @@
+import json
+from io import StringIO
+import pandas as pd
+import pytest
+import bulk_api
+from bulk_api import (Bulk2Client, BulkApiError, ChunkedIngestError, ChunkNotSubmittedError, ChunkSubmittedError,
+                      bulk_ingest_csv, bulk_query_pages, run_ingest_chunk)
+
+INSTANCE_URL = 'https://example.my.salesforce.com'
+
+
+class Response:
+    def __init__(self, status_code=200, body=None, text=None, headers=None):
+        self.status_code = status_code
+        self.text = text if text is not None else json.dumps(body or {})
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class BulkStub:
+    """
+    In-memory stand-in for the Bulk API 2.0 /jobs endpoints, used as the client's requests session.
+
+    Ingest jobs complete as soon as their upload is closed; rows whose LastName is 'Fail'
+    land in the failed results. failures maps (method, path suffix) to a list of status
+    codes returned by the next matching calls; final_states forces a closed job's state.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.calls = []
+        self.failures = {}
+        self.final_states = []
+        self.query_pages = []
+
+    def request(self, method, url, headers=None, json=None, data=None, params=None):
+        path = url.split('/services/data/v59.0/', 1)[1]
+        self.calls.append((method, path))
+        assert headers['Authorization'] == 'Bearer token'
+        for (failing_method, suffix), statuses in self.failures.items():
+            if failing_method == method and path.endswith(suffix) and statuses:
+                return Response(statuses.pop(0), text='{"errorCode": "SERVER_UNAVAILABLE"}')
+
+        parts = path.split('/')
+        if method == 'POST' and path == 'jobs/ingest':
+            job_id = f"750{len(self.jobs):03d}"
+            self.jobs[job_id] = dict(json, id=job_id, state='Open', data=None)
+            return Response(body=self.summary(job_id))
+        if method == 'POST' and path == 'jobs/query':
+            return Response(body={'id': '7QQ', 'state': 'UploadComplete'})
+        if path.startswith('jobs/query/'):
+            if parts[-1] == 'results':
+                text, locator = self.query_pages[int(params.get('locator') or 0)]
+                return Response(text=text, headers={'Sforce-Locator': locator})
+            return Response(body={'id': '7QQ', 'state': 'JobComplete', 'numberRecordsProcessed': 3})
+        job = self.jobs[parts[2]]
+        if method == 'PUT':
+            job['data'] = data.decode('utf-8')
+            return Response(201, text='')
+        if method == 'PATCH':
+            job['state'] = json['state']
+            if json['state'] == 'UploadComplete':
+                job['state'] = self.final_states.pop(0) if self.final_states else 'JobComplete'
+            return Response(body=self.summary(job['id']))
+        if len(parts) == 3:
+            return Response(body=self.summary(job['id']))
+        return Response(text=self.results(job, parts[3]))
+
+    def summary(self, job_id):
+        return {key: value for key, value in self.jobs[job_id].items() if key != 'data'}
+
+    def results(self, job, result_type):
+        rows = pd.read_csv(StringIO(job['data']), dtype=str, keep_default_na=False)
+        failed = rows['LastName'] == 'Fail'
+        if result_type == 'successfulResults':
+            rows = rows[~failed]
+            rows.insert(0, 'sf__Created', 'true')
+            rows.insert(0, 'sf__Id', [f"003{index:012d}" for index in rows.index])
+        elif result_type == 'failedResults':
+            rows = rows[failed]
+            rows.insert(0, 'sf__Error', 'REQUIRED_FIELD_MISSING:Required fields are missing')
+            rows.insert(0, 'sf__Id', '')
+        else:
+            rows = rows.iloc[0:0]
+        return rows.to_csv(index=False, lineterminator='\n') if not rows.empty else ''
+
+    def ingest_jobs(self):
+        return list(self.jobs.values())
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(bulk_api.time, 'sleep', lambda seconds: None)
+    return BulkStub()
+
+
+@pytest.fixture
+def client(stub):
+    return Bulk2Client(INSTANCE_URL, 'token', '59.0', session=stub)
+
+
+@pytest.fixture
+def contacts_csv(tmp_path):
+    path = tmp_path / 'contacts.csv'
+    pd.DataFrame({'LastName': ['Ann', 'Bob', 'Fail', 'Dee', 'Eve'],
+                  'Email': ['ann@x.com', '', 'c@x.com', 'dee@x.com', 'eve@x.com']}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_ingest_sends_one_job_per_chunk(client, stub, contacts_csv):
+    progress = []
+    results = bulk_ingest_csv(client, 'Contact', contacts_csv, chunk_size=2, poll_interval=0,
+                              progress_callback=lambda chunks, rows: progress.append((chunks, rows)))
+    assert len(results['jobs']) == 3
+    assert results['rows_sent'] == 5
+    assert progress == [(1, 2), (2, 4), (3, 5)]
+    assert results['successful']['LastName'].tolist() == ['Ann', 'Bob', 'Dee', 'Eve']
+    assert results['successful']['chunk'].tolist() == [0, 0, 1, 2]
+    assert results['failed']['LastName'].tolist() == ['Fail']
+    assert results['failed']['sf__Error'].str.startswith('REQUIRED_FIELD_MISSING').all()
+    # Blank cells stay blank rather than becoming 'nan'
+    assert stub.jobs['750000']['data'] == 'LastName,Email\nAnn,ann@x.com\nBob,\n'
+    assert {job['operation'] for job in stub.ingest_jobs()} == {'insert'}
+
+
+def test_upsert_job_names_the_external_id_field(client, stub):
+    client.create_ingest_job('Contact', 'upsert', 'Key__c')
+    assert stub.jobs['750000']['externalIdFieldName'] == 'Key__c'
+    with pytest.raises(ValueError):
+        client.create_ingest_job('Contact', 'upsert')
+    with pytest.raises(ValueError):
+        client.create_ingest_job('Contact', 'merge')
+
+
+def test_failed_upload_aborts_the_job_as_not_submitted(client, stub):
+    stub.failures[('PUT', '/batches')] = [400]
+    chunk = pd.DataFrame({'LastName': ['Ann']})
+    with pytest.raises(ChunkNotSubmittedError) as error:
+        run_ingest_chunk(client, 'Contact', 'insert', chunk, poll_interval=0)
+    assert error.value.status == 400
+    assert stub.jobs['750000']['state'] == 'Aborted'
+    assert ('PATCH', 'jobs/ingest/750000') in stub.calls
+
+
+def test_transient_upload_failure_resends_even_an_insert(client, stub, contacts_csv):
+    stub.failures[('PUT', '/batches')] = [503]
+    results = bulk_ingest_csv(client, 'Contact', contacts_csv, chunk_size=5, poll_interval=0)
+    assert [job['state'] for job in stub.ingest_jobs()] == ['Aborted', 'JobComplete']
+    assert len(results['successful']) == 4
+
+
+def test_not_submitted_chunk_stops_the_ingest_and_resumes_there(client, stub, contacts_csv):
+    def fail_second_job(method, url, **kwargs):
+        if method == 'POST' and url.endswith('jobs/ingest') and len(stub.jobs) == 1:
+            return Response(400, text='{"errorCode": "INVALID_FIELD"}')
+        return BulkStub.request(stub, method, url, **kwargs)
+
+    stub.request = fail_second_job
+    with pytest.raises(ChunkedIngestError) as error:
+        bulk_ingest_csv(client, 'Contact', contacts_csv, chunk_size=2, poll_interval=0)
+    assert error.value.next_chunk == 1
+    assert error.value.job_id is None
+    assert isinstance(error.value.__cause__, ChunkNotSubmittedError)
+    assert error.value.partial_results['successful']['LastName'].tolist() == ['Ann', 'Bob']
+
+    del stub.request
+    resumed = bulk_ingest_csv(client, 'Contact', contacts_csv, chunk_size=2, poll_interval=0,
+                              start_chunk=error.value.next_chunk)
+    assert resumed['rows_sent'] == 3
+    assert resumed['successful']['chunk'].tolist() == [1, 2]
+
+
+def test_submitted_insert_is_not_resent(client, stub, contacts_csv):
+    stub.failures[('GET', 'jobs/ingest/750000')] = [503]
+    with pytest.raises(ChunkedIngestError) as error:
+        bulk_ingest_csv(client, 'Contact', contacts_csv, chunk_size=5, poll_interval=0)
+    assert isinstance(error.value.__cause__, ChunkSubmittedError)
+    assert error.value.job_id == '750000'
+    assert error.value.next_chunk == 0
+    assert 'check it for processed rows' in str(error.value)
+    assert len(stub.jobs) == 1
+
+
+def test_submitted_upsert_is_resent_after_a_transient_failure(client, stub, contacts_csv):
+    stub.failures[('GET', 'jobs/ingest/750000')] = [503]
+    results = bulk_ingest_csv(client, 'Contact', contacts_csv, operation='upsert', external_id_field='Email',
+                              chunk_size=5, poll_interval=0)
+    assert len(stub.jobs) == 2
+    assert len(results['successful']) == 4
+
+
+def test_failed_job_state_is_reported_without_resending(client, stub, contacts_csv):
+    stub.final_states = ['Failed']
+    with pytest.raises(ChunkedIngestError) as error:
+        bulk_ingest_csv(client, 'Contact', contacts_csv, operation='update', chunk_size=5, poll_interval=0)
+    assert 'ended in state Failed' in str(error.value)
+    assert len(stub.jobs) == 1
+
+
+def test_query_pages_follow_the_locator(client, stub):
+    stub.query_pages = [('Id,Name\n001A,Acme\n001B,Beta\n', '1'), ('Id,Name\n001C,\n', 'null')]
+    jobs = []
+    pages = list(bulk_query_pages(client, 'SELECT Id, Name FROM Account', page_size=2, poll_interval=0,
+                                  job_callback=jobs.append))
+    assert [page['Id'].tolist() for page in pages] == [['001A', '001B'], ['001C']]
+    assert pages[1]['Name'].tolist() == ['']
+    assert jobs[0]['numberRecordsProcessed'] == 3
+
+
+def test_error_status_is_kept_on_the_exception(client, stub):
+    stub.failures[('GET', 'jobs/ingest/missing')] = [404]
+    with pytest.raises(BulkApiError) as error:
+        client.get_job('missing')
+    assert error.value.status == 404
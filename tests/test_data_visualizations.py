@@ -0,0 +1,30 @@
+from datetime import date
+from data_visualizations import build_filter_condition
+
+FIELD_TYPES = {'CreatedDate': 'datetime', 'CloseDate': 'date', 'Amount': 'currency'}
+
+
+def date_filter(field, start, end):
+    return [{'field': field, 'operator': 'between', 'value': (start, end)}]
+
+
+def test_datetime_range_includes_the_whole_last_day():
+    condition = build_filter_condition(date_filter('Opportunity.CreatedDate', '2026-10-18', '2026-10-18'), [], FIELD_TYPES)
+    assert condition.to_soql() == "CreatedDate < 2026-10-19T00:00:00Z AND CreatedDate >= 2026-10-18T00:00:00Z"
+
+
+def test_datetime_range_from_date_objects_across_a_month_end():
+    condition = build_filter_condition(date_filter('Opportunity.CreatedDate', date(2026, 1, 1), date(2026, 1, 31)),
+                                       [], FIELD_TYPES)
+    assert condition.to_soql() == "CreatedDate < 2026-02-01T00:00:00Z AND CreatedDate >= 2026-01-01T00:00:00Z"
+
+
+def test_datetime_range_with_times_is_kept_as_entered():
+    condition = build_filter_condition(
+        date_filter('Opportunity.CreatedDate', '2026-10-18T08:00:00Z', '2026-10-18T17:00:00Z'), [], FIELD_TYPES)
+    assert condition.to_soql() == "CreatedDate <= 2026-10-18T17:00:00Z AND CreatedDate >= 2026-10-18T08:00:00Z"
+
+
+def test_date_range_uses_inclusive_date_literals():
+    condition = build_filter_condition(date_filter('Opportunity.CloseDate', '2026-10-18', '2026-10-18'), [], FIELD_TYPES)
+    assert condition.to_soql() == "CloseDate <= 2026-10-18 AND CloseDate >= 2026-10-18"
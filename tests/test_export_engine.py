@@ -0,0 +1,71 @@
+import csv
+import pandas as pd
+import pytest
+import record_frame
+from export_engine import EXPORT_FORMATS, records_to_frame, stream_export
+from record_frame import soql_columns
+
+DESCRIBES = {
+    'Contact': {'fields': [
+        {'name': 'Id', 'type': 'id', 'relationshipName': None},
+        {'name': 'OwnerId', 'type': 'reference', 'relationshipName': 'Owner', 'referenceTo': ['User']},
+    ]},
+    'User': {'fields': [
+        {'name': 'Id', 'type': 'id', 'relationshipName': None},
+        {'name': 'Name', 'type': 'string', 'relationshipName': None},
+    ]},
+}
+
+
+def owner_pages():
+    """Two REST pages: the Owner is null throughout the first one."""
+    first = [{'attributes': {'type': 'Contact'}, 'Id': '1', 'Owner': None}]
+    second = [{'attributes': {'type': 'Contact'}, 'Id': '2',
+               'Owner': {'attributes': {'type': 'User'}, 'Name': 'Bob'}}]
+    return [records_to_frame(first), records_to_frame(second)]
+
+
+@pytest.fixture
+def describes(monkeypatch):
+    monkeypatch.setattr(record_frame, 'describe_sobject', lambda sf, name: DESCRIBES[name])
+
+
+def test_soql_columns_follow_select_list(describes):
+    assert soql_columns(None, "SELECT Id, owner.name FROM Contact") == ['Id', 'Owner.Name']
+
+
+def test_soql_columns_unknown_for_subqueries_and_aggregates(describes):
+    assert soql_columns(None, "SELECT Id, (SELECT Id FROM Cases) FROM Contact") is None
+    assert soql_columns(None, "SELECT COUNT(Id) FROM Contact") is None
+
+
+def test_null_parent_on_first_page_keeps_later_values(tmp_path, describes):
+    path = tmp_path / 'contacts.csv'
+    columns = soql_columns(None, "SELECT Id, Owner.Name FROM Contact")
+    assert stream_export(owner_pages(), path, 'CSV', columns=columns) == 2
+    with open(path, newline='', encoding='utf-8') as file:
+        assert list(csv.reader(file)) == [['Id', 'Owner.Name'], ['1', ''], ['2', 'Bob']]
+
+
+@pytest.mark.parametrize('file_format', EXPORT_FORMATS)
+def test_values_outside_first_page_header_raise(tmp_path, file_format):
+    with pytest.raises(ValueError, match='Owner.Name'):
+        stream_export(owner_pages(), tmp_path / 'contacts.out', file_format)
+
+
+@pytest.mark.parametrize('file_format', ['Parquet', 'Excel'])
+def test_fixed_columns_for_parquet_and_excel(tmp_path, file_format):
+    path = tmp_path / 'contacts.out'
+    stream_export(owner_pages(), path, file_format, columns=['Id', 'Owner.Name'])
+    frame = pd.read_parquet(path) if file_format == 'Parquet' else pd.read_excel(path, dtype=str)
+    assert list(frame.columns) == ['Id', 'Owner.Name']
+    assert frame['Owner.Name'].tolist()[1] == 'Bob'
+
+
+def test_empty_columns_outside_header_are_dropped(tmp_path):
+    pages = [records_to_frame([{'Id': '1', 'Owner': {'Name': 'Ann'}}]),
+             records_to_frame([{'Id': '2', 'Owner': None}])]
+    path = tmp_path / 'contacts.csv'
+    assert stream_export(pages, path, 'CSV') == 2
+    with open(path, newline='', encoding='utf-8') as file:
+        assert list(csv.reader(file)) == [['Id', 'Owner.Name'], ['1', 'Ann'], ['2', '']]
@@ -0,0 +1,76 @@
+import os
+import pandas as pd
+import pytest
+import import_jobs
+from import_jobs import ImportJournal, create_import_job, run_import_job
+
+
+class Connection:
+    sf_instance = 'example.my.salesforce.com'
+    session_id = 'session'
+
+    def __init__(self):
+        self.queries = []
+
+    def query(self, soql_query, include_deleted=False):
+        self.queries.append(soql_query)
+        return {'totalSize': 0, 'done': True, 'records': []}
+
+
+@pytest.fixture
+def journal(monkeypatch, tmp_path):
+    journal = ImportJournal(str(tmp_path / 'import_jobs.db'))
+    monkeypatch.setattr(import_jobs, 'import_journal', journal)
+    monkeypatch.setattr(import_jobs, 'IMPORT_FILES_DIR', str(tmp_path / 'files'))
+    monkeypatch.setattr(import_jobs, 'invalidate_object', lambda sf, sobject: None)
+    return journal
+
+
+def write_csv(tmp_path, rows):
+    path = tmp_path / 'contacts.csv'
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+
+def sent_collection(sf, sobject, operation, records, external_id_field=None):
+    return [{'success': True, 'id': f"003{index:03d}", 'message': 'OK'} for index, _ in enumerate(records)]
+
+
+def test_resuming_insert_with_blank_external_ids_skips_lookup(journal, tmp_path, monkeypatch):
+    monkeypatch.setattr(import_jobs, 'send_collection', sent_collection)
+    sf = Connection()
+    job_id = create_import_job(sf, 'Contact', write_csv(tmp_path, {'LastName': ['A', 'B'], 'Key__c': ['', '']}),
+                               external_id_field='Key__c')
+    journal.mark_sent(job_id, 0, 0, 2)
+
+    job = run_import_job(sf, job_id)
+    assert job['status'] == 'completed'
+    assert sf.queries == []
+    assert import_jobs.import_job_results(job_id)['row'].tolist() == [0, 1]
+
+
+def test_bulk_rows_are_numbered_from_the_chunk_offset():
+    chunk = pd.DataFrame({'LastName': ['A', 'B', 'C'], 'Email': ['a@x', 'b@x', '']})
+    result = {
+        'successful': pd.DataFrame({'sf__Id': ['003B', '003A'], 'sf__Created': ['true', 'true'],
+                                    'LastName': ['B', 'A'], 'Email': ['b@x', 'a@x']}),
+        'failed': pd.DataFrame({'sf__Id': [''], 'sf__Error': ['REQUIRED_FIELD_MISSING'], 'LastName': ['C'], 'Email': ['']}),
+        'unprocessed': pd.DataFrame(columns=['LastName', 'Email']),
+    }
+    rows = import_jobs._bulk_rows({'external_id_field': None}, result, chunk, 400)
+    assert {row['id'] or row['message']: row['row_number'] for row in rows} == {
+        '003A': 400, '003B': 401, 'REQUIRED_FIELD_MISSING': 402}
+
+
+def test_failure_after_cancel_keeps_job_cancelled(journal, tmp_path, monkeypatch):
+    sf = Connection()
+    job_id = create_import_job(sf, 'Contact', write_csv(tmp_path, {'LastName': ['A']}))
+
+    def cancel_then_fail(*args, **kwargs):
+        import_jobs.cancel_import_job(job_id)
+        raise ConnectionError('connection reset')
+
+    monkeypatch.setattr(import_jobs, 'send_collection', cancel_then_fail)
+    job = run_import_job(sf, job_id)
+    assert job['status'] == 'cancelled'
+    assert not os.path.exists(job['file_path'])
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+import query_cache
+from query_cache import QueryResultCache, query_objects
+
+DESCRIBES = {
+    'Account': {
+        'fields': [{'name': 'OwnerId', 'relationshipName': 'Owner', 'referenceTo': ['User']}],
+        'childRelationships': [{'relationshipName': 'Contacts', 'childSObject': 'Contact'}],
+    },
+    'Contact': {
+        'fields': [{'name': 'AccountId', 'relationshipName': 'Account', 'referenceTo': ['Account']}],
+        'childRelationships': [{'relationshipName': 'Cases', 'childSObject': 'Case'}],
+    },
+    'User': {'fields': [], 'childRelationships': []},
+}
+
+
+class Connection:
+    sf_instance = 'example.my.salesforce.com'
+    session_id = 'session'
+
+
+@pytest.fixture
+def describes(monkeypatch):
+    monkeypatch.setattr(query_cache, 'describe_sobject', lambda sf, name: DESCRIBES[name])
+
+
+def test_child_subqueries_resolve_to_child_objects(describes):
+    assert query_objects("SELECT Id, (SELECT Id FROM Contacts) FROM Account", Connection()) == {
+        'account', 'contact', 'contacts'}
+
+
+def test_parent_paths_resolve_through_reference_to(describes):
+    assert query_objects("SELECT Id, Account.Owner.Name FROM Contact WHERE Name = 'a.b'", Connection()) == {
+        'contact', 'account', 'user'}
+    assert query_objects("SELECT Id FROM Contact WHERE Account.Name = 'Acme'", Connection()) == {
+        'contact', 'account'}
+
+
+def test_nested_paths_resolve_from_the_child_object(describes):
+    query = "SELECT Id, (SELECT Id, Account.Owner.Name FROM Contacts WHERE Id IN (SELECT ContactId FROM Case)) FROM Account"
+    assert query_objects(query, Connection()) >= {'account', 'contact', 'user', 'case'}
+
+
+def test_without_connection_names_are_kept_as_written():
+    assert query_objects("SELECT Id, (SELECT Id FROM Contacts) FROM Account") == {'account', 'contacts'}
+
+
+def test_write_to_parent_evicts_cached_child_query(describes):
+    cache = QueryResultCache()
+    sf = Connection()
+    key = cache.make_key(sf, "SELECT Id, Account.Name FROM Contact")
+    cache.put(key, pd.DataFrame({'Id': ['003']}), query_objects("SELECT Id, Account.Name FROM Contact", sf))
+    cache.invalidate_object(sf.sf_instance, 'Account')
+    assert cache.get(key) is None
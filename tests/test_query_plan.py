@@ -0,0 +1,82 @@
+from query_plan import analyze_plans, filter_fields, indexed_fields
+
+TABLE_SCAN = {
+    'plans': [{
+        'cardinality': 120000, 'fields': [], 'leadingOperationType': 'TableScan', 'notes': [],
+        'relativeCost': 2.87, 'sobjectCardinality': 120000, 'sobjectType': 'Account',
+    }],
+}
+INDEX_AND_SCAN = {
+    'plans': [
+        {'cardinality': 120000, 'fields': [], 'leadingOperationType': 'TableScan', 'notes': [],
+         'relativeCost': 2.87, 'sobjectCardinality': 120000, 'sobjectType': 'Account'},
+        {'cardinality': 12, 'fields': ['ExternalKey__c'], 'leadingOperationType': 'Index', 'notes': [],
+         'relativeCost': 0.0004, 'sobjectCardinality': 120000, 'sobjectType': 'Account'},
+    ],
+}
+NON_SELECTIVE_WITH_NOTES = {
+    'plans': [{
+        'cardinality': 60000, 'fields': ['Industry'], 'leadingOperationType': 'Index', 'relativeCost': 1.4,
+        'sobjectCardinality': 120000, 'sobjectType': 'Account',
+        'notes': [{'description': 'Not considering filter for optimization because unindexed',
+                   'fields': ['Rating'], 'tableEnumOrId': 'Account'}],
+    }],
+}
+INDEXED = ['Id', 'Name', 'OwnerId', 'ExternalKey__c']
+
+
+def test_table_scan_warns_and_suggests_indexed_fields():
+    analysis = analyze_plans(TABLE_SCAN, "SELECT Id FROM Account WHERE Rating = 'Hot'", INDEXED)
+    assert analysis['plan']['leadingOperationType'] == 'TableScan'
+    assert any('Full table scan over 120000 Account records' in warning for warning in analysis['warnings'])
+    assert analysis['suggestions'] == [
+        "Filter on an indexed field such as Id, Name, OwnerId, ExternalKey__c to avoid scanning the table."]
+
+
+def test_query_without_filter_is_told_to_add_one():
+    analysis = analyze_plans(TABLE_SCAN, "SELECT Id FROM Account", INDEXED)
+    assert "Add a WHERE clause; without one every record is read." in analysis['suggestions']
+
+
+def test_selective_index_plan_is_picked_without_warnings():
+    analysis = analyze_plans(INDEX_AND_SCAN, "SELECT Id FROM Account WHERE ExternalKey__c = 'A-1'", INDEXED)
+    assert analysis['plan']['leadingOperationType'] == 'Index'
+    assert [plan['relativeCost'] for plan in analysis['plans']] == [0.0004, 2.87]
+    assert analysis['warnings'] == []
+    assert analysis['suggestions'] == []
+
+
+def test_notes_and_non_selective_cost_are_reported():
+    analysis = analyze_plans(NON_SELECTIVE_WITH_NOTES,
+                             "SELECT Id FROM Account WHERE Industry = 'Retail' AND Name != null", INDEXED)
+    assert analysis['warnings'] == [
+        "The filter is not selective (relative cost 1.40).",
+        "Not considering filter for optimization because unindexed (Rating)",
+    ]
+    # Fields the query already filters on are not suggested again
+    assert analysis['suggestions'] == [
+        "Filter on an indexed field such as Id, OwnerId, ExternalKey__c to avoid scanning the table."]
+
+
+def test_no_plans_and_no_indexed_fields():
+    assert analyze_plans({}, "SELECT Id FROM Account")['warnings'] == [
+        "Salesforce returned no query plan for this query."]
+    assert analyze_plans(TABLE_SCAN, "SELECT Id FROM Account WHERE Rating = 'Hot'")['suggestions'] == []
+
+
+def test_filter_fields_ignore_literals_and_subqueries():
+    query = ("SELECT Id, (SELECT Id FROM Contacts WHERE Email = 'x') FROM Account "
+             "WHERE Description = 'Name = x' AND Owner.Name LIKE 'A%' AND Type IN ('a', 'b')")
+    assert filter_fields(query) == {'Description', 'Owner.Name', 'Type'}
+
+
+def test_indexed_fields_of_a_describe():
+    describe = {'fields': [
+        {'name': 'Id', 'type': 'id'},
+        {'name': 'Name', 'type': 'string'},
+        {'name': 'ParentId', 'type': 'reference'},
+        {'name': 'Key__c', 'type': 'string', 'externalId': True},
+        {'name': 'Rating', 'type': 'picklist'},
+        {'name': 'Notes__c', 'type': 'textarea', 'filterable': False, 'unique': True},
+    ]}
+    assert indexed_fields(describe) == ['Id', 'Name', 'ParentId', 'Key__c']
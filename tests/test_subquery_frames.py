@@ -0,0 +1,58 @@
+from subquery_frames import PARENT_ID_COLUMN, parent_child_frames
+
+QUERY = "SELECT Id, Name, (SELECT Id, LastName FROM Contacts) FROM Account"
+
+
+def contact(record_id, last_name):
+    return {'attributes': {'type': 'Contact'}, 'Id': record_id, 'LastName': last_name}
+
+
+class Connection:
+    """Answers the parent query with canned pages and child collections past their first batch."""
+
+    def __init__(self, pages, child_batches=None):
+        self.pages = pages
+        self.child_batches = child_batches or {}
+        self.followed = []
+
+    def query(self, soql_query, include_deleted=False):
+        return self.pages[0]
+
+    def query_more(self, url, identifier_is_url=False):
+        self.followed.append(url)
+        return self.child_batches[url] if url in self.child_batches else self.pages[int(url)]
+
+
+def test_no_parents():
+    sf = Connection([{'totalSize': 0, 'done': True, 'records': []}])
+    parent, children, summary = parent_child_frames(sf, QUERY, ['Contacts'])
+    assert parent.empty
+    assert children['Contacts'].empty
+    assert summary.empty
+
+
+def test_children_past_first_batch_and_parents_without_children():
+    first_batch = {'totalSize': 3, 'done': False, 'nextRecordsUrl': '/contacts-2',
+                   'records': [contact('003A', 'Ann'), contact('003B', 'Bob')]}
+    pages = [
+        {'totalSize': 3, 'done': False, 'nextRecordsUrl': '1', 'records': [
+            {'attributes': {'type': 'Account'}, 'Id': '001A', 'Name': 'Acme', 'Contacts': first_batch},
+            {'attributes': {'type': 'Account'}, 'Id': '001B', 'Name': 'Beta', 'Contacts': None},
+        ]},
+        {'totalSize': 3, 'done': True, 'records': [
+            {'attributes': {'type': 'Account'}, 'Id': '001C', 'Name': 'Core', 'Contacts': {
+                'totalSize': 1, 'done': True, 'records': [contact('003D', 'Dee')]}},
+        ]},
+    ]
+    sf = Connection(pages, {'/contacts-2': {'totalSize': 3, 'done': True, 'records': [contact('003C', 'Cy')]}})
+    parent, children, summary = parent_child_frames(sf, QUERY, ['Contacts'])
+
+    assert parent.columns.tolist() == ['Id', 'Name']
+    assert parent['Id'].tolist() == ['001A', '001B', '001C']
+    assert '/contacts-2' in sf.followed
+    contacts = children['Contacts']
+    assert contacts[PARENT_ID_COLUMN].tolist() == ['001A', '001A', '001A', '001C']
+    assert contacts['LastName'].tolist() == ['Ann', 'Bob', 'Cy', 'Dee']
+    # A parent without children keeps one summary row with empty child columns
+    assert summary['Id'].tolist() == ['001A', '001A', '001A', '001B', '001C']
+    assert summary['Contacts.LastName'].isna().tolist() == [False, False, False, True, False]
@@ -0,0 +1,130 @@
+import streamlit as st
+import pandas as pd
+from field_index import SEARCH_RESULTS
+from lookup_service import lookup_service, SEARCH_LIMIT, MIN_SEARCH_CHARACTERS
+from query_plan import analyze_query
+from result_grid import PAGE_SIZES, DEFAULT_PAGE_SIZE
+
+
+def field_picker(index, label, key, limit=SEARCH_RESULTS):
+    """
+    Type-ahead field selection: a search box narrows the options of a multiselect to the
+    best matches from the index, while the fields already chosen stay selected.
+    """
+    query = st.text_input("Search fields", key=f"{key}_search", help=f"Narrows the options of '{label}'",
+                          placeholder="Part of a field name, label or path, e.g. 'owner.na' or 'ownrprof'")
+    selected = [path for path in st.session_state.get(key, []) if path in index.by_path]
+    matches = [entry['path'] for entry in index.search(query, limit)]
+    options = list(dict.fromkeys(selected + matches))
+    if key in st.session_state and st.session_state[key] != selected:
+        st.session_state[key] = selected
+    return st.multiselect(label, options, key=key,
+                          format_func=lambda path: f"{path}  ·  {index.by_path[path]['label']} ({index.by_path[path]['type']})")
+
+
+def show_result_grid(source, key, page_sizes=PAGE_SIZES):
+    """
+    A paginated grid over a grid source: only the rows of the current page are fetched
+    and sent to the browser, with sort and filter controls applied by the source.
+    Returns the frame of the rows on screen.
+    """
+    columns = source.columns
+    if not columns:
+        st.info("No records found.")
+        return pd.DataFrame()
+
+    sort, filter = None, None
+    if source.sortable:
+        sort_col, direction_col, filter_col, text_col = st.columns([3, 2, 3, 3])
+        sort_column = sort_col.selectbox("Sort by", ['(none)'] + columns, key=f"{key}_sort")
+        descending = direction_col.selectbox("Direction", ["ASC", "DESC"], key=f"{key}_direction") == "DESC"
+        filter_column = filter_col.selectbox("Filter column", columns, key=f"{key}_filter_column")
+        filter_text = text_col.text_input("Filter value", key=f"{key}_filter_text")
+        if sort_column != '(none)':
+            sort = (sort_column, not descending)
+        if filter_text.strip():
+            filter = (filter_column, filter_text.strip())
+
+    # Back to the first page whenever the view changes
+    view_state = f"{key}_view"
+    if st.session_state.get(view_state) != (sort, filter):
+        st.session_state[view_state] = (sort, filter)
+        st.session_state[f"{key}_page"] = 1
+
+    size_col, page_col = st.columns([1, 1])
+    page_size = size_col.selectbox("Rows per page", page_sizes, index=page_sizes.index(DEFAULT_PAGE_SIZE)
+                                   if DEFAULT_PAGE_SIZE in page_sizes else 0, key=f"{key}_page_size")
+    page_number = page_col.number_input("Page", min_value=1, step=1, key=f"{key}_page")
+    try:
+        window, total = source.page((page_number - 1) * page_size, page_size, sort, filter)
+    except Exception as e:
+        st.error(f"Failed to load rows: {str(e)}")
+        return pd.DataFrame()
+
+    st.dataframe(window, hide_index=True)
+    first = (page_number - 1) * page_size
+    pages = max((total + page_size - 1) // page_size, 1)
+    if window.empty:
+        st.caption(f"No rows on page {page_number} of {pages} ({total} rows).")
+    else:
+        st.caption(f"Rows {first + 1}-{first + len(window)} of {total} · page {page_number} of {pages}")
+    return window
+
+
+def show_query_plan(sf, soql_query, key):
+    """An expander that explains a query before it is run and shows the cost of its plan."""
+    with st.expander("Query Plan"):
+        if st.button("Analyze Query", key=f"{key}_analyze"):
+            try:
+                st.session_state[f"{key}_analysis"] = analyze_query(sf, soql_query)
+            except Exception as e:
+                st.error(f"Failed to analyze query: {str(e)}")
+
+        analysis = st.session_state.get(f"{key}_analysis")
+        if not analysis or analysis['query'] != soql_query:
+            st.caption("Check how Salesforce would run the query before running it.")
+            return
+        plan = analysis['plan']
+        if plan:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Leading Operation", plan.get('leadingOperationType', ''))
+            col2.metric("Cardinality", plan.get('cardinality', 0))
+            col3.metric("Relative Cost", f"{plan.get('relativeCost', 0):.2f}")
+            col4.metric(f"{plan.get('sobjectType', 'Object')} Records", plan.get('sobjectCardinality', 0))
+        for warning in analysis['warnings']:
+            st.warning(warning)
+        for suggestion in analysis['suggestions']:
+            st.info(suggestion)
+        if plan and not analysis['warnings']:
+            st.success("The query is selective.")
+        if len(analysis['plans']) > 1:
+            st.dataframe(pd.DataFrame([{
+                'Operation': candidate.get('leadingOperationType'),
+                'Cardinality': candidate.get('cardinality'),
+                'Relative Cost': candidate.get('relativeCost'),
+                'Index Fields': ', '.join(candidate.get('fields', [])),
+            } for candidate in analysis['plans']]), hide_index=True)
+
+
+def lookup_select(sf, object_name, label, key, limit=SEARCH_LIMIT):
+    """
+    Type-ahead record picker: a search box queries Salesforce for matching names and a
+    selectbox offers them. Returns the chosen name (None when nothing is chosen), which
+    lookup_service.resolve() turns into an Id.
+    """
+    text = st.text_input(f"Search {label}", key=f"{key}_search",
+                         placeholder=f"Type at least {MIN_SEARCH_CHARACTERS} characters of the name")
+    options = []
+    try:
+        options = [name for name, _ in lookup_service.search(sf, object_name, text, limit)]
+    except Exception as e:
+        st.error(f"Error searching {object_name} records: {e}")
+
+    # The current choice stays available while a different search is typed
+    chosen = st.session_state.get(key)
+    if chosen and chosen != "--None--" and chosen not in options:
+        options.insert(0, chosen)
+    if text.strip() and len(options) >= limit:
+        st.caption(f"Showing the first {limit} matches; type more of the name to narrow them.")
+    choice = st.selectbox(label, ["--None--"] + options, key=key)
+    return None if choice == "--None--" else choice
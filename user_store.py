@@ -0,0 +1,20 @@
+import json
+import os
+
+# Login details saved by the app and read by the background sync worker
+USER_DATA_FILE = 'user_data.json'
+# Function to save user data persistently to a JSON file
+def save_user_data(user_data, keep_logged_in=False):
+    user_data['keep_logged_in'] = keep_logged_in
+    with open(USER_DATA_FILE, 'w') as f:
+        json.dump(user_data, f)
+# Function to load user data from the JSON file
+def load_user_data():
+    if os.path.exists(USER_DATA_FILE):
+        with open(USER_DATA_FILE, 'r') as f:
+            return json.load(f)
+    return {}
+# Function to clear saved user data (used on logout)
+def clear_user_data():
+    if os.path.exists(USER_DATA_FILE):
+        os.remove(USER_DATA_FILE)